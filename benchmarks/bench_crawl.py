@@ -0,0 +1,173 @@
+"""
+End-to-end crawl benchmark against synthetic e-commerce sites.
+
+Serves one or more synthetic sites (see synthetic_site.py) from a local aiohttp
+server in a separate process, crawls them with CrawlerManager, and reports
+pages/sec, products/sec, p50/p99 fetch latency, product coverage, peak RSS and
+CPU time of the crawler process. Results are written as JSON so runs can be
+compared across commits.
+
+Run from the repository root:
+    python benchmarks/bench_crawl.py --scenario baseline --output benchmarks/results/baseline.json
+    python benchmarks/bench_crawl.py --scenario baseline --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import aiohttp
+from crawler_manager import CrawlerManager
+from metrics import CrawlMetrics, Histogram
+from models import BaseUrl
+from strategies import RegexBasedDiscoveryStrategy
+from synthetic_site import SiteSpec, SyntheticSite, TRAPS, serve_in_process
+
+SCENARIOS = {
+    # A few seconds; for a quick check that nothing is badly off.
+    "small": dict(sites=1, categories=4, pages_per_category=3, fanout=10),
+    # Two ~4.8k page shops with a little network latency.
+    "baseline": dict(sites=2, categories=20, pages_per_category=10, fanout=24, latency_ms=5),
+    # Calendar, facet and session-id traps, crawled with trap detection.
+    "traps": dict(sites=1, categories=10, pages_per_category=5, fanout=24, traps=list(TRAPS), trap_detection=True),
+    # Injected 503s and a slow tail.
+    "flaky": dict(sites=2, categories=10, pages_per_category=10, fanout=24, latency_ms=5, error_rate=0.05,
+                  slow_ratio=0.01, slow_ms=500),
+}
+
+# Fetch latency buckets from 0.5 ms to about a minute, 10% apart, for usable p50/p99.
+LATENCY_BUCKETS = tuple(0.0005 * 1.1 ** i for i in range(125))
+
+SPEC_OPTIONS = ("categories", "pages_per_category", "fanout", "product_ratio", "related", "traps", "latency_ms",
+                "latency_jitter", "slow_ratio", "slow_ms", "error_rate", "seed")
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+async def server_stats(port: int) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{port}/_stats") as response:
+            return await response.json()
+
+async def crawl(port: int, prefixes: list, options: dict) -> tuple:
+    base_urls = [BaseUrl(f"http://127.0.0.1:{port}", prefix, render="never") for prefix in prefixes]
+    metrics = CrawlMetrics(log_interval=0, buckets=LATENCY_BUCKETS)
+    manager = CrawlerManager(base_urls, RegexBasedDiscoveryStrategy([r'/p/']), max_depth=options["max_depth"],
+                             workers_per_domain=options["workers"], metrics=metrics,
+                             trap_options={} if options["trap_detection"] else None,
+                             retry_options={"hedge": options["hedge"]} if options["retries"] else None)
+    async with metrics:
+        results = await manager.run()
+    return results, metrics
+
+def run(options: dict) -> dict:
+    spec = SiteSpec(**{key: options[key] for key in SPEC_OPTIONS if options.get(key) is not None})
+    prefixes = [f"/s{site}" for site in range(options["sites"])]
+    expected_products = SyntheticSite(spec).products() * len(prefixes)
+    server, port = serve_in_process(spec, prefixes)
+    try:
+        cpu_start = cpu_seconds()
+        start = time.perf_counter()
+        results, metrics = asyncio.run(crawl(port, prefixes, options))
+        elapsed = time.perf_counter() - start
+        cpu = cpu_seconds() - cpu_start
+        served = asyncio.run(server_stats(port))
+    finally:
+        server.terminate()
+        server.join()
+
+    fetch = Histogram(LATENCY_BUCKETS)
+    pages = 0
+    for domain in metrics.domains.values():
+        pages += domain.counters['pages']
+        histogram = domain.histograms.get('fetch')
+        if histogram is not None:
+            fetch.counts = [a + b for a, b in zip(fetch.counts, histogram.counts)]
+            fetch.count += histogram.count
+            fetch.sum += histogram.sum
+    products = sum(len(urls) for urls in results.values())
+    return {
+        "spec": spec.to_dict(),
+        "crawler": {key: options[key] for key in ("sites", "max_depth", "workers", "trap_detection", "retries", "hedge")},
+        "results": {
+            "elapsed_s": elapsed,
+            "cpu_s": cpu,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "pages": pages,
+            "requests_served": served["requests"],
+            "errors_injected": served["errors"],
+            "products": products,
+            "coverage": products / expected_products if expected_products else None,
+            "pages_per_s": pages / elapsed,
+            "products_per_s": products / elapsed,
+            "fetch_p50_ms": fetch.quantile(0.5) * 1000 if fetch.count else None,
+            "fetch_p99_ms": fetch.quantile(0.99) * 1000 if fetch.count else None,
+        },
+    }
+
+def compare(previous: dict, current: dict):
+    print(f"Compared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    if (previous.get("spec"), previous.get("crawler")) != (current["spec"], current["crawler"]):
+        print("  warning: the runs used different sites or crawler options")
+    for key, value in current["results"].items():
+        old = previous.get("results", {}).get(key)
+        if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            print(f"  {key:<16} {old:12.3f} -> {value:12.3f}  ({(value - old) / old:+7.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default="small")
+    parser.add_argument('--sites', type=int, help='sites crawled at once, one base URL each')
+    parser.add_argument('--categories', type=int)
+    parser.add_argument('--pages-per-category', type=int)
+    parser.add_argument('--fanout', type=int, help='items linked from every listing page')
+    parser.add_argument('--product-ratio', type=float, help='share of listed items that are products')
+    parser.add_argument('--traps', nargs='*', choices=TRAPS)
+    parser.add_argument('--latency-ms', type=float, help='median injected latency per response')
+    parser.add_argument('--error-rate', type=float, help='share of responses turned into 503s')
+    parser.add_argument('--slow-ratio', type=float, help='share of responses delayed by --slow-ms more')
+    parser.add_argument('--slow-ms', type=float)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--max-depth', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=10, help='workers per domain')
+    parser.add_argument('--trap-detection', action='store_true', default=None)
+    parser.add_argument('--retries', action='store_true', default=None, help='retry failed requests (RetryPolicy defaults)')
+    parser.add_argument('--hedge', action='store_true', default=None, help='with --retries, also hedge slow requests')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    options = dict(SCENARIOS[args.scenario])
+    options.update({key: value for key, value in vars(args).items() if value is not None})
+    for flag in ("trap_detection", "retries", "hedge"):
+        options.setdefault(flag, False)
+
+    report = {"benchmark": "crawl", "scenario": args.scenario, "commit": git_commit(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+              **run(options)}
+    print(json.dumps(report["results"], indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark for crawl ordering: breadth-first vs best-first (HeuristicScorer).
+
+Crawls a synthetic shop (paginated categories, product pages with related
+products, and a large blog/help/account section) entirely in memory with a
+fixed page budget, and reports product URLs found per 1k fetches.
+
+Run from the repository root:
+    python benchmarks/bench_frontier.py --categories 20 --pages-per-category 10 --budget 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from budget import CrawlBudget
+from domain_crawler import DomainCrawler
+from models import BaseUrl
+from scoring import HeuristicScorer
+from strategies import RegexBasedDiscoveryStrategy
+
+HOST = "https://shop.example.com"
+PRODUCTS_PER_PAGE = 24
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def iter_chunked(self, size: int):
+        for start in range(0, len(self._data), size):
+            yield self._data[start:start + size]
+
+class _Response:
+    def __init__(self, status: int, text: str):
+        self.status = status
+        self.headers = {'Content-Type': 'text/html; charset=utf-8'}
+        self.content = _Body(text.encode())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+class SyntheticShop:
+    """
+    In-memory site served through the session interface DomainCrawler uses.
+    Every page carries the same header navigation into the low-value section.
+    """
+    def __init__(self, categories: int, pages_per_category: int, blog_posts: int, seed: int = 7):
+        self.categories = categories
+        self.pages_per_category = pages_per_category
+        self.blog_posts = blog_posts
+        self.random = random.Random(seed)
+        self.fetches = 0
+
+    def _page(self, links: list) -> str:
+        nav = ['/', '/about', '/help', '/faq', '/account/login', '/cart', '/blog/post-0', '/careers', '/contact']
+        anchors = "".join(f'<a href="{href}">x</a>' for href in nav + links)
+        return f"<html><body><nav>{anchors}</nav></body></html>"
+
+    def _product(self, category: int, page: int, index: int) -> str:
+        return f"/p/c{category}-{page}-{index}"
+
+    def render(self, path: str) -> str:
+        if path in ('', '/'):
+            return self._page([f"/category/c{c}" for c in range(self.categories)] + [self._product(0, 1, i) for i in range(5)])
+        if path.startswith('/category/'):
+            category, _, query = path[len('/category/c'):].partition('?page=')
+            category, page = int(category), int(query or 1)
+            links = [self._product(category, page, i) for i in range(PRODUCTS_PER_PAGE)]
+            if page < self.pages_per_category:
+                links.append(f"/category/c{category}?page={page + 1}")
+            return self._page(links)
+        if path.startswith('/p/'):
+            category = int(path[len('/p/c'):].split('-')[0])
+            related = [self._product(category, self.random.randint(1, self.pages_per_category), self.random.randrange(PRODUCTS_PER_PAGE))
+                       for _ in range(4)]
+            return self._page(related + [f"/category/c{category}"])
+        if path.startswith('/blog/post-'):
+            post = int(path[len('/blog/post-'):])
+            return self._page([f"/blog/post-{(post + step) % self.blog_posts}" for step in range(1, 6)])
+        return self._page([])
+
+    async def get(self, url: str, headers=None):
+        self.fetches += 1
+        return _Response(200, self.render(url[len(HOST):]))
+
+async def crawl(mode: str, args) -> tuple:
+    site = SyntheticShop(args.categories, args.pages_per_category, args.blog_posts)
+    crawler = DomainCrawler(BaseUrl(HOST, render="never"), RegexBasedDiscoveryStrategy([r'/p/']), max_depth=args.max_depth,
+                            session=site, workers=args.workers, budget=CrawlBudget(max_pages=args.budget),
+                            scorer=HeuristicScorer() if mode == "best-first" else None)
+    start = time.perf_counter()
+    products = await crawler.start()
+    return site.fetches, len(products), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--categories', type=int, default=20, help='categories in the synthetic shop')
+    parser.add_argument('--pages-per-category', type=int, default=10, help='listing pages per category')
+    parser.add_argument('--blog-posts', type=int, default=2000, help='pages in the low-value section')
+    parser.add_argument('--budget', type=int, default=1000, help='pages each crawl may load')
+    parser.add_argument('--max-depth', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=10)
+    args = parser.parse_args()
+
+    total = args.categories * args.pages_per_category * PRODUCTS_PER_PAGE
+    print(f"{total} products, budget {args.budget} pages")
+    for mode in ("breadth-first", "best-first"):
+        fetches, products, elapsed = asyncio.run(crawl(mode, args))
+        print(f"{mode:<14} {fetches:6d} fetches {products:6d} products ({products / total:6.1%})"
+              f"  {products * 1000 / max(fetches, 1):8.0f} products/1k fetches  {elapsed:6.2f}s")
+
+if __name__ == '__main__':
+    main()
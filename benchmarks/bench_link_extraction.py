@@ -0,0 +1,60 @@
+"""
+Micro-benchmark for the LinkExtractor implementations.
+
+Parses a synthetic listing page with each extractor and reports time per page
+and peak memory allocated while parsing it.
+
+Run from the repository root:
+    python benchmarks/bench_link_extraction.py --links 500 --pages 200
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from link_extractors import LINK_EXTRACTORS
+
+def make_page(links: int) -> str:
+    cards = []
+    for i in range(links):
+        cards.append(
+            f'<div class="card" data-id="{i}"><img src="/img/{i}.jpg" alt="Product {i}">'
+            f'<h3 class="title"><a class="link" href="/products/item-{i}?ref=grid&amp;pos={i}">Product {i}</a></h3>'
+            f'<p class="price">Rs. {i * 10}</p><button type="button">Add to cart</button></div>')
+    return (
+        '<!DOCTYPE html><html><head><title>Listing</title><script>window.dataLayer = [];</script></head>'
+        f'<body><nav><a href="/">Home</a><a href="/about">About</a></nav><main>{"".join(cards)}</main></body></html>')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, default=500, help='product cards per page')
+    parser.add_argument('--pages', type=int, default=200, help='pages parsed per extractor')
+    args = parser.parse_args()
+
+    page = make_page(args.links)
+    page_url = "https://www.example.com/collections/all"
+    print(f"page size {len(page) / 1024:.0f} KiB, {args.links + 2} links")
+
+    results = {}
+    for name, extractor_class in LINK_EXTRACTORS.items():
+        extractor = extractor_class()
+        start = time.perf_counter()
+        for _ in range(args.pages):
+            links = extractor.extract(page, page_url)
+        per_page = (time.perf_counter() - start) / args.pages
+
+        tracemalloc.start()
+        extractor.extract(page, page_url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = links
+        print(f"{name:<6} {per_page * 1000:8.2f} ms/page  peak {peak / 1024:8.0f} KiB/page")
+
+    assert all(links == results["soup"] for links in results.values())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for RegexBasedDiscoveryStrategy.
+
+Compares the old per-pattern `re.search` loop with the precompiled single
+alternation, both per URL (`is_product_url`) and in batches (`classify`).
+
+Run from the repository root:
+    python benchmarks/bench_strategies.py --patterns 150 --urls 1000000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from strategies import RegexBasedDiscoveryStrategy
+
+def make_patterns(count: int) -> list:
+    words = ['product', 'item', 'p', 'dp', 'prod', 'shop', 'buy', 'store', 'listing', 'goods', 'sku', 'article']
+    patterns = [f'/{word}/' for word in words]
+    while len(patterns) < count:
+        patterns.append(f'/{random.choice(words)}-{len(patterns)}/\\d+')
+    return patterns[:count]
+
+def make_urls(count: int, product_ratio: float = 0.2) -> list:
+    urls = []
+    for i in range(count):
+        if random.random() < product_ratio:
+            urls.append(f'https://shop.example.com/product/{i}?ref=list')
+        else:
+            urls.append(f'https://www.example.com/category/{i % 97}/page/{i}?sort=price')
+    return urls
+
+def naive_is_product_url(patterns: list, url: str) -> bool:
+    for pattern in patterns:
+        if re.search(pattern, url):
+            return True
+    return False
+
+def timed(label: str, fn, urls: list):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f}s  {len(urls) / elapsed / 1e6:8.2f}M URLs/s")
+    return result, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patterns', type=int, default=150)
+    parser.add_argument('--urls', type=int, default=1_000_000)
+    parser.add_argument('--batch', type=int, default=200, help='URLs per classify() call, roughly one page of links')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    patterns = make_patterns(args.patterns)
+    urls = make_urls(args.urls)
+    strategy = RegexBasedDiscoveryStrategy(patterns)
+    print(f"{len(patterns)} patterns, {len(urls)} URLs")
+
+    naive, naive_time = timed("naive re.search loop", lambda: [naive_is_product_url(patterns, url) for url in urls], urls)
+    single, _ = timed("compiled is_product_url", lambda: [strategy.is_product_url(url) for url in urls], urls)
+    batched, batch_time = timed("compiled classify", lambda: [hit for start in range(0, len(urls), args.batch)
+                                                              for hit in strategy.classify(urls[start:start + args.batch])], urls)
+    assert naive == single == batched
+    print(f"speedup (classify vs naive): {naive_time / batch_time:.1f}x")
+
+if __name__ == '__main__':
+    main()
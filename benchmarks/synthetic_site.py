@@ -0,0 +1,178 @@
+"""
+Synthetic e-commerce sites for the crawl benchmarks.
+
+Every page is generated from its path, so a site of any size costs no memory
+and is the same on every run for the same spec and seed. A site has:
+  - a home page linking every category,
+  - paginated category listings linking `fanout` items each, a share
+    `product_ratio` of them products and the rest content pages,
+  - product pages linking a few related products and their category,
+  - optional traps: an endless calendar, facet combinations of every listing,
+    and session ids appended to every content link.
+
+Sites are served by an aiohttp server (`serve_in_process`, normally in a
+separate process so the crawler is measured alone), with injected latency
+and errors.
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import random
+from aiohttp import web
+
+TRAPS = ("calendar", "facets", "session")
+
+class SiteSpec:
+    """
+    Shape of a synthetic site, and the latency and errors its server injects.
+    """
+    def __init__(self, categories: int = 20, pages_per_category: int = 10, fanout: int = 24, product_ratio: float = 0.8,
+                 related: int = 4, traps: list = (), latency_ms: float = 0.0, latency_jitter: float = 0.5,
+                 slow_ratio: float = 0.0, slow_ms: float = 1000.0, error_rate: float = 0.0, seed: int = 7):
+        unknown = set(traps) - set(TRAPS)
+        if unknown:
+            raise ValueError(f"Unknown traps: {', '.join(sorted(unknown))}")
+        self.categories = categories
+        self.pages_per_category = pages_per_category
+        self.fanout = fanout
+        self.product_ratio = product_ratio
+        self.related = related
+        self.traps = tuple(traps)
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.slow_ratio = slow_ratio
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self), traps=list(self.traps))
+
+class SyntheticSite:
+    """
+    Generates the HTML of every page of a SiteSpec under a path `prefix`.
+    """
+    def __init__(self, spec: SiteSpec, prefix: str = ""):
+        self.spec = spec
+        self.prefix = prefix.rstrip('/')
+        # Decided once per slot, so the product count is known without crawling.
+        self._is_product = [self._hash(f"kind {slot}") < spec.product_ratio for slot in range(spec.fanout)]
+
+    def _hash(self, key: str) -> float:
+        digest = hashlib.blake2b(f"{self.spec.seed} {key}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') / 2 ** 64
+
+    def products(self) -> int:
+        return self.spec.categories * self.spec.pages_per_category * sum(self._is_product)
+
+    def pages(self) -> int:
+        """
+        Pages reachable without entering a trap.
+        """
+        listings = self.spec.categories * self.spec.pages_per_category
+        about = 0 if all(self._is_product) else 1
+        return 1 + listings * (1 + self.spec.fanout) + about
+
+    def _page(self, links: list, title: str) -> str:
+        anchors = "".join(f'<a href="{self.prefix}{href}">{title}</a>' for href in links)
+        return f"<html><head><title>{title}</title></head><body><nav>{anchors}</nav></body></html>"
+
+    def _item(self, category: int, page: int, slot: int) -> str:
+        kind = "p" if self._is_product[slot] else "info"
+        return f"/{kind}/{category}-{page}-{slot}"
+
+    def _content_link(self, href: str, source: str) -> str:
+        if "session" in self.spec.traps:
+            # A new id for every page the link is on: the content pages form an endless chain.
+            return f"{href}?sid={int(self._hash(f'sid {source} {href}') * 1e9)}"
+        return href
+
+    def render(self, path: str, query: dict) -> str:
+        """
+        HTML of a page, or None when the path does not exist.
+        """
+        spec = self.spec
+        if self.prefix:
+            if path != self.prefix and not path.startswith(self.prefix + '/'):
+                return None
+            path = path[len(self.prefix):]
+        if path in ("", "/"):
+            links = [f"/c/{category}" for category in range(spec.categories)]
+            if "calendar" in spec.traps:
+                links.append("/calendar?month=0")
+            return self._page(links, "home")
+        if path.startswith("/c/"):
+            category, page = int(path[3:]), int(query.get("page", 1))
+            links = [self._item(category, page, slot) for slot in range(spec.fanout)]
+            links = [link if link.startswith("/p/") else self._content_link(link, f"{path} {page}") for link in links]
+            if page < spec.pages_per_category:
+                links.append(f"/c/{category}?page={page + 1}")
+            if "facets" in spec.traps and "color" not in query:
+                links.extend(f"/c/{category}?page={page}&color={color}&size={size}"
+                             for color in range(8) for size in range(6))
+            return self._page(links, f"category {category}")
+        if path.startswith("/p/"):
+            category, page, slot = (int(part) for part in path[3:].split("-"))
+            related = []
+            for step in range(1, spec.related + 1):
+                other = int(self._hash(f"related {path} {step}") * spec.pages_per_category) + 1
+                if self._is_product[(slot + step) % spec.fanout]:
+                    related.append(self._item(category, other, (slot + step) % spec.fanout))
+            return self._page(related + [f"/c/{category}"], "product")
+        if path.startswith("/info/"):
+            return self._page(["/", self._content_link("/info/about", f"{path} {query.get('sid')}")], "content")
+        if path == "/calendar" and "calendar" in spec.traps:
+            month = int(query.get("month", 0))
+            return self._page([f"/calendar?month={month + 1}", f"/calendar?month={month - 1}"], "calendar")
+        return None
+
+def make_app(sites: list, spec: SiteSpec) -> web.Application:
+    """
+    aiohttp application serving `sites`, with the spec's injected latency and errors.
+    """
+    rng = random.Random(spec.seed)
+    counters = {"requests": 0, "errors": 0}
+
+    async def handle(request: web.Request) -> web.Response:
+        counters["requests"] += 1
+        delay = spec.latency_ms * rng.lognormvariate(0, spec.latency_jitter) if spec.latency_ms else 0.0
+        if spec.slow_ratio and rng.random() < spec.slow_ratio:
+            delay += spec.slow_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if spec.error_rate and rng.random() < spec.error_rate:
+            counters["errors"] += 1
+            return web.Response(status=503, text="Service Unavailable")
+        for site in sites:
+            body = site.render(request.path, request.query)
+            if body is not None:
+                return web.Response(text=body, content_type="text/html")
+        return web.Response(status=404, text="Not Found")
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(counters)
+
+    app = web.Application()
+    app.router.add_get("/_stats", stats)
+    app.router.add_get("/{tail:.*}", handle)
+    return app
+
+async def serve(spec: SiteSpec, prefixes: list, port_queue, host: str = "127.0.0.1"):
+    runner = web.AppRunner(make_app([SyntheticSite(spec, prefix) for prefix in prefixes], spec), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, 0).start()
+    port_queue.put(runner.addresses[0][1])
+    await asyncio.Event().wait()
+
+def _serve_main(spec: SiteSpec, prefixes: list, port_queue):
+    asyncio.run(serve(spec, prefixes, port_queue))
+
+def serve_in_process(spec: SiteSpec, prefixes: list):
+    """
+    Start a server process for the sites; returns (process, port).
+    """
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+    process = context.Process(target=_serve_main, args=(spec, prefixes, port_queue), daemon=True, name="synthetic-site")
+    process.start()
+    return process, port_queue.get(timeout=30)
@@ -0,0 +1,35 @@
+import time
+
+class CrawlBudget:
+    """
+    Limits on how much a single domain crawl may spend: pages loaded, response
+    bytes and wall time since the crawl started. A limit of None is unlimited.
+    """
+    def __init__(self, max_pages: int = None, max_bytes: int = None, max_time: float = None):
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.max_time = max_time
+        self.pages = 0
+        self.bytes = 0
+        self.started = None
+
+    def start(self):
+        self.started = time.monotonic()
+
+    def add_page(self):
+        self.pages += 1
+
+    def add_bytes(self, size: int):
+        self.bytes += size
+
+    def exceeded(self) -> str:
+        """
+        Return which limit has been reached, or None while there is budget left.
+        """
+        if self.max_pages is not None and self.pages >= self.max_pages:
+            return f"{self.pages} pages"
+        if self.max_bytes is not None and self.bytes >= self.max_bytes:
+            return f"{self.bytes} bytes"
+        if self.max_time is not None and self.started is not None and time.monotonic() - self.started >= self.max_time:
+            return f"{self.max_time}s wall time"
+        return None
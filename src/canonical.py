@@ -0,0 +1,61 @@
+"""
+URL canonicalization and fingerprinting.
+
+Fingerprints are the first 64 bits of a BLAKE2b digest of the canonical URL.
+The chance that any two of n distinct URLs collide is about n^2 / 2^65, i.e.
+roughly 3e-6 for 10 million URLs; a collision makes the crawler treat a new
+URL as already visited, it never causes a duplicate fetch.
+"""
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_STRIP_PARAMS = ("utm_*", "gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "_ga", "yclid")
+
+def fingerprint(url: str) -> int:
+    """
+    Return a 64-bit fingerprint of the URL.
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+
+class URLCanonicalizer:
+    """
+    Rewrites URLs so that different spellings of the same page compare equal.
+
+    What it does (each step can be switched off):
+      - Lowercase the scheme and host and drop default ports (:80 for http, :443 for https).
+      - Remove query parameters listed in `strip_params`; a trailing "*" matches by prefix.
+      - Sort the remaining query parameters.
+      - Drop the #fragment.
+    Query parameters are compared and reordered in their raw, still-encoded form.
+    """
+    def __init__(self, strip_params: list = DEFAULT_STRIP_PARAMS, sort_query: bool = True, drop_fragment: bool = True,
+                 lowercase_host: bool = True, strip_default_port: bool = True):
+        strip_params = [param.lower() for param in strip_params or ()]
+        self.strip_exact = frozenset(param for param in strip_params if not param.endswith('*'))
+        self.strip_prefixes = tuple(param[:-1] for param in strip_params if param.endswith('*'))
+        self.sort_query = sort_query
+        self.drop_fragment = drop_fragment
+        self.lowercase_host = lowercase_host
+        self.strip_default_port = strip_default_port
+
+    def _keep_param(self, pair: str) -> bool:
+        key = pair.split('=', 1)[0].lower()
+        return key not in self.strip_exact and not key.startswith(self.strip_prefixes)
+
+    def canonicalize(self, url: str) -> str:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc.lower() if self.lowercase_host else parts.netloc
+        if self.strip_default_port:
+            if scheme == 'http' and netloc.endswith(':80'):
+                netloc = netloc[:-3]
+            elif scheme == 'https' and netloc.endswith(':443'):
+                netloc = netloc[:-4]
+        query = parts.query
+        if query and (self.strip_exact or self.strip_prefixes or self.sort_query):
+            pairs = [pair for pair in query.split('&') if pair and self._keep_param(pair)]
+            if self.sort_query:
+                pairs.sort()
+            query = '&'.join(pairs)
+        fragment = '' if self.drop_fragment else parts.fragment
+        return urlunsplit((scheme, netloc, parts.path, query, fragment))
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from canonical import fingerprint
+
+def _to_signed(fp: int) -> int:
+    # SQLite integers are signed 64-bit.
+    return fp - (1 << 64) if fp >= (1 << 63) else fp
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+class CrawlState:
+    """
+    What a crawl left behind: fingerprints of every enqueued URL, the URLs that
+    were enqueued but not yet handled, and the products found so far.
+    """
+    def __init__(self, visited: list, pending: list, products: list):
+        self.visited = visited
+        self.pending = pending
+        self.products = products
+
+    def is_empty(self) -> bool:
+        return not self.visited and not self.products
+
+class CrawlStore(ABC):
+    """
+    Abstract base class for persistent crawl state, keyed by crawl (one per base URL).
+
+    The recording methods are synchronous and only buffer; `maybe_flush` and
+    `flush` write the buffered changes, and `load` and `reset` are coroutines too.
+    """
+    @abstractmethod
+    async def load(self, crawl: str) -> CrawlState:
+        pass
+
+    @abstractmethod
+    async def reset(self, crawl: str):
+        pass
+
+    @abstractmethod
+    def enqueued(self, crawl: str, fp: int, url: str, depth: int):
+        pass
+
+    @abstractmethod
+    def completed(self, crawl: str, fp: int):
+        pass
+
+    @abstractmethod
+    def fetched(self, crawl: str, url: str, status: int, size: int):
+        pass
+
+    @abstractmethod
+    def product(self, crawl: str, url: str):
+        pass
+
+    @abstractmethod
+    async def maybe_flush(self):
+        pass
+
+    @abstractmethod
+    async def flush(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+class SQLiteCrawlStore(CrawlStore):
+    """
+    CrawlStore backed by a SQLite database in WAL mode.
+
+    Changes are buffered in memory and written in one transaction once
+    `batch_size` changes are pending or `flush_interval` seconds have passed.
+    Writes run on a dedicated thread so they never block the event loop; loads
+    and resets run on the same thread, so they never interleave with a write
+    transaction on the shared connection.
+    """
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS frontier (
+            crawl TEXT NOT NULL, fp INTEGER NOT NULL, url TEXT NOT NULL, depth INTEGER NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (crawl, fp));
+        CREATE TABLE IF NOT EXISTS products (
+            crawl TEXT NOT NULL, url TEXT NOT NULL, PRIMARY KEY (crawl, url));
+        CREATE TABLE IF NOT EXISTS fetches (
+            crawl TEXT NOT NULL, fp INTEGER NOT NULL, url TEXT NOT NULL, status INTEGER, size INTEGER,
+            fetched_at REAL NOT NULL, PRIMARY KEY (crawl, fp));
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crawl-store")
+        self._new_buffers()
+        self._last_flush = time.monotonic()
+
+    def _new_buffers(self):
+        self._enqueued = []
+        self._completed = []
+        self._fetched = []
+        self._products = []
+        self._pending = 0
+
+    async def load(self, crawl: str) -> CrawlState:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._load, crawl)
+
+    async def reset(self, crawl: str):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._reset, crawl)
+
+    def _load(self, crawl: str) -> CrawlState:
+        rows = self._conn.execute("SELECT fp, url, depth, done FROM frontier WHERE crawl = ?", (crawl,)).fetchall()
+        visited = [_to_unsigned(fp) for fp, _, _, _ in rows]
+        pending = [(url, depth) for _, url, depth, done in rows if not done]
+        products = [url for (url,) in self._conn.execute("SELECT url FROM products WHERE crawl = ?", (crawl,))]
+        return CrawlState(visited, pending, products)
+
+    def _reset(self, crawl: str):
+        with self._conn:
+            for table in ("frontier", "products", "fetches"):
+                self._conn.execute(f"DELETE FROM {table} WHERE crawl = ?", (crawl,))
+
+    def enqueued(self, crawl: str, fp: int, url: str, depth: int):
+        self._enqueued.append((crawl, _to_signed(fp), url, depth))
+        self._pending += 1
+
+    def completed(self, crawl: str, fp: int):
+        self._completed.append((crawl, _to_signed(fp)))
+        self._pending += 1
+
+    def fetched(self, crawl: str, url: str, status: int, size: int):
+        self._fetched.append((crawl, _to_signed(fingerprint(url)), url, status, size, time.time()))
+        self._pending += 1
+
+    def product(self, crawl: str, url: str):
+        self._products.append((crawl, url))
+        self._pending += 1
+
+    def _write(self, enqueued: list, completed: list, fetched: list, products: list):
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO frontier (crawl, fp, url, depth) VALUES (?, ?, ?, ?)", enqueued)
+            self._conn.executemany("UPDATE frontier SET done = 1 WHERE crawl = ? AND fp = ?", completed)
+            self._conn.executemany("INSERT OR REPLACE INTO fetches VALUES (?, ?, ?, ?, ?, ?)", fetched)
+            self._conn.executemany("INSERT OR IGNORE INTO products VALUES (?, ?)", products)
+
+    async def maybe_flush(self):
+        if self._pending >= self.batch_size or (self._pending and time.monotonic() - self._last_flush >= self.flush_interval):
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batches = (self._enqueued, self._completed, self._fetched, self._products)
+        self._new_buffers()
+        self._last_flush = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write, *batches)
+        except sqlite3.Error as e:
+            logging.error(f"Error writing crawl state to {self.path}: {e}")
+
+    def close(self):
+        self._executor.shutdown()
+        self._conn.close()
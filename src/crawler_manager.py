@@ -3,33 +3,146 @@ import aiohttp
 from models import BaseUrl
 from strategies import URLDiscoveryStrategy
 from domain_crawler import DomainCrawler
+from playwright_helper import BrowserPool
+from render_policy import RenderHeuristic
+from link_extractors import LinkExtractor, FastLinkExtractor
+from parse_pool import ParsePool
+from canonical import URLCanonicalizer
+from visited import make_visited_set
+from politeness import PolitenessScheduler
+from crawl_store import CrawlStore
+from http_cache import ResponseCache
+from result_sinks import ResultSink
+from frontier import SharedFrontier
+from frontier_service import FrontierClient
+from scoring import HeuristicScorer
+from budget import CrawlBudget
+from traps import TrapDetector
+from metrics import CrawlMetrics
+from retries import RetryPolicy
 
 class CrawlerManager:
     """
     Manages crawling of multiple base URLs concurrently.
     
     What it does:
+      - Own a shared BrowserPool used by every DomainCrawler for rendering.
+      - Optionally own a ParsePool (parse_workers > 0) that parses pages in worker processes.
+      - Optionally checkpoint every crawl to a CrawlStore and resume from it.
+      - Optionally share a ResponseCache between the crawls for incremental recrawls.
+      - Optionally take part in a multi-node crawl: with `shared_frontier` options every
+        DomainCrawler works on a SharedFrontier leased from a FrontierCoordinator.
+      - Optionally crawl best-first (a HeuristicScorer from `scorer_options`) and give every
+        DomainCrawler its own CrawlBudget from `budget_options`.
+      - Optionally give every DomainCrawler its own TrapDetector from `trap_options`.
+      - Optionally instrument the crawls: every DomainCrawler gets its DomainMetrics from
+        `metrics`, whose trace config times the session's requests.
+      - Apply `timeout_options` (connect, read and total seconds) to every request and,
+        with `retry_options`, retry and hedge requests under one RetryPolicy.
       - Instantiate DomainCrawler for each base URL.
       - Execute crawlers asynchronously.
-      - Collate and return the results mapping each base URL to its product URLs.
+      - Collate and return the results mapping each base URL to its product URLs
+        (to the number of product URLs when they are streamed to a ResultSink).
     """
-    def __init__(self, base_urls: list[BaseUrl], strategy: URLDiscoveryStrategy, max_depth: int = 2, max_scroll: int  = 5):
+    def __init__(self, base_urls: list[BaseUrl], strategy: URLDiscoveryStrategy, max_depth: int = 2, max_scroll: int  = 5,
+                 workers_per_domain: int = 10, browser_pool_options: dict = None, scroll_options: dict = None,
+                 render_heuristic_options: dict = None, network_options: dict = None, link_extractor: LinkExtractor = None,
+                 parse_workers: int = 0, max_parse_jobs: int = None, canonicalization_options: dict = None,
+                 visited_options: dict = None, politeness_options: dict = None, respect_robots: bool = False,
+                 use_sitemaps: bool = False, sitemap_options: dict = None, store: CrawlStore = None, resume: bool = False,
+                 cache: ResponseCache = None, sink: ResultSink = None, shared_frontier: dict = None,
+                 scorer_options: dict = None, budget_options: dict = None, trap_options: dict = None,
+                 body_options: dict = None, metrics: CrawlMetrics = None, timeout_options: dict = None,
+                 retry_options: dict = None):
         self.base_urls = base_urls
         self.strategy = strategy
         self.max_depth = max_depth
         self.max_scroll = max_scroll
+        self.workers_per_domain = workers_per_domain
+        self.browser_pool_options = browser_pool_options or {}
+        self.scroll_options = scroll_options or {}
+        self.render_heuristic = RenderHeuristic(**(render_heuristic_options or {}))
+        self.network_options = network_options or {}
+        self.link_extractor = link_extractor or FastLinkExtractor()
+        self.parse_workers = parse_workers
+        self.max_parse_jobs = max_parse_jobs
+        self.canonicalizer = URLCanonicalizer(**(canonicalization_options or {}))
+        self.visited_options = visited_options or {}
+        self.politeness_options = politeness_options
+        self.respect_robots = respect_robots
+        self.use_sitemaps = use_sitemaps
+        self.sitemap_options = sitemap_options or {}
+        self.store = store
+        self.resume = resume
+        self.cache = cache
+        self.sink = sink
+        self.shared_frontier = shared_frontier
+        self.scorer = HeuristicScorer(**scorer_options) if scorer_options is not None else None
+        self.budget_options = budget_options
+        self.trap_options = trap_options
+        self.body_options = body_options
+        self.metrics = metrics
+        # aiohttp's defaults (5 minutes in total, 30 seconds to connect a socket) for what is not configured.
+        timeout_options = timeout_options or {}
+        default = aiohttp.client.DEFAULT_TIMEOUT
+        self.timeout = aiohttp.ClientTimeout(total=timeout_options.get('total', default.total),
+                                             connect=timeout_options.get('connect', default.connect),
+                                             sock_read=timeout_options.get('read', default.sock_read),
+                                             sock_connect=default.sock_connect)
+        # One policy for every crawler, so retry budgets and latencies are per host.
+        self.retry_policy = RetryPolicy(**retry_options) if retry_options is not None else None
 
     async def run(self):
         results = {}
         connector = aiohttp.TCPConnector(limit_per_host=200)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            tasks = []
-            for base_url in self.base_urls:
-                crawler = DomainCrawler(base_url, self.strategy, self.max_depth, self.max_scroll, session)
-                task = crawler.start()
-                tasks.append((f'{base_url.domain}{base_url.relative_path}', task))
-            if tasks:
-                urls, tasks_only = zip(*tasks)
-                all_product_urls = await asyncio.gather(*tasks_only)
-                results = {url: list(product_urls) for url, product_urls in zip(urls, all_product_urls)}
+        parse_pool = None
+        # One scheduler for every crawler, so hosts shared between base URLs share their limits.
+        scheduler = PolitenessScheduler(**self.politeness_options) if self.politeness_options is not None else None
+        if self.parse_workers > 0:
+            parse_pool = ParsePool(self.strategy, self.link_extractor, self.parse_workers, self.max_parse_jobs, self.canonicalizer)
+        client = None
+        frontier_options = {}
+        if self.shared_frontier is not None:
+            client_keys = ('host', 'port', 'node', 'heartbeat_interval')
+            client = FrontierClient(**{key: value for key, value in self.shared_frontier.items() if key in client_keys})
+            frontier_options = {key: value for key, value in self.shared_frontier.items() if key not in client_keys}
+        try:
+            if client is not None:
+                await client.connect()
+            trace_configs = [self.metrics.trace_config()] if self.metrics is not None else None
+            async with BrowserPool(**self.browser_pool_options) as browser_pool, \
+                    aiohttp.ClientSession(connector=connector, timeout=self.timeout, trace_configs=trace_configs) as session:
+                tasks = []
+                for base_url in self.base_urls:
+                    key = f'{base_url.domain}{base_url.relative_path}'
+                    frontier = SharedFrontier(client, key, **frontier_options) if client is not None else None
+                    budget = CrawlBudget(**self.budget_options) if self.budget_options is not None else None
+                    trap_detector = TrapDetector(**self.trap_options) if self.trap_options is not None else None
+                    crawler = DomainCrawler(base_url, self.strategy, self.max_depth, self.max_scroll, session,
+                                            workers=self.workers_per_domain, browser_pool=browser_pool,
+                                            scroll_options=self.scroll_options, render_heuristic=self.render_heuristic,
+                                            network_options=self.network_options, link_extractor=self.link_extractor,
+                                            parse_pool=parse_pool, canonicalizer=self.canonicalizer,
+                                            visited=make_visited_set(**self.visited_options), scheduler=scheduler,
+                                            respect_robots=self.respect_robots, use_sitemaps=self.use_sitemaps,
+                                            sitemap_options=self.sitemap_options, store=self.store, resume=self.resume,
+                                            cache=self.cache, sink=self.sink, frontier=frontier,
+                                            scorer=self.scorer, budget=budget, trap_detector=trap_detector,
+                                            body_options=self.body_options,
+                                            metrics=self.metrics.domain(key) if self.metrics is not None else None,
+                                            retry_policy=self.retry_policy)
+                    task = crawler.start()
+                    tasks.append((key, task))
+                if tasks:
+                    urls, tasks_only = zip(*tasks)
+                    all_product_urls = await asyncio.gather(*tasks_only)
+                    if self.sink is not None:
+                        results = {url: len(product_urls) for url, product_urls in zip(urls, all_product_urls)}
+                    else:
+                        results = {url: list(product_urls) for url, product_urls in zip(urls, all_product_urls)}
+        finally:
+            if parse_pool is not None:
+                parse_pool.close()
+            if client is not None:
+                await client.close()
         return results
@@ -1,77 +1,554 @@
 import asyncio
 import logging
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
 import aiohttp
 from models import BaseUrl
 from strategies import URLDiscoveryStrategy
-from playwright_helper import crawl_with_playwright
+import playwright_helper
+from playwright_helper import BrowserPool
+from render_policy import RENDER_ALWAYS, RENDER_AUTO, RenderHeuristic
+from link_extractors import LinkExtractor, FastLinkExtractor
+from response_body import BodyReader
+from page_parser import PageScope, parse_page
+from parse_pool import ParsePool
+from canonical import URLCanonicalizer, fingerprint
+from visited import VisitedSet, FingerprintSet
+from crawl_store import CrawlStore, CrawlState
+from http_cache import ResponseCache, CachedPage
+from result_sinks import ResultSink
+from frontier import Frontier, LocalFrontier, PriorityFrontier
+from scoring import URLScorer
+from budget import CrawlBudget
+from traps import TrapDetector
+from metrics import DomainMetrics
+from retries import RetryPolicy
+from politeness import PolitenessScheduler, unlimited_slot
+from robots import fetch_robots
+from sitemaps import SitemapDiscovery
 
 class DomainCrawler:
-    def __init__(self, base_url: BaseUrl, strategy: URLDiscoveryStrategy, max_depth: int = 2, max_scroll: int = 5, session: aiohttp.ClientSession = None):
+    def __init__(self, base_url: BaseUrl, strategy: URLDiscoveryStrategy, max_depth: int = 2, max_scroll: int = 5, session: aiohttp.ClientSession = None,
+                 workers: int = 10, browser_pool: BrowserPool = None, scroll_options: dict = None,
+                 render_heuristic: RenderHeuristic = None, network_options: dict = None, link_extractor: LinkExtractor = None,
+                 parse_pool: ParsePool = None, canonicalizer: URLCanonicalizer = None, visited: VisitedSet = None,
+                 scheduler: PolitenessScheduler = None, respect_robots: bool = False, use_sitemaps: bool = False,
+                 sitemap_options: dict = None, store: CrawlStore = None, resume: bool = False,
+                 cache: ResponseCache = None, sink: ResultSink = None, frontier: Frontier = None,
+                 scorer: URLScorer = None, budget: CrawlBudget = None, trap_detector: TrapDetector = None,
+                 body_options: dict = None, metrics: DomainMetrics = None, retry_policy: RetryPolicy = None):
         self.strategy = strategy
-        self.visited = set()
-        self.visited_lock = asyncio.Lock()  # Lock to guard visited set access
-        self.product_urls = set()
+        # Fingerprints of every URL ever enqueued; product_urls keeps the canonical strings,
+        # unless a result sink receives them, in which case only their fingerprints are kept.
+        self.visited = visited if visited is not None else FingerprintSet()
+        self.sink = sink
+        self.product_urls = set() if sink is None else FingerprintSet()
         self.max_depth = max_depth
         self.max_scroll = max_scroll
         self.base_url = base_url
         self.session = session
+        self.browser_pool = browser_pool
+        self.scroll_options = scroll_options or {}
+        self.network_options = network_options or {}
+        self.render_heuristic = render_heuristic or RenderHeuristic()
+        self.link_extractor = link_extractor or FastLinkExtractor()
+        self.parse_pool = parse_pool
+        body_options = dict(body_options or {})
+        # Extract links from the chunks while the body downloads; the parse pool extracts them itself.
+        self.stream_links = body_options.pop('stream_links', False) and parse_pool is None
+        self.body_reader = BodyReader(**body_options)
+        self.canonicalizer = canonicalizer or URLCanonicalizer()
+        self.scheduler = scheduler
+        self.respect_robots = respect_robots
+        self.use_sitemaps = use_sitemaps
+        self.sitemap_options = sitemap_options or {}
+        self.robots = None
+        self.store = store
+        self.resume = resume
+        self.cache = cache
+        self.crawl_key = f'{base_url.domain}{base_url.relative_path}'
+        self.workers = max(1, workers)
+        # start() creates a LocalFrontier (PriorityFrontier with a scorer) unless a frontier is given.
+        self.frontier = frontier
+        self.scorer = scorer
+        self.budget = budget
+        self._budget_reported = False
+        self.trap_detector = trap_detector
+        self.metrics = metrics
+        self.retry_policy = retry_policy
         self.base_absolute_url = base_url.get_absolute_url().rstrip('/')
-        parsed_url = urlparse(self.base_absolute_url)            
+        parsed_url = urlparse(self.base_absolute_url)
         if(not parsed_url.scheme):
             self.base_absolute_url = f"https://{self.base_absolute_url}"
+        self.scope = PageScope(self.base_absolute_url, base_url.path_validation)
 
-    async def crawl_page(self, url: str, depth: int):
-        # Guard the check and update of visited URLs.
-        async with self.visited_lock:
-            if depth > self.max_depth or url in self.visited:
-                return
-            self.visited.add(url)
-        
-        logging.debug(f"Crawling: {url} at depth {depth}")
-        
+    def enqueue(self, url: str, depth: int, priority: float = 0.0):
+        """
+        Add a URL to the frontier unless it is too deep, has been seen before or
+        is disallowed by robots.txt. Deduplication happens here, so each URL is
+        queued (and fetched) at most once.
+        """
+        if depth > self.max_depth or not self.allowed(url):
+            return
+        fp = fingerprint(url)
+        if not self.visited.add_fingerprint(fp):
+            return
+        self.frontier.put_nowait((url, depth), priority)
+        if self.store is not None:
+            self.store.enqueued(self.crawl_key, fp, url, depth)
+
+    def mark_visited(self, url: str):
+        """
+        Mark a URL as handled without crawling it.
+        """
+        fp = fingerprint(url)
+        if self.visited.add_fingerprint(fp) and self.store is not None:
+            # Depth -1: recorded as visited, never crawled.
+            self.store.enqueued(self.crawl_key, fp, url, -1)
+            self.store.completed(self.crawl_key, fp)
+
+    def add_products(self, urls: list):
+        for url in urls:
+            if url in self.product_urls:
+                continue
+            self.product_urls.add(url)
+            if self.metrics is not None:
+                self.metrics.inc('products')
+            if self.store is not None:
+                self.store.product(self.crawl_key, url)
+            if self.sink is not None:
+                self.sink.write(self.crawl_key, url)
+
+    def allowed(self, url: str) -> bool:
+        return self.robots is None or self.robots.can_fetch('*', url)
+
+    @asynccontextmanager
+    async def _slot(self, url: str):
+        """
+        Wait for the politeness scheduler (if any) to allow a request to the URL's host.
+        """
+        slot = unlimited_slot if self.scheduler is None else self.scheduler.slot
+        async with slot(url) as ticket:
+            yield ticket
+
+    async def request(self, url: str, headers: dict = None, streamed_links: list = None):
+        """
+        GET the static HTML of a page. Returns (status, response headers, text),
+        where text is None unless the status is 200 and the body reader accepts
+        the response, or None on errors. With a retry policy, failed requests
+        are retried and slow ones hedged. With `streamed_links`, the links are
+        extracted while the body streams in and added to that list.
+        """
+        if self.retry_policy is None:
+            response, links, size = await self._request_once(url, headers, streamed_links is not None)
+        else:
+            response, links, size = await self._request_with_retries(url, headers, streamed_links is not None)
+        # Only the response that is used counts, not every retry or hedge sent for it.
+        if response is not None:
+            self._record_fetch(url, response[0], size)
+        if links:
+            streamed_links.extend(links)
+        return response
+
+    async def _request_with_retries(self, url: str, headers: dict, stream_links: bool):
+        policy = self.retry_policy
+        host = (urlparse(url).hostname or '').lower()
+        budget = policy.budget(host)
+        attempt = 0
+        while True:
+            budget.deposit()
+            result = await self._hedged_request(url, headers, stream_links, host)
+            response = result[0]
+            attempt += 1
+            if not policy.retryable(response) or attempt >= policy.max_attempts:
+                return result
+            if not budget.withdraw():
+                logging.debug(f"Not retrying {url}: retry budget of {host} used up")
+                if self.metrics is not None:
+                    self.metrics.inc('retries_denied')
+                return result
+            delay = policy.backoff(attempt - 1, response)
+            logging.debug(f"Retrying {url} in {delay:.2f}s after {'an error' if response is None else response[0]}")
+            if self.metrics is not None:
+                self.metrics.inc('retries')
+            await asyncio.sleep(delay)
+
+    async def _hedged_request(self, url: str, headers: dict, stream_links: bool, host: str):
+        """
+        One attempt; when it outlasts the host's hedge delay and the retry budget
+        allows, a second request is sent and the first good answer is used.
+
+        The hedge delay is measured from the moment the first request holds its
+        politeness slot, like the latencies it derives from, so a request still
+        queued behind the scheduler is never hedged.
+        """
+        delay = self.retry_policy.hedge_delay(host)
+        if delay is None:
+            return await self._request_once(url, headers, stream_links)
+        slot_acquired = asyncio.Event()
+        primary = asyncio.ensure_future(self._request_once(url, headers, stream_links, slot_acquired))
+        tasks = {primary}
+        try:
+            waiter = asyncio.ensure_future(slot_acquired.wait())
+            try:
+                await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            if not primary.done():
+                await asyncio.wait(tasks, timeout=delay)
+            if primary.done():
+                return primary.result()
+            if self.retry_policy.budget(host).withdraw():
+                logging.debug(f"Hedging {url} after {delay:.3f}s")
+                if self.metrics is not None:
+                    self.metrics.inc('hedges')
+                tasks.add(asyncio.ensure_future(self._request_once(url, headers, stream_links)))
+            result = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not self.retry_policy.retryable(result[0]):
+                        return result
+            return result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _request_once(self, url: str, headers: dict, stream_links: bool, slot_acquired: asyncio.Event = None):
+        """
+        A single GET. Returns (response as for `request`, streamed links or None,
+        bytes read). `slot_acquired` is set once the politeness slot is held.
+        """
+        kwargs = {'headers': headers} if headers else {}
+        metrics = self.metrics
+        if metrics is not None:
+            # Lets the metrics' aiohttp trace config attribute DNS, connect and TTFB times to this crawl.
+            kwargs['trace_request_ctx'] = metrics
+        link_stream = self.link_extractor.stream(url) if stream_links else None
+        try:
+            async with self._slot(url) as ticket:
+                if slot_acquired is not None:
+                    slot_acquired.set()
+                if metrics is not None:
+                    metrics.in_flight += 1
+                start = time.perf_counter()
+                try:
+                    async with await self.session.get(url, **kwargs) as response:
+                        ticket.record(response.status, response.headers)
+                        if response.status != 200:
+                            logging.debug(f"Skipping URL {url} with status {response.status}")
+                            self._count_response(response.status, 0)
+                            return (response.status, response.headers, None), None, 0
+                        reason = self.body_reader.reject_reason(response.headers)
+                        if reason is not None:
+                            logging.debug(f"Not reading URL {url}: {reason}")
+                            self._count_response(response.status, 0)
+                            if metrics is not None:
+                                metrics.inc('bodies_skipped')
+                            return (response.status, response.headers, None), None, 0
+                        if metrics is not None:
+                            body_start = time.perf_counter()
+                        text, size = await self.body_reader.read(response, link_stream)
+                        if metrics is not None:
+                            metrics.observe('body', time.perf_counter() - body_start)
+                        if self.body_reader.max_bytes is not None and size >= self.body_reader.max_bytes:
+                            logging.debug(f"Read only the first {size} bytes of {url}")
+                        self._count_response(response.status, size)
+                        if self.retry_policy is not None:
+                            self.retry_policy.observe((urlparse(url).hostname or '').lower(), time.perf_counter() - start)
+                        links = link_stream.close() if link_stream is not None else None
+                        return (response.status, response.headers, text), links, size
+                finally:
+                    if metrics is not None:
+                        metrics.in_flight -= 1
+                        metrics.observe('fetch', time.perf_counter() - start)
+        except Exception as e:
+            logging.debug(f"Error fetching {url}: {e!r}")
+            if self.metrics is not None:
+                self.metrics.inc('fetch_errors')
+            return None, None, 0
+
+    async def fetch(self, url: str):
+        """
+        Fetch the static HTML of a page, returning None on errors and non-200 responses.
+        """
+        response = await self.request(url)
+        return response[2] if response is not None else None
+
+    def _count_response(self, status: int, size: int):
+        """
+        Metrics count every response received, retries and hedges included.
+        """
+        if self.metrics is not None:
+            self.metrics.inc(f'responses_{status // 100}xx')
+            self.metrics.inc('bytes', size)
+
+    def _record_fetch(self, url: str, status: int, size: int):
+        if self.budget is not None:
+            self.budget.add_bytes(size)
+        if self.store is not None:
+            self.store.fetched(self.crawl_key, url, status, size)
+
+    async def render(self, url: str):
+        """
+        Render a page in the browser (simulating infinite scroll), returning a
+        RenderResult or None on failure.
+        """
+        start = time.perf_counter()
         try:
-            async with await self.session.get(url) as response:
-                if response.status != 200:
-                    logging.debug(f"Skipping URL {url} with status {response.status}")
-                    return
-                text = await response.text()
-                soup = BeautifulSoup(text, 'html.parser')
+            logging.debug(f"Simulating infinite scroll for {url}")
+            result = await playwright_helper.render_page(url, max_scrolls=self.max_scroll, pool=self.browser_pool,
+                                                         network_options=self.network_options, **self.scroll_options)
+            if self.budget is not None:
+                self.budget.add_bytes(len(result.html))
+            if self.metrics is not None:
+                self.metrics.inc('renders')
+            return result
         except Exception as e:
-            logging.debug(f"Error fetching {url}: {e}")
+            logging.debug(f"Error during infinite scroll simulation for {url}: {e}")
+            if self.metrics is not None:
+                self.metrics.inc('render_errors')
+            return None
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe('render', time.perf_counter() - start)
+
+    async def parse(self, text: str, url: str, extra_urls: list = ()):
+        """
+        Return (in-scope links, product links) for a page, in the parse pool
+        when one is configured and inline otherwise.
+        """
+        if self.metrics is None:
+            if self.parse_pool is not None:
+                return await self.parse_pool.parse(text, url, self.scope, extra_urls)
+            return parse_page(text, url, self.scope, self.strategy, self.link_extractor, extra_urls, self.canonicalizer)
+        timings = {}
+        start = time.perf_counter()
+        if self.parse_pool is not None:
+            parsed = await self.parse_pool.parse(text, url, self.scope, extra_urls, timings)
+        else:
+            parsed = parse_page(text, url, self.scope, self.strategy, self.link_extractor, extra_urls, self.canonicalizer, timings)
+        self.metrics.observe('parse', time.perf_counter() - start)
+        self.metrics.observe('strategy', timings['strategy'])
+        return parsed
+
+    async def load_page(self, url: str, depth: int):
+        """
+        Return (in-scope links, product links) for a page, going through the
+        response cache when one is configured: pages fetched within the cache
+        TTL are not requested at all, and the rest are revalidated with a
+        conditional request. Unchanged pages (304) reuse their cached links
+        without being downloaded or parsed.
+        """
+        if self.cache is None:
+            parsed, _ = await self._load_page(url, depth)
+            return parsed
+        cached = self.cache.get(self.crawl_key, url)
+        if cached is not None and self.cache.is_fresh(cached):
+            logging.debug(f"Using cached links for {url}, fetched within the TTL")
+            if self.metrics is not None:
+                self.metrics.inc('cache_fresh')
+            return cached.links, cached.products
+        response = None
+        if cached is not None and (cached.etag or cached.last_modified):
+            response = await self.request(url, cached.conditional_headers())
+            if response is not None and response[0] == 304:
+                logging.debug(f"Using cached links for {url}, not modified")
+                if self.metrics is not None:
+                    self.metrics.inc('cache_not_modified')
+                cached.fetched_at = time.time()
+                self.cache.put(cached)
+                return cached.links, cached.products
+        parsed, headers = await self._load_page(url, depth, response)
+        if parsed is not None:
+            headers = headers or {}
+            links, products = parsed
+            self.cache.put(CachedPage(url, headers.get('ETag'), headers.get('Last-Modified'), list(links), list(products),
+                                      time.time(), self.crawl_key))
+        return parsed
+
+    async def _load_page(self, url: str, depth: int, response=None):
+        """
+        Return ((in-scope links, product links) or None, static response headers)
+        for a page, rendering it only when the base URL's render mode asks for
+        it. URLs harvested from API responses while rendering are included.
+        Exactly one response is parsed. `response` is a static response that
+        was already fetched, if any.
+        """
+        mode = self.base_url.render_mode(depth)
+        if mode == RENDER_ALWAYS:
+            # No need for the static response when the rendered one is used anyway.
+            result = await self.render(url)
+            if result is not None:
+                return await self.parse(result.html, url, result.discovered_urls), None
+        streamed_links = None
+        if response is None:
+            streamed_links = [] if self.stream_links else None
+            response = await self.request(url, streamed_links=streamed_links)
+        if response is None or response[2] is None:
+            return None, None
+        _, headers, text = response
+        if streamed_links is not None:
+            links, products = await self.parse(None, url, streamed_links)
+        else:
+            links, products = await self.parse(text, url)
+        if mode == RENDER_AUTO and self.render_heuristic.needs_render(text, links, products):
+            result = await self.render(url)
+            if result is not None:
+                return await self.parse(result.html, url, result.discovered_urls), headers
+        return (links, products), headers
+
+    async def crawl_page(self, url: str, depth: int):
+        logging.debug(f"Crawling: {url} at depth {depth}")
+
+        if self.budget is not None:
+            self.budget.add_page()
+        if self.metrics is not None:
+            self.metrics.inc('pages')
+        parsed = await self.load_page(url, depth)
+        if parsed is None:
             return
+        links, products = parsed
+        self.add_products(products)
+        product_links = set(products)
+        parent_yield = len(products) / len(links) if links else 0.0
+        if self.trap_detector is not None:
+            links = self.trap_detector.filter(url, links, product_links, self.visited)
+        if self.scorer is None:
+            for link in links:
+                self.enqueue(link, depth + 1)
+            return
+        for link in links:
+            self.enqueue(link, depth + 1, self.scorer.score(link, depth + 1, link in product_links, parent_yield))
+
+    def over_budget(self) -> bool:
+        if self.budget is None:
+            return False
+        reason = self.budget.exceeded()
+        if reason is not None and not self._budget_reported:
+            self._budget_reported = True
+            logging.info(f"Crawl budget of {self.crawl_key} used up after {reason}; skipping the rest of the frontier")
+        return reason is not None
 
-        # For the base page (depth 0), simulate infinite scroll
-        if(depth == 0):
+    async def _worker(self):
+        """
+        Pull (url, depth) items off the frontier until cancelled.
+        """
+        while True:
+            item = await self.frontier.get()
+            url, depth = item
             try:
-                logging.debug(f"Simulating infinite scroll for {url}")
-                rendered_text = await crawl_with_playwright(url, max_scrolls=self.max_scroll)
-                # Update soup to include dynamically loaded content.
-                soup = BeautifulSoup(rendered_text, 'html.parser')
-            except Exception as e:
-                logging.debug(f"Error during infinite scroll simulation for {url}: {e}")
-
-        tasks = []
-        for link in soup.find_all('a', href=True):
-            
-            absolute_url = urljoin(url, link['href'])
-            # Parse base_url and absolute_url for robust comparison
-            base_url_parsed = urlparse(self.base_absolute_url)
-            absolute_url_parsed = urlparse(absolute_url)
-            
-            if (absolute_url_parsed.netloc != '' and  
-                absolute_url_parsed.netloc.lstrip('www.') == base_url_parsed.netloc.lstrip('www.')
-                and (not self.base_url.path_validation or absolute_url_parsed.path.startswith(base_url_parsed.path))):
-                if self.strategy.is_product_url(absolute_url):
-                    self.product_urls.add(absolute_url)
-                tasks.append(self.crawl_page(absolute_url, depth + 1))
-        if tasks:
-            await asyncio.gather(*tasks)
+                if self.over_budget():
+                    # Left pending in the crawl store, so a resumed crawl picks it up.
+                    continue
+                try:
+                    await self.crawl_page(url, depth)
+                except Exception as e:
+                    logging.debug(f"Unexpected error crawling {url}: {e}")
+                if self.store is not None:
+                    self.store.completed(self.crawl_key, fingerprint(url))
+                    await self.store.maybe_flush()
+                if self.cache is not None:
+                    await self.cache.maybe_flush()
+                if self.sink is not None:
+                    await self.sink.maybe_flush()
+            finally:
+                self.frontier.task_done(item)
+
+    async def discover_from_sitemaps(self, robots=None, batch_size: int = 1000):
+        """
+        Collect product URLs from the site's sitemaps before
+        link crawling starts. They go through the same scope, robots and strategy
+        checks as crawled links and are marked visited, so the crawl only has to
+        fill the gaps.
+        """
+        discovery = SitemapDiscovery(self.session, slot=self._slot, **self.sitemap_options)
+        batch = []
+
+        def flush():
+            urls = [url for url in batch if self.scope.contains(url) and self.allowed(url)]
+            for url, is_product in zip(urls, self.strategy.classify(urls)):
+                if is_product:
+                    self.mark_visited(url)
+                    self.add_products([url])
+            batch.clear()
+
+        async for loc, _ in discovery.discover(self.base_absolute_url, robots):
+            batch.append(self.canonicalizer.canonicalize(loc))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        logging.debug(f"Found {len(self.product_urls)} product URLs in sitemaps for {self.base_absolute_url}")
+
+    def restore(self, state: CrawlState) -> bool:
+        """
+        Continue from a checkpoint: everything enqueued before counts as visited
+        and only the URLs that were never handled are queued again. Products
+        found before go to the result sink again, which drops the ones it has.
+        """
+        if state.is_empty():
+            return False
+        for fp in state.visited:
+            self.visited.add_fingerprint(fp)
+        for url in state.products:
+            self.product_urls.add(url)
+            if self.sink is not None:
+                self.sink.write(self.crawl_key, url)
+        for url, depth in state.pending:
+            self.frontier.put_nowait((url, depth))
+        logging.info(f"Resuming {self.crawl_key}: {len(state.pending)} pending URLs, {len(state.products)} products")
+        return True
 
     async def start(self):
         """
         Kick off the crawling process from the base URL.
+
+        robots.txt and sitemaps are read first when enabled. Then a fixed pool
+        of worker tasks drains the frontier queue; the crawl is finished once
+        every queued URL has been processed. With a store and `resume`, the
+        crawl continues from the last checkpoint instead. Returns the product
+        URLs, or just their fingerprints when they went to a result sink.
         """
-        await self.crawl_page(self.base_absolute_url, 0)
+        robots = None
+        if self.scheduler is not None or self.respect_robots or self.use_sitemaps:
+            robots = await fetch_robots(self.session, self.base_absolute_url, self._slot)
+        if robots is not None:
+            if self.scheduler is not None:
+                self.scheduler.set_crawl_delay(urlparse(self.base_absolute_url).hostname, robots.crawl_delay('*'))
+            if self.respect_robots:
+                self.robots = robots
+        if self.frontier is None:
+            self.frontier = PriorityFrontier() if self.scorer is not None else LocalFrontier()
+        if self.metrics is not None:
+            self.metrics.gauges['frontier'] = self.frontier.qsize
+        if self.budget is not None:
+            self.budget.start()
+        resumed = False
+        if self.store is not None:
+            if self.resume:
+                resumed = self.restore(await self.store.load(self.crawl_key))
+            else:
+                await self.store.reset(self.crawl_key)
+        if not resumed:
+            self.enqueue(self.canonicalizer.canonicalize(self.base_absolute_url), 0)
+            if self.use_sitemaps:
+                await self.discover_from_sitemaps(robots)
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            await self.frontier.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.store is not None:
+                await self.store.flush()
+            if self.cache is not None:
+                await self.cache.flush()
+            if self.sink is not None:
+                await self.sink.flush()
+        if self.trap_detector is not None and self.trap_detector.skipped:
+            logging.info(f"Trap detector skipped links of {self.crawl_key}: {dict(self.trap_detector.skipped)}")
         return self.product_urls
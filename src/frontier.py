@@ -0,0 +1,160 @@
+import asyncio
+import itertools
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from frontier_service import FrontierClient
+
+class Frontier(ABC):
+    """
+    Abstract base class for the queue of (url, depth) items a DomainCrawler's
+    workers take pages from. It follows the asyncio.Queue protocol, except that
+    `put_nowait` takes a priority (ignored by frontiers that do not rank) and
+    `task_done` is told which item was finished.
+    """
+    @abstractmethod
+    def put_nowait(self, item: tuple, priority: float = 0.0):
+        pass
+
+    @abstractmethod
+    async def get(self) -> tuple:
+        pass
+
+    @abstractmethod
+    def task_done(self, item: tuple):
+        pass
+
+    @abstractmethod
+    async def join(self):
+        pass
+
+    @abstractmethod
+    def qsize(self) -> int:
+        """
+        Number of items waiting in this process.
+        """
+        pass
+
+class LocalFrontier(asyncio.Queue, Frontier):
+    """
+    In-process frontier: a plain asyncio.Queue, crawled in FIFO (breadth-first) order.
+    """
+    def put_nowait(self, item: tuple, priority: float = 0.0):
+        super().put_nowait(item)
+
+    def task_done(self, item: tuple = None):
+        super().task_done()
+
+class PriorityFrontier(asyncio.PriorityQueue, Frontier):
+    """
+    In-process best-first frontier: the item with the highest priority is
+    handed out first, ties in the order they were added.
+    """
+    def __init__(self):
+        super().__init__()
+        self._order = itertools.count()
+
+    def put_nowait(self, item: tuple, priority: float = 0.0):
+        super().put_nowait((-priority, next(self._order), item))
+
+    async def get(self) -> tuple:
+        _, _, item = await super().get()
+        return item
+
+    def task_done(self, item: tuple = None):
+        super().task_done()
+
+class SharedFrontier(Frontier):
+    """
+    Frontier of one crawl shared by several nodes through a FrontierCoordinator.
+
+    Added items are sent to the coordinator in batches of `batch_size`, which
+    deduplicates them across nodes. Workers are fed from leases of up to
+    `lease_size` items; a lease is completed once all of its items are done,
+    after the links they produced have been sent. `join` returns when the
+    coordinator reports the crawl finished on every node.
+    """
+    def __init__(self, client: FrontierClient, crawl: str, lease_size: int = 20, batch_size: int = 100,
+                 poll_interval: float = 0.5):
+        self.client = client
+        self.crawl = crawl
+        self.lease_size = lease_size
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._outbox = []
+        self._buffer = deque()
+        # item -> leases it was handed out in, oldest first: after a missed heartbeat
+        # the coordinator may lease an item again while the first copy is still queued here.
+        self._lease_of = {}
+        self._remaining = {}
+        self._lease_lock = asyncio.Lock()
+        self._tasks = set()
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Error talking to the frontier coordinator for {self.crawl}: {task.exception()}")
+
+    def put_nowait(self, item: tuple, priority: float = 0.0):
+        self._outbox.append(item)
+        if len(self._outbox) >= self.batch_size:
+            self._spawn(self._flush())
+
+    async def _flush(self):
+        if not self._outbox:
+            return
+        items = self._outbox
+        self._outbox = []
+        await self.client.request('add', crawl=self.crawl, items=items)
+
+    async def get(self) -> tuple:
+        while True:
+            if self._buffer:
+                return self._buffer.popleft()
+            async with self._lease_lock:
+                if self._buffer:
+                    continue
+                await self._flush()
+                response = await self.client.request('lease', crawl=self.crawl, max=self.lease_size)
+                if response['items']:
+                    lease = response['lease']
+                    self._remaining[lease] = len(response['items'])
+                    for url, depth in response['items']:
+                        self._lease_of.setdefault((url, depth), deque()).append(lease)
+                        self._buffer.append((url, depth))
+                    continue
+            await asyncio.sleep(self.poll_interval)
+
+    def task_done(self, item: tuple):
+        leases = self._lease_of.get(item)
+        if not leases:
+            return
+        lease = leases.popleft()
+        if not leases:
+            del self._lease_of[item]
+        self._remaining[lease] -= 1
+        if not self._remaining[lease]:
+            del self._remaining[lease]
+            self._spawn(self._complete(lease))
+
+    def qsize(self) -> int:
+        return len(self._buffer) + len(self._outbox)
+
+    async def _complete(self, lease: int):
+        await self._flush()
+        await self.client.request('complete', lease=lease)
+
+    async def join(self):
+        while True:
+            await self._flush()
+            if not self._remaining and not self._buffer:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+                response = await self.client.request('status', crawl=self.crawl)
+                if response['finished']:
+                    return
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,209 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from urllib.parse import urlparse
+from canonical import fingerprint
+from visited import FingerprintSet
+
+class _Lease:
+    """
+    A batch of (url, depth) items of one crawl handed to one node.
+    """
+    def __init__(self, lease_id: int, node: str, crawl: str, host: str, items: list):
+        self.lease_id = lease_id
+        self.node = node
+        self.crawl = crawl
+        self.host = host
+        self.items = items
+
+class FrontierCoordinator:
+    """
+    Owns the frontier and visited set of a crawl spread over several nodes, and
+    leases batches of URLs to the nodes over TCP (one JSON object per line).
+
+    What it does:
+      - Deduplicate the URLs nodes add, per crawl, by 64-bit fingerprint.
+      - Queue URLs per host and lease a host's URLs only to the node that owns it,
+        so politeness stays per node. A node claims a host by leasing from it first.
+      - Treat a node that has not been heard from for `lease_timeout` seconds as dead:
+        re-queue the URLs it had leased and release its hosts.
+      - Report a crawl as finished once nothing is queued or leased for it.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, lease_timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.lease_timeout = lease_timeout
+        self._visited = {}
+        self._queues = {}
+        self._owners = {}
+        self._leases = {}
+        self._last_seen = {}
+        self._lease_ids = itertools.count(1)
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # The port is picked by the OS when 0 was asked for.
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info(f"Frontier coordinator listening on {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    response = self.dispatch(request.pop('op'), **request)
+                except Exception as e:
+                    response = {'error': repr(e)}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError as e:
+            logging.debug(f"Frontier client disconnected: {e}")
+        finally:
+            writer.close()
+
+    def dispatch(self, op: str, node: str, **fields) -> dict:
+        now = time.monotonic()
+        self._last_seen[node] = now
+        self.expire(now)
+        if op == 'add':
+            return {'added': self.add(fields['crawl'], fields['items'])}
+        if op == 'lease':
+            return self.lease(node, fields['crawl'], fields['max'])
+        if op == 'complete':
+            self._leases.pop(fields['lease'], None)
+            return {}
+        if op == 'status':
+            return {'finished': self.finished(fields['crawl'])}
+        if op == 'heartbeat':
+            return {}
+        raise ValueError(f"Unknown operation: {op}")
+
+    def add(self, crawl: str, items: list) -> int:
+        visited = self._visited.setdefault(crawl, FingerprintSet())
+        queues = self._queues.setdefault(crawl, {})
+        added = 0
+        for url, depth in items:
+            if visited.add_fingerprint(fingerprint(url)):
+                host = (urlparse(url).hostname or '').lower()
+                queues.setdefault(host, deque()).append((url, depth))
+                added += 1
+        return added
+
+    def lease(self, node: str, crawl: str, max_items: int) -> dict:
+        queues = self._queues.get(crawl, {})
+        owned = [host for host, queue in queues.items() if queue and self._owners.get(host) == node]
+        free = [host for host, queue in queues.items() if queue and host not in self._owners]
+        if not owned and not free:
+            return {'lease': None, 'items': []}
+        host = owned[0] if owned else free[0]
+        self._owners[host] = node
+        queue = queues[host]
+        items = [queue.popleft() for _ in range(min(max_items, len(queue)))]
+        lease = _Lease(next(self._lease_ids), node, crawl, host, items)
+        self._leases[lease.lease_id] = lease
+        return {'lease': lease.lease_id, 'items': items}
+
+    def finished(self, crawl: str) -> bool:
+        if any(self._queues.get(crawl, {}).values()):
+            return False
+        return not any(lease.crawl == crawl for lease in self._leases.values())
+
+    def expire(self, now: float):
+        dead = {node for node, seen in self._last_seen.items() if now - seen > self.lease_timeout}
+        if not dead:
+            return
+        for lease_id, lease in list(self._leases.items()):
+            if lease.node in dead:
+                logging.info(f"Re-queueing {len(lease.items)} URLs leased by node {lease.node}")
+                self._queues[lease.crawl][lease.host].extendleft(reversed(lease.items))
+                del self._leases[lease_id]
+        self._owners = {host: node for host, node in self._owners.items() if node not in dead}
+        for node in dead:
+            del self._last_seen[node]
+
+class FrontierClient:
+    """
+    A node's connection to the FrontierCoordinator. Requests are serialized on
+    one connection; a heartbeat every `heartbeat_interval` seconds keeps the
+    node's leases alive while pages take long to crawl.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, node: str = None, heartbeat_interval: float = 5.0):
+        self.host = host
+        self.port = port
+        self.node = node or uuid.uuid4().hex
+        self.heartbeat_interval = heartbeat_interval
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        self._heartbeat = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._heartbeat = asyncio.create_task(self._send_heartbeats())
+
+    async def _send_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.request('heartbeat')
+            except (ConnectionError, RuntimeError) as e:
+                logging.debug(f"Frontier heartbeat failed: {e}")
+
+    async def request(self, op: str, **fields) -> dict:
+        # Shielded: a caller cancelled mid-request must not leave its response unread on the connection.
+        return await asyncio.shield(self._request(op, fields))
+
+    async def _request(self, op: str, fields: dict) -> dict:
+        async with self._lock:
+            self._writer.write(json.dumps({'op': op, 'node': self.node, **fields}).encode() + b'\n')
+            await self._writer.drain()
+            line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Frontier coordinator closed the connection")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(f"Frontier coordinator error: {response['error']}")
+        return response
+
+    async def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
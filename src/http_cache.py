@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+class CachedPage:
+    """
+    What is remembered about a page between runs: its HTTP validators, the
+    links and product links extracted from it, and when it was last fetched.
+    The links are filtered by the scope and strategy of one crawl (base URL),
+    so a page is cached per `crawl`.
+    """
+    def __init__(self, url: str, etag: str = None, last_modified: str = None, links: list = None, products: list = None,
+                 fetched_at: float = 0.0, crawl: str = ''):
+        self.crawl = crawl
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.links = links or []
+        self.products = products or []
+        self.fetched_at = fetched_at
+
+    def conditional_headers(self) -> dict:
+        """
+        Request headers that let the server answer 304 Not Modified.
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache(ABC):
+    """
+    Abstract base class for the cache used for incremental recrawls.
+
+    Pages fetched less than `ttl` seconds ago are not requested at all; older
+    pages are revalidated with a conditional request.
+    """
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return bool(self.ttl) and time.time() - page.fetched_at < self.ttl
+
+    @abstractmethod
+    def get(self, crawl: str, url: str) -> CachedPage:
+        pass
+
+    @abstractmethod
+    def put(self, page: CachedPage):
+        pass
+
+    @abstractmethod
+    async def maybe_flush(self):
+        pass
+
+    @abstractmethod
+    async def flush(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    ResponseCache stored in a SQLite database on disk.
+
+    Lookups read the database directly (one primary key lookup per page);
+    updates are buffered and written in batches of `batch_size` on a
+    dedicated thread, through a second connection.
+    """
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            crawl TEXT NOT NULL, url TEXT NOT NULL, etag TEXT, last_modified TEXT, links TEXT NOT NULL,
+            products TEXT NOT NULL, fetched_at REAL NOT NULL, PRIMARY KEY (crawl, url));
+    """
+
+    def __init__(self, path: str, ttl: float = 0, batch_size: int = 200):
+        super().__init__(ttl)
+        self.path = path
+        self.batch_size = batch_size
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._writer.execute("PRAGMA table_info(pages)")]
+        if columns and 'crawl' not in columns:
+            # A cache from before pages were kept per crawl; it is only a cache, so start over.
+            logging.info(f"Recreating the response cache in {path}")
+            self._writer.execute("DROP TABLE pages")
+        self._writer.executescript(self._SCHEMA)
+        self._reader = sqlite3.connect(path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+        self._pending = {}
+
+    def get(self, crawl: str, url: str) -> CachedPage:
+        page = self._pending.get((crawl, url))
+        if page is not None:
+            return page
+        row = self._reader.execute("SELECT etag, last_modified, links, products, fetched_at FROM pages WHERE crawl = ? AND url = ?",
+                                   (crawl, url)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, links, products, fetched_at = row
+        return CachedPage(url, etag, last_modified, json.loads(links), json.loads(products), fetched_at, crawl)
+
+    def put(self, page: CachedPage):
+        self._pending[(page.crawl, page.url)] = page
+
+    def _write(self, pages: list):
+        rows = [(page.crawl, page.url, page.etag, page.last_modified, json.dumps(page.links), json.dumps(page.products),
+                 page.fetched_at) for page in pages]
+        with self._writer:
+            self._writer.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    async def maybe_flush(self):
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        pages = list(self._pending.values())
+        loop = asyncio.get_running_loop()
+        try:
+            if pages:
+                await loop.run_in_executor(self._executor, self._write, pages)
+        except sqlite3.Error as e:
+            logging.error(f"Error writing response cache to {self.path}: {e}")
+        finally:
+            # Drop only what was written; pages cached meanwhile stay pending.
+            for page in pages:
+                if self._pending.get((page.crawl, page.url)) is page:
+                    del self._pending[(page.crawl, page.url)]
+
+    def close(self):
+        self._executor.shutdown()
+        self._reader.close()
+        self._writer.close()
@@ -0,0 +1,196 @@
+from abc import ABC, abstractmethod
+import html
+import re
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+class LinkExtractor(ABC):
+    """
+    Abstract base class for pulling links out of a page.
+    """
+    @abstractmethod
+    def extract(self, text: str, page_url: str) -> list:
+        """
+        Return the absolute URLs of every <a href> in the page, resolved
+        against the page's <base href> when it has one.
+        """
+        pass
+
+    def stream(self, page_url: str) -> 'LinkStream':
+        """
+        Return a LinkStream that extracts the links of a page fed in chunks.
+        """
+        return LinkStream(self, page_url)
+
+class LinkStream:
+    """
+    Incremental counterpart of `LinkExtractor.extract`: `feed` the decoded
+    chunks of a page as they arrive, then `close` returns the same links.
+    This default keeps the chunks and extracts them all at `close`.
+    """
+    def __init__(self, extractor: LinkExtractor, page_url: str):
+        self.extractor = extractor
+        self.page_url = page_url
+        self._chunks = []
+
+    def feed(self, text: str):
+        self._chunks.append(text)
+
+    def close(self) -> list:
+        text = ''.join(self._chunks)
+        self._chunks = []
+        return self.extractor.extract(text, self.page_url)
+
+class SoupLinkExtractor(LinkExtractor):
+    """
+    Builds a full BeautifulSoup tree. Slow, but tolerant of any markup.
+    """
+    def extract(self, text: str, page_url: str) -> list:
+        soup = BeautifulSoup(text, 'html.parser')
+        base = soup.find('base', href=True)
+        base_url = urljoin(page_url, base['href'].strip()) if base else page_url
+        return [urljoin(base_url, link['href'].strip()) for link in soup.find_all('a', href=True)]
+
+class FastLinkExtractor(LinkExtractor):
+    """
+    Scans the raw HTML for <a> and <base> start tags with a single regex pass
+    and only decodes their href values; no tree is built. Comments and the
+    contents of <script>/<style> are skipped, as an HTML parser would. As in
+    a browser, a comment, element or start tag left open runs to the end of
+    the page, so each is only scanned to its end once.
+    """
+    # Attributes of a start tag; a quote only opens a quoted value right after an '='.
+    _ATTRS = r'''(?:[^>=]+|=\s*"[^"]*"|=\s*'[^']*'|=(?!\s*["']))*'''
+    _TOKEN_RE = re.compile(
+        r'<!--'
+        r'|<(script|style)\b' + _ATTRS + r'>?'
+        r'|<(a|base)\s(' + _ATTRS + r')>?',
+        re.IGNORECASE)
+    _ATTR_RE = re.compile(r'''([^\s=>]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]*))?''')
+    _COMMENT_CLOSE_RE = re.compile(r'-->')
+    _RAW_CLOSE_RES = {name: re.compile(rf'</{name}\s*>', re.IGNORECASE) for name in ('script', 'style')}
+
+    def extract(self, text: str, page_url: str) -> list:
+        stream = FastLinkStream(page_url)
+        stream.scan(text, final=True)
+        return stream.close()
+
+    def stream(self, page_url: str) -> 'FastLinkStream':
+        return FastLinkStream(page_url)
+
+class FastLinkStream(LinkStream):
+    """
+    Runs the FastLinkExtractor scan over each chunk as it arrives and keeps
+    only the unfinished tail: a tag cut off at the chunk boundary, or a
+    comment or <script>/<style> element that is not closed yet. While such an
+    element is open only the new text is searched for its end, so a large
+    script arriving in many chunks is not scanned again for every chunk.
+    """
+    _RAW_OPEN_RE = re.compile(r'<(script|style)\b', re.IGNORECASE)
+
+    def __init__(self, page_url: str):
+        self.page_url = page_url
+        self.base_url = page_url
+        self.seen_base = False
+        self.hrefs = []
+        self._buffer = ''
+        # End of the comment or element the buffer starts with, and where to look for it next.
+        self._close_re = None
+        self._close_from = 0
+
+    def feed(self, text: str):
+        buffer = self._buffer + text
+        if self._close_re is not None:
+            close = self._close_re.search(buffer, self._close_from)
+            if close is None:
+                # Only a close tag cut off at the end of the buffer can still complete.
+                if self._close_re is FastLinkExtractor._COMMENT_CLOSE_RE:
+                    self._close_from = max(self._close_from, len(buffer) - 2)
+                else:
+                    last = buffer.rfind('<', self._close_from)
+                    self._close_from = last if last >= 0 else len(buffer)
+                self._buffer = buffer
+                return
+        self._buffer = self.scan(buffer, final=False)
+        if self._close_re is not None and len(self._buffer) == len(buffer):
+            # The end found did not close the element (say, it was inside a quoted
+            # attribute of the start tag): keep looking after it.
+            self._close_from = close.end()
+            return
+        self._wait_for_close()
+
+    def _wait_for_close(self):
+        buffer = self._buffer
+        self._close_re = None
+        self._close_from = 0
+        if buffer.startswith('<!--'):
+            self._close_re = FastLinkExtractor._COMMENT_CLOSE_RE
+            self._close_from = 4
+        else:
+            raw = self._RAW_OPEN_RE.match(buffer)
+            if raw is not None:
+                self._close_re = FastLinkExtractor._RAW_CLOSE_RES[raw.group(1).lower()]
+                self._close_from = raw.end()
+
+    def close(self) -> list:
+        self.scan(self._buffer, final=True)
+        self._buffer = ''
+        self._close_re = None
+        return [urljoin(self.base_url, href) for href in self.hrefs]
+
+    def scan(self, text: str, final: bool) -> str:
+        """
+        Collect the hrefs of the complete tokens in `text` and return the part
+        that has to wait for more input (nothing when `final`).
+        """
+        pos = 0
+        token_search = FastLinkExtractor._TOKEN_RE.search
+        while True:
+            match = token_search(text, pos)
+            if match is None:
+                break
+            raw, tag = match.group(1), match.group(2)
+            if (raw is not None or tag is not None) and text[match.end() - 1] != '>':
+                # A start tag without its '>' (or with an unclosed quoted value).
+                return '' if final else text[match.start():]
+            if tag is None:
+                # A comment or <script>/<style> element: the close tag is looked for once.
+                close_re = FastLinkExtractor._COMMENT_CLOSE_RE if raw is None else FastLinkExtractor._RAW_CLOSE_RES[raw.lower()]
+                close = close_re.search(text, match.end())
+                if close is None:
+                    return '' if final else text[match.start():]
+                pos = close.end()
+                continue
+            pos = match.end()
+            for attribute in FastLinkExtractor._ATTR_RE.finditer(match.group(3)):
+                if attribute.group(1).lower() == 'href':
+                    break
+            else:
+                continue
+            value = attribute.group(2)
+            if value is None:
+                continue
+            if value[:1] in ('"', "'"):
+                value = value[1:-1]
+            value = html.unescape(value).strip()
+            if tag.lower() == 'a':
+                self.hrefs.append(value)
+            elif not self.seen_base:
+                # Only the first <base href> counts.
+                self.seen_base = True
+                self.base_url = urljoin(self.page_url, value)
+        if final:
+            return ''
+        # Only the start of a token ('<script' at most) can be cut off at the end.
+        tail = text.rfind('<', max(pos, len(text) - len('<script')))
+        return text[tail:] if tail >= 0 else ''
+
+LINK_EXTRACTORS = {
+    "fast": FastLinkExtractor,
+    "soup": SoupLinkExtractor,
+}
+
+def get_link_extractor(name: str = "fast") -> LinkExtractor:
+    if name not in LINK_EXTRACTORS:
+        raise ValueError(f"Unknown link extractor: {name}")
+    return LINK_EXTRACTORS[name]()
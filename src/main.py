@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import json
 import time
@@ -5,6 +6,13 @@ import logging
 from crawler_manager import CrawlerManager
 from strategies import RegexBasedDiscoveryStrategy
 from models import BaseUrl
+from link_extractors import get_link_extractor
+from crawl_store import SQLiteCrawlStore
+from http_cache import SQLiteResponseCache
+from result_sinks import make_result_sink, aggregate_results
+from sharded_manager import ShardedCrawlerManager
+from frontier_service import FrontierCoordinator
+from metrics import CrawlMetrics
 from config import configuration
 
 # -----------------------------------------------------------------------------
@@ -12,22 +20,107 @@ from config import configuration
 # -----------------------------------------------------------------------------
 
 def main():
+    parser = argparse.ArgumentParser(description="Discover product URLs on e-commerce sites.")
+    parser.add_argument("--resume", action="store_true", help="continue the previous crawl from the state store")
+    parser.add_argument("--coordinator", action="store_true", help="run the frontier coordinator of a multi-node crawl")
+    args = parser.parse_args()
     logging.basicConfig(level=configuration["log_level"])
+
+    # Multi-node crawl: one process runs the coordinator, every node runs the crawl against it
+    shared_frontier = configuration.get("shared_frontier")
+    if args.coordinator:
+        if not shared_frontier:
+            parser.error("--coordinator needs a shared_frontier in config.yaml")
+        coordinator = FrontierCoordinator(shared_frontier.get("host", "127.0.0.1"), shared_frontier.get("port", 8765),
+                                          shared_frontier.get("lease_timeout", 30.0))
+        asyncio.run(coordinator.serve_forever())
+        return
+    if shared_frontier:
+        shared_frontier = {key: value for key, value in shared_frontier.items() if key != "lease_timeout"}
+
+    # Optional checkpoint store; required for --resume
+    store_options = configuration.get("state_store")
+    if args.resume and not store_options:
+        parser.error("--resume needs a state_store in config.yaml")
+
+    # Optional response cache for incremental recrawls
+    cache_options = configuration.get("http_cache")
+
+    # Optional sink that receives product URLs as they are found; a resumed crawl adds to it
+    sink_options = configuration.get("result_sink")
+    sink = make_result_sink(**sink_options, append=args.resume) if sink_options else None
     
     # Load base URLs and patterns from config file
-    base_urls_list = [BaseUrl(url["domain"], url["path"], url["path_validation"]) for url in configuration["base_urls"]]
+    base_urls_list = [BaseUrl(url["domain"], url["path"], url["path_validation"],
+                              render=url.get("render", "always"), render_max_depth=url.get("render_max_depth", 0))
+                      for url in configuration["base_urls"]]
     
     # Create the discovery strategy (Strategy Pattern)
     strategy = RegexBasedDiscoveryStrategy(configuration["patterns"])
     
     # Create the manager and run crawlers concurrently
-    manager = CrawlerManager(base_urls_list, strategy, max_depth=configuration["max_depth"], max_scroll=configuration["max_scroll"])
-    results = asyncio.run(manager.run())
-    
-    # Save the structured results to a JSON file.
-    with open("../output/product_urls.json", "w") as f:
-        json.dump(results, f, indent=4)
-    
+    manager_options = dict(max_depth=configuration["max_depth"], max_scroll=configuration["max_scroll"],
+                           workers_per_domain=configuration.get("workers_per_domain", 10),
+                           browser_pool_options=configuration.get("browser_pool"),
+                           scroll_options=configuration.get("scroll_options"),
+                           render_heuristic_options=configuration.get("render_heuristic"),
+                           network_options=configuration.get("network_options"),
+                           body_options=configuration.get("response_body"),
+                           timeout_options=configuration.get("timeouts"),
+                           retry_options=configuration.get("retries"),
+                           link_extractor=get_link_extractor(configuration.get("link_extractor", "fast")),
+                           parse_workers=configuration.get("parse_workers", 0),
+                           max_parse_jobs=configuration.get("max_parse_jobs"),
+                           canonicalization_options=configuration.get("canonicalization"),
+                           visited_options=configuration.get("visited_set"),
+                           politeness_options=configuration.get("politeness"),
+                           respect_robots=configuration.get("respect_robots", False),
+                           use_sitemaps=configuration.get("use_sitemaps", False),
+                           sitemap_options=configuration.get("sitemap_options"),
+                           scorer_options=configuration.get("priority"),
+                           budget_options=configuration.get("crawl_budget"),
+                           trap_options=configuration.get("trap_detection"),
+                           shared_frontier=shared_frontier, resume=args.resume)
+    # Optional instrumentation: periodic stats log, JSON snapshot, Prometheus endpoint
+    metrics_options = configuration.get("metrics")
+    store = cache = metrics = None
+    if configuration.get("shards", 0) > 0:
+        # One process per shard; each opens its own store and cache
+        manager = ShardedCrawlerManager(base_urls_list, strategy, processes=configuration["shards"],
+                                        groups_per_process=configuration.get("groups_per_shard", 4),
+                                        manager_options=manager_options, store_options=store_options,
+                                        cache_options=cache_options, sink=sink, metrics_options=metrics_options)
+    else:
+        store = SQLiteCrawlStore(**store_options) if store_options else None
+        cache = SQLiteResponseCache(**cache_options) if cache_options else None
+        metrics = CrawlMetrics(**metrics_options) if metrics_options else None
+        manager = CrawlerManager(base_urls_list, strategy, store=store, cache=cache, sink=sink, metrics=metrics,
+                                 **manager_options)
+
+    async def crawl():
+        if metrics is None:
+            return await manager.run()
+        async with metrics:
+            return await manager.run()
+
+    try:
+        results = asyncio.run(crawl())
+    finally:
+        if store is not None:
+            store.close()
+        if cache is not None:
+            cache.close()
+        if sink is not None:
+            sink.close()
+
+    # Save the structured results to a JSON file. With a sink, they are collected from it.
+    if sink is not None:
+        counts = aggregate_results(sink, "../output/product_urls.json")
+        logging.info(f"Product URLs per base URL: {counts}")
+    else:
+        with open("../output/product_urls.json", "w") as f:
+            json.dump(results, f, indent=4)
+
     logging.info("Crawling completed. Results saved to product_urls.json")
 
 if __name__ == "__main__":
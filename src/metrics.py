@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+import aiohttp
+from aiohttp import web
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram; observing a value is one bisect and two additions.
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One more slot for values above the last bound.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket the q-quantile falls in (inf above the last bound), or None when empty.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> dict:
+        return {'count': self.count, 'sum': self.sum, 'p50': self.quantile(0.5), 'p95': self.quantile(0.95),
+                'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts))}
+
+class DomainMetrics:
+    """
+    Counters, latency histograms and gauges of one crawl (base URL). Gauges are
+    callables evaluated only when the metrics are read.
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = Counter()
+        self.histograms = {}
+        self.gauges = {}
+        self.in_flight = 0
+
+    def inc(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def gauge_values(self) -> dict:
+        values = {name: gauge() for name, gauge in self.gauges.items()}
+        values['in_flight'] = self.in_flight
+        return values
+
+    def snapshot(self) -> dict:
+        return {'counters': dict(self.counters), 'gauges': self.gauge_values(),
+                'histograms': {name: histogram.snapshot() for name, histogram in self.histograms.items()}}
+
+    def summary(self) -> str:
+        """
+        One line for the periodic stats log.
+        """
+        gauges = self.gauge_values()
+        parts = [f"{self.counters['pages']} pages", f"{self.counters['products']} products",
+                 f"frontier {gauges.get('frontier', 0)}", f"in flight {gauges['in_flight']}"]
+        for name in ('ttfb', 'body', 'parse', 'strategy', 'render'):
+            histogram = self.histograms.get(name)
+            if histogram is not None and histogram.count:
+                parts.append(f"{name} p50/p95 {histogram.quantile(0.5):g}/{histogram.quantile(0.95):g}s")
+        return ", ".join(parts)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class CrawlMetrics:
+    """
+    Instrumentation of every crawl in a process.
+
+    What it does:
+      - Hand every DomainCrawler its DomainMetrics (`domain`), which it updates on the
+        hot path: counters, and histograms of fetch, body, parse, strategy and render time.
+      - Time DNS, connect and time to first byte of the HTTP requests through an aiohttp
+        TraceConfig (`trace_config`); requests are attributed to the DomainMetrics passed
+        as their `trace_request_ctx`.
+      - Log a line per crawl every `log_interval` seconds (0 disables it) and, with a
+        `snapshot_path`, rewrite a JSON snapshot at the same times and on close.
+      - With a `prometheus_port`, serve the metrics in the Prometheus text format on
+        http://`prometheus_host`:`prometheus_port`/metrics.
+    """
+    def __init__(self, log_interval: float = 60.0, snapshot_path: str = None, prometheus_port: int = None,
+                 prometheus_host: str = '127.0.0.1', buckets: tuple = DEFAULT_BUCKETS):
+        self.log_interval = log_interval
+        self.snapshot_path = snapshot_path
+        self.prometheus_port = prometheus_port
+        self.prometheus_host = prometheus_host
+        self.buckets = tuple(buckets)
+        self.domains = {}
+        self.started_at = time.time()
+        self._reporter = None
+        self._runner = None
+
+    def domain(self, key: str) -> DomainMetrics:
+        metrics = self.domains.get(key)
+        if metrics is None:
+            metrics = self.domains[key] = DomainMetrics(self.buckets)
+        return metrics
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.start = time.perf_counter()
+
+        async def on_dns_resolvehost_start(session, context, params):
+            context.dns_start = time.perf_counter()
+
+        async def on_dns_resolvehost_end(session, context, params):
+            if isinstance(context.trace_request_ctx, DomainMetrics):
+                context.trace_request_ctx.observe('dns', time.perf_counter() - context.dns_start)
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            if isinstance(context.trace_request_ctx, DomainMetrics):
+                context.trace_request_ctx.observe('connect', time.perf_counter() - context.connect_start)
+
+        async def on_request_end(session, context, params):
+            # Fired once the response headers are in.
+            if isinstance(context.trace_request_ctx, DomainMetrics):
+                context.trace_request_ctx.observe('ttfb', time.perf_counter() - context.start)
+
+        async def on_request_exception(session, context, params):
+            if isinstance(context.trace_request_ctx, DomainMetrics):
+                context.trace_request_ctx.inc('network_errors')
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    def snapshot(self) -> dict:
+        return {'time': time.time(), 'uptime': time.time() - self.started_at,
+                'domains': {key: metrics.snapshot() for key, metrics in self.domains.items()}}
+
+    def write_snapshot(self, path: str = None):
+        path = path or self.snapshot_path
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def log_stats(self):
+        for key, metrics in self.domains.items():
+            logging.info(f"Stats {key}: {metrics.summary()}")
+
+    def prometheus_text(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format, labelled by crawl.
+        """
+        counters, gauges, histograms = {}, {}, {}
+        for key, metrics in self.domains.items():
+            label = f'crawl="{_escape(key)}"'
+            for name, value in metrics.counters.items():
+                counters.setdefault(name, []).append((label, value))
+            for name, value in metrics.gauge_values().items():
+                gauges.setdefault(name, []).append((label, value))
+            for name, histogram in metrics.histograms.items():
+                histograms.setdefault(name, []).append((label, histogram))
+        lines = []
+        for name, samples in sorted(counters.items()):
+            lines.append(f"# TYPE crawler_{name}_total counter")
+            lines.extend(f"crawler_{name}_total{{{label}}} {value}" for label, value in samples)
+        for name, samples in sorted(gauges.items()):
+            lines.append(f"# TYPE crawler_{name} gauge")
+            lines.extend(f"crawler_{name}{{{label}}} {value}" for label, value in samples)
+        for name, samples in sorted(histograms.items()):
+            lines.append(f"# TYPE crawler_{name}_seconds histogram")
+            for label, histogram in samples:
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'crawler_{name}_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f"crawler_{name}_seconds_sum{{{label}}} {histogram.sum}")
+                lines.append(f"crawler_{name}_seconds_count{{{label}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    async def _serve_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.prometheus_text().encode(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.log_interval)
+            self.log_stats()
+            if self.snapshot_path:
+                self.write_snapshot()
+
+    async def start(self):
+        if self.log_interval:
+            self._reporter = asyncio.create_task(self._report())
+        if self.prometheus_port is not None:
+            app = web.Application()
+            app.router.add_get('/metrics', self._serve_metrics)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.prometheus_host, self.prometheus_port).start()
+            # The port is picked by the OS when 0 was asked for.
+            self.prometheus_port = self._runner.addresses[0][1]
+            logging.info(f"Serving crawl metrics on http://{self.prometheus_host}:{self.prometheus_port}/metrics")
+
+    async def close(self):
+        if self._reporter is not None:
+            self._reporter.cancel()
+            await asyncio.gather(self._reporter, return_exceptions=True)
+            self._reporter = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        self.log_stats()
+        if self.snapshot_path:
+            self.write_snapshot()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
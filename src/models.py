@@ -1,8 +1,23 @@
+from render_policy import RENDER_ALWAYS, RENDER_NEVER, RENDER_MODES
+
 class BaseUrl:
-    def __init__(self, domain: str, relative_path: str = '', path_validation: bool = True):
+    """
+    A site to crawl. `render` decides when pages are rendered in a browser:
+    "always", "never" or "auto" (a heuristic on the static response), and it
+    applies to pages up to `render_max_depth`; deeper pages are never rendered.
+    """
+    def __init__(self, domain: str, relative_path: str = '', path_validation: bool = True,
+                 render: str = RENDER_ALWAYS, render_max_depth: int = 0):
+        if render not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {render}")
         self.domain = domain
         self.relative_path = relative_path
         self.path_validation = path_validation
+        self.render = render
+        self.render_max_depth = render_max_depth
+
+    def render_mode(self, depth: int) -> str:
+        return self.render if depth <= self.render_max_depth else RENDER_NEVER
 
     def get_absolute_url(self):
         return f"{self.domain}{self.relative_path}"
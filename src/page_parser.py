@@ -0,0 +1,48 @@
+import time
+from urllib.parse import urlparse
+from strategies import URLDiscoveryStrategy
+from link_extractors import LinkExtractor
+from canonical import URLCanonicalizer
+
+def _without_www(netloc: str) -> str:
+    netloc = netloc.lower()
+    return netloc[4:] if netloc.startswith('www.') else netloc
+
+class PageScope:
+    """
+    Decides which links belong to the crawl of a base URL: same host (ignoring
+    a leading "www.") and, with path validation, under the base path.
+    Plain data only, so it can be shipped to parser processes.
+    """
+    def __init__(self, base_absolute_url: str, path_validation: bool = True):
+        base_url_parsed = urlparse(base_absolute_url)
+        self.netloc = _without_www(base_url_parsed.netloc)
+        self.path = base_url_parsed.path
+        self.path_validation = path_validation
+
+    def contains(self, url: str) -> bool:
+        # Parse the URL for robust comparison against the base URL
+        parsed = urlparse(url)
+        return (parsed.netloc != '' and _without_www(parsed.netloc) == self.netloc
+                and (not self.path_validation or parsed.path.startswith(self.path)))
+
+def parse_page(text: str, page_url: str, scope: PageScope, strategy: URLDiscoveryStrategy,
+               link_extractor: LinkExtractor, extra_urls: list = (), canonicalizer: URLCanonicalizer = None,
+               timings: dict = None):
+    """
+    Extract a page's links and return (in-scope links, product links). Links are
+    canonicalized when a canonicalizer is given, deduplicated and keep the order
+    they appear in; `extra_urls` (e.g. URLs harvested from API responses) are
+    treated like anchors in the page. With `timings`, the seconds spent in the
+    strategy are stored under 'strategy'.
+    """
+    links = link_extractor.extract(text, page_url) if text else []
+    links.extend(extra_urls)
+    if canonicalizer is not None:
+        links = [canonicalizer.canonicalize(url) for url in links]
+    candidates = [url for url in dict.fromkeys(links) if scope.contains(url)]
+    start = time.perf_counter()
+    products = [url for url, is_product in zip(candidates, strategy.classify(candidates)) if is_product]
+    if timings is not None:
+        timings['strategy'] = time.perf_counter() - start
+    return candidates, products
@@ -0,0 +1,59 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from strategies import URLDiscoveryStrategy
+from link_extractors import LinkExtractor
+from page_parser import PageScope, parse_page
+from canonical import URLCanonicalizer
+
+# Set once per worker process by the pool initializer, so the strategy, the
+# extractor and the canonicalizer are not pickled again for every page.
+_worker_strategy = None
+_worker_link_extractor = None
+_worker_canonicalizer = None
+
+def _init_worker(strategy: URLDiscoveryStrategy, link_extractor: LinkExtractor, canonicalizer: URLCanonicalizer):
+    global _worker_strategy, _worker_link_extractor, _worker_canonicalizer
+    _worker_strategy = strategy
+    _worker_link_extractor = link_extractor
+    _worker_canonicalizer = canonicalizer
+
+def _parse_in_worker(text: str, page_url: str, scope: PageScope, extra_urls: list):
+    timings = {}
+    parsed = parse_page(text, page_url, scope, _worker_strategy, _worker_link_extractor, extra_urls, _worker_canonicalizer, timings)
+    return parsed, timings
+
+class ParsePool:
+    """
+    Runs link extraction, scope filtering and strategy matching in worker
+    processes so that parsing scales with cores and never blocks the event loop.
+
+    At most `max_in_flight` parse jobs are submitted at once; callers beyond
+    that wait, which keeps the page bodies held in memory bounded.
+    """
+    def __init__(self, strategy: URLDiscoveryStrategy, link_extractor: LinkExtractor, workers: int = None, max_in_flight: int = None,
+                 canonicalizer: URLCanonicalizer = None):
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(strategy, link_extractor, canonicalizer))
+        self.max_in_flight = max_in_flight or 2 * self.executor._max_workers
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def parse(self, text: str, page_url: str, scope: PageScope, extra_urls: list = (), timings: dict = None):
+        """
+        Same contract as `page_parser.parse_page`, evaluated in a worker process.
+        """
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            parsed, worker_timings = await loop.run_in_executor(self.executor, _parse_in_worker, text, page_url, scope,
+                                                                list(extra_urls))
+        if timings is not None:
+            timings.update(worker_timings)
+        return parsed
+
+    def close(self):
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
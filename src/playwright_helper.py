@@ -1,20 +1,328 @@
 import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from urllib.parse import urljoin, urlparse
 from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
-async def crawl_with_playwright(url: str, max_scrolls: int = 5) -> str:
+SCROLL_FIXED = "fixed"
+SCROLL_ADAPTIVE = "adaptive"
+
+# Returns [page height, number of anchors], the two signals that new content arrived.
+_MEASURE_JS = "() => [document.body.scrollHeight, document.querySelectorAll('a[href]').length]"
+_GROWTH_JS = "([height, anchors]) => document.body.scrollHeight > height || document.querySelectorAll('a[href]').length > anchors"
+
+class _BrowserSlot:
     """
-    Launches a headless browser to load the page, simulating infinite scrolling by scrolling
-    down a fixed number of times. Returns the fully rendered HTML.
+    A launched browser together with its usage counters.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        page = await browser.new_page()
-        await page.goto(url)
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages_served = 0
+        self.active = 0
+        self.retired = False
+
+class BrowserPool:
+    """
+    Keeps a small set of long-lived headless Chromium browsers and hands out
+    isolated pages (each in its own browser context) to callers.
+
+    What it does:
+      - Launch the browsers once, lazily, on the first acquire.
+      - Cap the number of pages rendering at the same time.
+      - Recycle a browser after it has served `pages_per_browser` pages to contain leaks.
+    """
+    def __init__(self, size: int = 2, max_concurrent_renders: int = 4, pages_per_browser: int = 50, headless: bool = True):
+        self.size = max(1, size)
+        self.max_concurrent_renders = max(1, max_concurrent_renders)
+        self.pages_per_browser = max(1, pages_per_browser)
+        self.headless = headless
+        self._playwright = None
+        self._slots = []
+        self._leases = {}
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_renders)
+
+    async def _launch(self):
+        return await self._playwright.chromium.launch(headless=self.headless)
+
+    async def _ensure_started(self):
+        if self._playwright is not None:
+            return
+        self._playwright = await async_playwright().start()
+        try:
+            for _ in range(self.size):
+                self._slots.append(_BrowserSlot(await self._launch()))
+        except Exception:
+            await self.close()
+            raise
+
+    async def _recycle(self, slot: _BrowserSlot) -> _BrowserSlot:
+        logging.debug(f"Recycling browser after {slot.pages_served} pages")
+        replacement = _BrowserSlot(await self._launch())
+        self._slots[self._slots.index(slot)] = replacement
+        slot.retired = True
+        if slot.active == 0:
+            await slot.browser.close()
+        return replacement
+
+    async def acquire(self):
+        """
+        Wait for a free render slot and return a fresh page in a new browser context.
+        Every acquired page must be handed back through `release`.
+        """
+        await self._semaphore.acquire()
+        try:
+            async with self._lock:
+                await self._ensure_started()
+                slot = min(self._slots, key=lambda s: s.active)
+                if slot.pages_served >= self.pages_per_browser:
+                    slot = await self._recycle(slot)
+                slot.active += 1
+                slot.pages_served += 1
+            try:
+                context = await slot.browser.new_context()
+                page = await context.new_page()
+            except Exception:
+                await self._return_slot(slot)
+                raise
+        except Exception:
+            self._semaphore.release()
+            raise
+        self._leases[page] = slot
+        return page
+
+    async def release(self, page):
+        """
+        Close the page's browser context and free its render slot.
+        """
+        slot = self._leases.pop(page)
+        try:
+            await page.context.close()
+        except Exception as e:
+            logging.debug(f"Error closing browser context: {e}")
+        finally:
+            await self._return_slot(slot)
+            self._semaphore.release()
+
+    async def _return_slot(self, slot: _BrowserSlot):
+        slot.active -= 1
+        if slot.retired and slot.active == 0:
+            await slot.browser.close()
+
+    @asynccontextmanager
+    async def page(self):
+        page = await self.acquire()
+        try:
+            yield page
+        finally:
+            await self.release(page)
+
+    async def close(self):
+        for slot in self._slots:
+            try:
+                await slot.browser.close()
+            except Exception as e:
+                logging.debug(f"Error closing browser: {e}")
+        self._slots = []
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+async def scroll_page(page, max_scrolls: int, scroll_mode: str = SCROLL_FIXED, stable_rounds: int = 2, settle_timeout: float = 2.0) -> int:
+    """
+    Scrolls the page to trigger lazily loaded content and returns the number of scrolls used.
+
+    In "fixed" mode it scrolls exactly `max_scrolls` times with a one second pause.
+    In "adaptive" mode it waits after every scroll until the page grows (taller body or
+    more anchors) or `settle_timeout` seconds pass, and stops early once `stable_rounds`
+    scrolls in a row brought no new content. `max_scrolls` remains the upper bound.
+    """
+    if scroll_mode == SCROLL_FIXED:
         for _ in range(max_scrolls):
             # Scroll down by the full height of the document.
             await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
             # Wait a bit for content to load.
             await asyncio.sleep(1)
-        content = await page.content()
-        await browser.close()
-        return content
+        return max_scrolls
+    if scroll_mode != SCROLL_ADAPTIVE:
+        raise ValueError(f"Unknown scroll mode: {scroll_mode}")
+
+    height, anchors = await page.evaluate(_MEASURE_JS)
+    scrolls = 0
+    idle_rounds = 0
+    while scrolls < max_scrolls and idle_rounds < stable_rounds:
+        await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
+        scrolls += 1
+        try:
+            await page.wait_for_function(_GROWTH_JS, arg=[height, anchors], timeout=settle_timeout * 1000)
+        except PlaywrightTimeoutError:
+            pass
+        new_height, new_anchors = await page.evaluate(_MEASURE_JS)
+        if new_height > height or new_anchors > anchors:
+            idle_rounds = 0
+        else:
+            idle_rounds += 1
+        height, anchors = new_height, new_anchors
+    return scrolls
+
+class RenderResult:
+    """
+    The outcome of rendering a page: the final HTML, URLs harvested from the
+    site's own JSON/XHR responses, and the number of scrolls used.
+    """
+    def __init__(self, html: str, discovered_urls: list = None, scrolls: int = 0):
+        self.html = html
+        self.discovered_urls = discovered_urls or []
+        self.scrolls = scrolls
+
+def _site_host(host: str) -> str:
+    host = (host or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+def _is_same_site(url: str, site: str) -> bool:
+    host = _site_host(urlparse(url).hostname)
+    return host == site or host.endswith(f".{site}")
+
+def extract_json_urls(text: str, base_url: str) -> list:
+    """
+    Walks a JSON document and returns every string value that looks like a URL
+    or an absolute path, resolved against `base_url`.
+    """
+    try:
+        stack = [json.loads(text)]
+    except ValueError:
+        return []
+    urls = []
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+        elif (isinstance(item, str) and len(item) < 2048 and not any(c.isspace() for c in item)
+              and item.startswith(('http://', 'https://', '/'))):
+            urls.append(urljoin(base_url, item))
+    return urls
+
+class _NetworkFilter:
+    """
+    Request routing and response harvesting for a single render.
+
+    Requests for `blocked_resource_types`, for hosts containing one of
+    `blocked_hosts` or, with `block_third_party`, for any other site are aborted.
+    With `capture_json`, JSON responses from the page's own site (up to
+    `max_json_bytes`) are scanned for URLs.
+    """
+    def __init__(self, url: str, blocked_resource_types=(), blocked_hosts=(), block_third_party: bool = False,
+                 capture_json: bool = False, max_json_bytes: int = 2_000_000):
+        self.url = url
+        self.site = _site_host(urlparse(url).hostname)
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.blocked_hosts = tuple(blocked_hosts)
+        self.block_third_party = block_third_party
+        self.capture_json = capture_json
+        self.max_json_bytes = max_json_bytes
+        self.harvests = []
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type == 'document':
+            return False
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = (urlparse(url).hostname or '').lower()
+        if any(blocked in host for blocked in self.blocked_hosts):
+            return True
+        return self.block_third_party and not _is_same_site(url, self.site)
+
+    async def handle_route(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def on_response(self, response):
+        content_type = response.headers.get('content-type', '')
+        if 'json' not in content_type or not _is_same_site(response.url, self.site):
+            return
+        content_length = response.headers.get('content-length')
+        if content_length and content_length.isdigit() and int(content_length) > self.max_json_bytes:
+            return
+        self.harvests.append(asyncio.ensure_future(self._harvest(response)))
+
+    async def _harvest(self, response):
+        text = await response.text()
+        if len(text) > self.max_json_bytes:
+            return []
+        return extract_json_urls(text, self.url)
+
+    async def attach(self, page):
+        if self.blocked_resource_types or self.blocked_hosts or self.block_third_party:
+            await page.route("**/*", self.handle_route)
+        if self.capture_json:
+            page.on("response", self.on_response)
+
+    async def discovered_urls(self) -> list:
+        urls = []
+        for result in await asyncio.gather(*self.harvests, return_exceptions=True):
+            if isinstance(result, list):
+                urls.extend(result)
+            else:
+                logging.debug(f"Error reading JSON response: {result}")
+        return urls
+
+    async def close(self):
+        """Cancels the harvests still running, so none outlives the page."""
+        for harvest in self.harvests:
+            harvest.cancel()
+        await asyncio.gather(*self.harvests, return_exceptions=True)
+
+async def _render(page, url: str, max_scrolls: int, network_options: dict, scroll_options: dict) -> RenderResult:
+    network = _NetworkFilter(url, **network_options)
+    try:
+        await network.attach(page)
+        await page.goto(url)
+        scrolls = await scroll_page(page, max_scrolls, **scroll_options)
+        html = await page.content()
+        discovered_urls = await network.discovered_urls()
+    finally:
+        await network.close()
+    logging.debug(f"Rendered {url} using {scrolls} scrolls, {len(discovered_urls)} URLs from JSON responses")
+    return RenderResult(html, discovered_urls, scrolls)
+
+async def render_page(url: str, max_scrolls: int = 5, pool: BrowserPool = None, network_options: dict = None,
+                      **scroll_options) -> RenderResult:
+    """
+    Loads the page in a headless browser, simulating infinite scrolling (see
+    `scroll_page` for the scroll modes). `network_options` configure resource
+    blocking and JSON harvesting (see `_NetworkFilter`).
+
+    When a BrowserPool is given the page is rendered in one of its long-lived
+    browsers; otherwise a browser is launched just for this call.
+    """
+    network_options = network_options or {}
+    if pool is not None:
+        async with pool.page() as page:
+            return await _render(page, url, max_scrolls, network_options, scroll_options)
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            page = await browser.new_page()
+            return await _render(page, url, max_scrolls, network_options, scroll_options)
+        finally:
+            await browser.close()
+
+async def crawl_with_playwright(url: str, max_scrolls: int = 5, pool: BrowserPool = None, **scroll_options) -> str:
+    """
+    Renders the page (see `render_page`) and returns the fully rendered HTML.
+    """
+    result = await render_page(url, max_scrolls, pool, **scroll_options)
+    return result.html
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# Responses that mean "slow down".
+THROTTLE_STATUSES = (429, 503)
+
+def parse_retry_after(value: str):
+    """
+    Parse a Retry-After header (delay in seconds or an HTTP date) into seconds.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class Ticket:
+    """
+    Handed out for one request; the caller records the response on it.
+    """
+    def __init__(self, started: float):
+        self.started = started
+        self.status = None
+        self.headers = None
+        self.error = None
+
+    def record(self, status: int, headers=None):
+        self.status = status
+        self.headers = headers
+
+@asynccontextmanager
+async def unlimited_slot(url: str):
+    """
+    Stand-in for `PolitenessScheduler.slot` when requests are not scheduled.
+    """
+    yield Ticket(0.0)
+
+class HostState:
+    """
+    Politeness state for one host: a token bucket for the request rate and an
+    AIMD concurrency window.
+
+    The window grows by 1/window for every fast successful response (about +1 per
+    round trip) and is halved, at most once per `decrease_interval` seconds, on
+    429/503, errors and timeouts, responses slower than `slow_latency`, or when
+    the smoothed latency rises above `latency_factor` times its lowest value.
+    """
+    def __init__(self, rate: float = 10.0, burst: int = 10, initial_window: int = 4, min_window: int = 1, max_window: int = 32,
+                 slow_latency: float = 5.0, latency_factor: float = 3.0, decrease_interval: float = 1.0):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_window = max(1, min_window)
+        self.max_window = max(self.min_window, max_window)
+        self.window = float(min(max(initial_window, self.min_window), self.max_window))
+        self.slow_latency = slow_latency
+        self.latency_factor = latency_factor
+        self.decrease_interval = decrease_interval
+        self.tokens = float(self.burst)
+        self.last_refill = None
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.latency = None
+        self.base_latency = None
+        self.last_decrease = float('-inf')
+        self._cond = asyncio.Condition()
+
+    def set_crawl_delay(self, delay: float):
+        if delay and delay > 0:
+            self.rate = min(self.rate, 1.0 / delay) if self.rate else 1.0 / delay
+            self.burst = 1
+            self.tokens = min(self.tokens, 1.0)
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.window))
+            self.in_flight += 1
+        try:
+            await self._take_token()
+        except BaseException:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+            raise
+
+    async def _take_token(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self.blocked_until > now:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if not self.rate:
+                return
+            if self.last_refill is not None:
+                self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def release(self, ticket: Ticket, now: float):
+        self._observe(ticket, now)
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _observe(self, ticket: Ticket, now: float):
+        elapsed = now - ticket.started
+        retry_after = parse_retry_after((ticket.headers or {}).get('Retry-After'))
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        if ticket.error is not None or ticket.status in THROTTLE_STATUSES:
+            self._decrease(now)
+            return
+        if ticket.status is None:
+            return
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+        self.base_latency = self.latency if self.base_latency is None else min(self.base_latency, self.latency)
+        if elapsed > self.slow_latency or self.latency > self.latency_factor * max(self.base_latency, 0.001):
+            self._decrease(now)
+        elif 200 <= ticket.status < 300:
+            self.window = min(self.max_window, self.window + 1.0 / self.window)
+
+    def _decrease(self, now: float):
+        if now - self.last_decrease < self.decrease_interval:
+            return
+        self.last_decrease = now
+        self.window = max(self.min_window, self.window / 2)
+
+class PolitenessScheduler:
+    """
+    Gives every host its own HostState, configured from `default` and overridden
+    per host by `hosts` (keys are host names, a leading "www." is ignored).
+
+    Usage:
+        async with scheduler.slot(url) as ticket:
+            ... fetch ...
+            ticket.record(response.status, response.headers)
+    """
+    def __init__(self, default: dict = None, hosts: dict = None, respect_crawl_delay: bool = True):
+        self.default = default or {}
+        self.hosts = {self._host_key(host): options for host, options in (hosts or {}).items()}
+        self.respect_crawl_delay = respect_crawl_delay
+        self._states = {}
+
+    @staticmethod
+    def _host_key(host: str) -> str:
+        host = (host or '').lower()
+        return host[4:] if host.startswith('www.') else host
+
+    def host_state(self, host: str) -> HostState:
+        key = self._host_key(host)
+        if key not in self._states:
+            self._states[key] = HostState(**{**self.default, **self.hosts.get(key, {})})
+        return self._states[key]
+
+    def set_crawl_delay(self, host: str, delay: float):
+        """
+        Apply a robots.txt Crawl-delay (seconds between requests) to the host.
+        """
+        if self.respect_crawl_delay and delay:
+            logging.debug(f"Using crawl delay of {delay}s for {host}")
+            self.host_state(host).set_crawl_delay(float(delay))
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        state = self.host_state(urlparse(url).hostname)
+        await state.acquire()
+        loop = asyncio.get_running_loop()
+        ticket = Ticket(loop.time())
+        try:
+            yield ticket
+        except Exception as e:
+            ticket.error = e
+            raise
+        finally:
+            await state.release(ticket, loop.time())
@@ -0,0 +1,34 @@
+RENDER_ALWAYS = "always"
+RENDER_NEVER = "never"
+RENDER_AUTO = "auto"
+RENDER_MODES = (RENDER_ALWAYS, RENDER_NEVER, RENDER_AUTO)
+
+# Fragments that show up in the shell HTML of common client-side rendered apps.
+DEFAULT_SPA_MARKERS = (
+    'id="__next"',
+    'id="__nuxt"',
+    'window.__NUXT__',
+    'data-reactroot',
+    'ng-version=',
+    'id="root"></div>',
+    'id="app"></div>',
+)
+
+class RenderHeuristic:
+    """
+    Cheap check on a static response that decides whether a page needs a browser render.
+
+    A page is rendered when it carries a known SPA marker, has fewer than
+    `min_anchors` in-scope links, or fewer than `min_product_links` product
+    links. It works on the links already parsed from the static HTML, which
+    are reused as-is when no render is needed.
+    """
+    def __init__(self, min_anchors: int = 10, min_product_links: int = 1, spa_markers: list = None):
+        self.min_anchors = min_anchors
+        self.min_product_links = min_product_links
+        self.spa_markers = tuple(spa_markers) if spa_markers is not None else DEFAULT_SPA_MARKERS
+
+    def needs_render(self, html: str, links: list, product_links: list) -> bool:
+        if any(marker in html for marker in self.spa_markers):
+            return True
+        return len(links) < self.min_anchors or len(product_links) < self.min_product_links
@@ -0,0 +1,76 @@
+import codecs
+import re
+from link_extractors import LinkStream
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+class BodyReader:
+    """
+    Reads page bodies without trusting the server or the link that led there.
+
+    What it does:
+      - Look at Content-Type and Content-Length before anything is downloaded:
+        responses that are not one of `content_types`, or announce more than
+        `max_bytes`, are not read at all. A missing Content-Type is let through.
+      - Stream the body in `chunk_size` chunks and stop after `max_bytes`; the
+        part read so far is used, since a truncated page still has its links.
+      - Decode incrementally with the charset from Content-Type (UTF-8 when it
+        has none or an unknown one), and optionally feed the decoded chunks to
+        a LinkStream while they arrive.
+    """
+    def __init__(self, max_bytes: int = 5_000_000, chunk_size: int = 64 * 1024, content_types: list = HTML_CONTENT_TYPES):
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.content_types = frozenset(content_type.lower() for content_type in content_types or ())
+
+    def reject_reason(self, headers) -> str:
+        """
+        Return why a response should not be read, or None to read it.
+        """
+        content_type = headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        if content_type and self.content_types and content_type not in self.content_types:
+            return f"content type {content_type}"
+        try:
+            length = int(headers.get('Content-Length', ''))
+        except ValueError:
+            return None
+        if self.max_bytes is not None and length > self.max_bytes:
+            return f"content length {length} over {self.max_bytes} bytes"
+        return None
+
+    async def read(self, response, link_stream: LinkStream = None) -> tuple:
+        """
+        Return (text, number of bytes read) for a response's body; at most
+        `max_bytes` are read.
+        """
+        decoder = codecs.getincrementaldecoder(self.encoding(response.headers))(errors='replace')
+        parts = []
+        size = 0
+        async for chunk in response.content.iter_chunked(self.chunk_size):
+            truncated = self.max_bytes is not None and size + len(chunk) > self.max_bytes
+            if truncated:
+                chunk = chunk[:self.max_bytes - size]
+            size += len(chunk)
+            text = decoder.decode(chunk)
+            parts.append(text)
+            if link_stream is not None:
+                link_stream.feed(text)
+            if truncated:
+                break
+        text = decoder.decode(b'', final=True)
+        parts.append(text)
+        if link_stream is not None:
+            link_stream.feed(text)
+        return ''.join(parts), size
+
+    @staticmethod
+    def encoding(headers) -> str:
+        match = _CHARSET_RE.search(headers.get('Content-Type', ''))
+        if match is not None:
+            try:
+                return codecs.lookup(match.group(1)).name
+            except LookupError:
+                pass
+        return 'utf-8'
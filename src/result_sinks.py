@@ -0,0 +1,201 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from canonical import fingerprint
+from visited import FingerprintSet
+
+class ResultSink(ABC):
+    """
+    Abstract base class for where product URLs go as soon as they are found.
+
+    `write` only buffers and drops URLs this sink has already received for the
+    same base URL; the buffer is written in batches of `batch_size` or every
+    `flush_interval` seconds, on a dedicated thread. Subclasses implement
+    `_write_batch`, `_close` and `read`.
+    """
+    def __init__(self, batch_size: int = 500, flush_interval: float = 2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._seen = FingerprintSet()
+        self._batch = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-sink")
+        self._last_flush = time.monotonic()
+
+    def _remember(self, base_url: str, url: str) -> bool:
+        return self._seen.add_fingerprint(fingerprint(f'{base_url} {url}'))
+
+    def write(self, base_url: str, url: str):
+        if self._remember(base_url, url):
+            self._batch.append((base_url, url))
+
+    async def maybe_flush(self):
+        if len(self._batch) >= self.batch_size or (self._batch and time.monotonic() - self._last_flush >= self.flush_interval):
+            await self.flush()
+
+    async def flush(self):
+        if not self._batch:
+            return
+        batch = self._batch
+        self._batch = []
+        self._last_flush = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write_batch, batch)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Error writing {len(batch)} results: {e}")
+
+    def close(self):
+        self._executor.shutdown()
+        if self._batch:
+            self._write_batch(self._batch)
+            self._batch = []
+        self._close()
+
+    @abstractmethod
+    def _write_batch(self, rows: list):
+        pass
+
+    @abstractmethod
+    def _close(self):
+        pass
+
+    @abstractmethod
+    def read(self):
+        """
+        Yield every (base_url, product_url) written so far.
+        """
+        pass
+
+class NDJSONSink(ResultSink):
+    """
+    Appends one JSON object per product URL to a file, e.g.
+    {"base_url": "www.example.com/shop", "url": "https://www.example.com/product/1"},
+    flushed after every batch so the file can be tailed while the crawl runs.
+    With `append`, results already in the file are kept and count as written;
+    otherwise the file is started afresh. A file left damaged by a crash (a
+    cut-off last line or compressed stream) is first rewritten with the rows
+    that can still be read, so the appended rows stay readable.
+    """
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 2.0, append: bool = True):
+        super().__init__(batch_size, flush_interval)
+        self.path = path
+        # Set by `read` when it had to skip a damaged part of the file.
+        self.damaged = False
+        if append and os.path.exists(path):
+            for base_url, url in self.read():
+                self._remember(base_url, url)
+            if self.damaged:
+                self._repair()
+        self._file = self._open('a' if append else 'w')
+
+    def _open(self, mode: str, path: str = None):
+        return open(path or self.path, mode, encoding='utf-8')
+
+    def _repair(self):
+        logging.warning(f"Rewriting {self.path} without the part a crash left damaged")
+        repaired = f"{self.path}.repair"
+        with self._open('w', repaired) as f:
+            f.writelines(json.dumps({'base_url': base_url, 'url': url}) + '\n' for base_url, url in self.read())
+        os.replace(repaired, self.path)
+        self.damaged = False
+
+    def _write_batch(self, rows: list):
+        self._file.writelines(json.dumps({'base_url': base_url, 'url': url}) + '\n' for base_url, url in rows)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+    def read(self):
+        try:
+            with self._open('r') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        # A last line cut short when the process died, even if it parses.
+                        self.damaged = True
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        self.damaged = True
+                        continue
+                    yield row['base_url'], row['url']
+        except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+            # A gzip stream cut short, or data appended after one.
+            self.damaged = True
+            logging.debug(f"{self.path} has a damaged gzip stream: {e}")
+
+class GzipNDJSONSink(NDJSONSink):
+    """
+    NDJSONSink writing a gzip-compressed file. Every batch is sync-flushed, so
+    `zcat` can follow the file while the crawl runs.
+    """
+    def _open(self, mode: str, path: str = None):
+        return gzip.open(path or self.path, mode + 't', encoding='utf-8')
+
+class SQLiteSink(ResultSink):
+    """
+    Inserts product URLs into a SQLite table (WAL mode, so other processes can
+    query it during the crawl). The primary key also deduplicates across runs
+    with `append`; otherwise earlier results are deleted.
+    """
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 2.0, append: bool = True):
+        super().__init__(batch_size, flush_interval)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS products (base_url TEXT NOT NULL, url TEXT NOT NULL, "
+                           "found_at REAL NOT NULL, PRIMARY KEY (base_url, url))")
+        if not append:
+            with self._conn:
+                self._conn.execute("DELETE FROM products")
+
+    def _write_batch(self, rows: list):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO products VALUES (?, ?, ?)", [(base_url, url, now) for base_url, url in rows])
+
+    def _close(self):
+        self._conn.close()
+
+    def read(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            yield from conn.execute("SELECT base_url, url FROM products ORDER BY rowid")
+        finally:
+            conn.close()
+
+RESULT_SINKS = {
+    "ndjson": NDJSONSink,
+    "ndjson.gz": GzipNDJSONSink,
+    "sqlite": SQLiteSink,
+}
+
+def make_result_sink(type: str = "ndjson", **options) -> ResultSink:
+    """
+    Build a ResultSink from configuration, e.g. make_result_sink("sqlite", path="results.sqlite").
+    """
+    if type not in RESULT_SINKS:
+        raise ValueError(f"Unknown result sink: {type}. Choose one of {', '.join(RESULT_SINKS)}")
+    return RESULT_SINKS[type](**options)
+
+def aggregate_results(sink: ResultSink, path: str) -> dict:
+    """
+    Post-processing step: collect everything in the sink into the aggregated
+    JSON file mapping each base URL to its product URLs. Returns the number
+    of product URLs per base URL.
+    """
+    results = {}
+    for base_url, url in sink.read():
+        results.setdefault(base_url, []).append(url)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=4)
+    return {base_url: len(urls) for base_url, urls in results.items()}
@@ -0,0 +1,111 @@
+import random
+from collections import deque
+from politeness import parse_retry_after
+
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class RetryBudget:
+    """
+    Token bucket limiting the extra requests (retries and hedges) sent to one
+    host: it starts with `minimum` tokens, every request adds `ratio` of a token
+    up to `maximum`, and every extra request takes one. With the defaults at
+    most about 10% more requests are sent than without retries, so retries
+    cannot pile onto a host that is already failing.
+    """
+    def __init__(self, ratio: float = 0.1, minimum: int = 10, maximum: int = 100):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = float(minimum)
+
+    def deposit(self):
+        self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class RetryPolicy:
+    """
+    When and how often a GET is sent again, shared by the crawlers of a
+    CrawlerManager so that limits hold per host.
+
+    What it does:
+      - Retry failed requests (errors, timeouts and `retry_statuses`) up to
+        `max_attempts` attempts in total, after a full-jitter exponential backoff:
+        a random delay up to `backoff_base` * 2^attempt seconds, capped at
+        `backoff_max` and never shorter than a Retry-After header asks for.
+      - Keep a RetryBudget per host; a retry or hedge is only sent while the budget allows.
+      - With `hedge`, keep the latencies of the last `latency_window` responses per host.
+        Once `hedge_min_samples` are known, a request still running that long after
+        it got its politeness slot (their `hedge_quantile`, at least `hedge_min_delay`
+        seconds) gets a second, hedged request, and the first answer wins.
+    """
+    def __init__(self, max_attempts: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 retry_statuses: list = DEFAULT_RETRY_STATUSES, budget_ratio: float = 0.1, budget_min: int = 10,
+                 budget_max: int = 100, hedge: bool = False, hedge_quantile: float = 0.95, hedge_min_samples: int = 20,
+                 hedge_min_delay: float = 0.05, latency_window: int = 200):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.budget_options = dict(ratio=budget_ratio, minimum=budget_min, maximum=budget_max)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latency_window = latency_window
+        self._budgets = {}
+        self._latencies = {}
+        self._observed = {}
+        # host -> (responses observed when it was computed, hedge delay)
+        self._hedge_delays = {}
+
+    def budget(self, host: str) -> RetryBudget:
+        budget = self._budgets.get(host)
+        if budget is None:
+            budget = self._budgets[host] = RetryBudget(**self.budget_options)
+        return budget
+
+    def retryable(self, response) -> bool:
+        """
+        Whether a response from `DomainCrawler.request` (None on errors) is worth another attempt.
+        """
+        return response is None or response[0] in self.retry_statuses
+
+    def backoff(self, attempt: int, response=None) -> float:
+        """
+        Delay before attempt number `attempt` + 1 (the first attempt is 0).
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if response is not None:
+            retry_after = parse_retry_after(response[1].get('Retry-After'))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def observe(self, host: str, seconds: float):
+        latencies = self._latencies.get(host)
+        if latencies is None:
+            latencies = self._latencies[host] = deque(maxlen=self.latency_window)
+        latencies.append(seconds)
+        self._observed[host] = self._observed.get(host, 0) + 1
+
+    def hedge_delay(self, host: str) -> float:
+        """
+        Seconds after which a request to the host is hedged, or None when it is not.
+        """
+        if not self.hedge:
+            return None
+        latencies = self._latencies.get(host, ())
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        observed = self._observed[host]
+        computed_at, delay = self._hedge_delays.get(host, (0, None))
+        # Sorting the window only every tenth response keeps this cheap.
+        if delay is None or observed >= computed_at + 10:
+            ordered = sorted(latencies)
+            delay = max(self.hedge_min_delay, ordered[min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))])
+            self._hedge_delays[host] = (observed, delay)
+        return delay
@@ -0,0 +1,26 @@
+import logging
+from urllib.parse import urljoin
+from urllib.robotparser import RobotFileParser
+import aiohttp
+from politeness import unlimited_slot
+
+async def fetch_robots(session: aiohttp.ClientSession, base_absolute_url: str, slot=unlimited_slot):
+    """
+    Fetch and parse the site's robots.txt, returning a RobotFileParser or None
+    when the file is missing or cannot be fetched. The request waits for
+    `slot(url)`, e.g. `PolitenessScheduler.slot`, like any other.
+    """
+    robots_url = urljoin(base_absolute_url, '/robots.txt')
+    try:
+        async with slot(robots_url) as ticket, await session.get(robots_url) as response:
+            ticket.record(response.status, response.headers)
+            if response.status != 200:
+                logging.debug(f"No robots.txt at {robots_url} (status {response.status})")
+                return None
+            text = await response.text()
+    except Exception as e:
+        logging.debug(f"Error fetching {robots_url}: {e}")
+        return None
+    parser = RobotFileParser(robots_url)
+    parser.parse(text.splitlines())
+    return parser
@@ -0,0 +1,61 @@
+import re
+from abc import ABC, abstractmethod
+
+# Paths that usually list many products: category/collection pages and their pagination.
+DEFAULT_LISTING_PATTERNS = (
+    r'[?&](page|p|pg)=\d+',
+    r'/page/\d+',
+    r'/(c|cat|category|categories|collection|collections|catalog|catalogue|shop|department|departments|browse|search)(/|$|\?)',
+)
+
+# Paths that rarely lead to products.
+DEFAULT_LOW_VALUE_PATTERNS = (
+    r'/(about|about-us|help|faq|faqs|support|blog|blogs|news|press|careers|jobs|contact|contact-us)(/|$|\?)',
+    r'/(account|login|signin|sign-in|register|signup|cart|checkout|wishlist|orders)(/|$|\?)',
+    r'/(privacy|privacy-policy|terms|terms-of-use|legal|cookies|sitemap|store-locator)(/|$|\?)',
+)
+
+def _compile(patterns) -> re.Pattern:
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE) if patterns else None
+
+class URLScorer(ABC):
+    """
+    Abstract base class for ranking URLs in a priority frontier; higher scores are crawled first.
+    """
+    @abstractmethod
+    def score(self, url: str, depth: int, is_product: bool, parent_yield: float) -> float:
+        """
+        `is_product` is the strategy's verdict on the URL and `parent_yield` the
+        share of product links on the page that linked to it.
+        """
+        pass
+
+class HeuristicScorer(URLScorer):
+    """
+    Weighted sum of cheap signals:
+      + `product_weight` for URLs the strategy classifies as products,
+      + `yield_weight` times the product yield of the linking page,
+      + `listing_weight` for paths that look like listing or pagination pages,
+      + `low_value_weight` (negative) for about/help/blog/account-style pages,
+      - `depth_weight` per level of depth.
+    """
+    def __init__(self, product_weight: float = 1.0, yield_weight: float = 2.0, listing_weight: float = 3.0,
+                 low_value_weight: float = -5.0, depth_weight: float = 0.1, listing_patterns: list = None,
+                 low_value_patterns: list = None):
+        self.product_weight = product_weight
+        self.yield_weight = yield_weight
+        self.listing_weight = listing_weight
+        self.low_value_weight = low_value_weight
+        self.depth_weight = depth_weight
+        self.listing = _compile(DEFAULT_LISTING_PATTERNS if listing_patterns is None else listing_patterns)
+        self.low_value = _compile(DEFAULT_LOW_VALUE_PATTERNS if low_value_patterns is None else low_value_patterns)
+
+    def score(self, url: str, depth: int, is_product: bool, parent_yield: float) -> float:
+        score = self.yield_weight * parent_yield - self.depth_weight * depth
+        if is_product:
+            score += self.product_weight
+        if self.listing is not None and self.listing.search(url):
+            score += self.listing_weight
+        if self.low_value is not None and self.low_value.search(url):
+            score += self.low_value_weight
+        return score
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+from urllib.parse import urlparse
+from models import BaseUrl
+from strategies import URLDiscoveryStrategy
+from crawler_manager import CrawlerManager
+from crawl_store import SQLiteCrawlStore
+from http_cache import SQLiteResponseCache
+from result_sinks import ResultSink
+from metrics import CrawlMetrics
+
+def host_key(base_url: BaseUrl) -> str:
+    """
+    The host a base URL is crawled on, without a leading "www.".
+    """
+    url = base_url.get_absolute_url()
+    host = (urlparse(url if '://' in url else f'https://{url}').hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+def group_by_host(base_urls: list[BaseUrl], size_estimates: dict = None) -> list:
+    """
+    Split base URLs into units of work, one per host, largest first.
+
+    Keeping a host's base URLs together keeps its politeness limits in one
+    process. The size of a host is `size_estimates[host]` when given (e.g. the
+    product count of the last run) and its number of base URLs otherwise.
+    """
+    groups = {}
+    for base_url in base_urls:
+        groups.setdefault(host_key(base_url), []).append(base_url)
+    size_estimates = size_estimates or {}
+    return sorted(groups.values(), key=lambda group: size_estimates.get(host_key(group[0]), len(group)), reverse=True)
+
+def _result_key(base_url: BaseUrl) -> str:
+    return f'{base_url.domain}{base_url.relative_path}'
+
+class _EventSink(ResultSink):
+    """
+    Result sink of a shard: every batch of product URLs is put on the events
+    queue as a ('products', shard, [(base URL, product URL), ...]) event, so
+    results reach the coordinator while the crawl runs.
+    """
+    def __init__(self, shard: int, events, batch_size: int = 100, flush_interval: float = 1.0):
+        super().__init__(batch_size, flush_interval)
+        self.shard = shard
+        self.events = events
+
+    def _write_batch(self, rows: list):
+        self.events.put(('products', self.shard, rows))
+
+    def _close(self):
+        pass
+
+    def read(self):
+        raise NotImplementedError("A shard's products are sent to the coordinator, not kept")
+
+def _shard_metrics(metrics_options: dict, shard: int) -> CrawlMetrics:
+    """
+    A shard's CrawlMetrics: the Prometheus port is offset by the shard number and
+    the snapshot file gets a ".shard<n>" suffix, so shards do not collide.
+    """
+    options = dict(metrics_options)
+    if options.get('prometheus_port'):
+        options['prometheus_port'] += shard
+    if options.get('snapshot_path'):
+        root, extension = os.path.splitext(options['snapshot_path'])
+        options['snapshot_path'] = f"{root}.shard{shard}{extension}"
+    return CrawlMetrics(**options)
+
+async def _run_shard(shard: int, strategy: URLDiscoveryStrategy, manager_options: dict, work, events,
+                     concurrency: int, store_options: dict, cache_options: dict, metrics_options: dict):
+    store = SQLiteCrawlStore(**store_options) if store_options else None
+    cache = SQLiteResponseCache(**cache_options) if cache_options else None
+    metrics = _shard_metrics(metrics_options, shard) if metrics_options else None
+    sink = _EventSink(shard, events)
+    loop = asyncio.get_running_loop()
+
+    async def take_work():
+        while True:
+            group = await loop.run_in_executor(None, work.get)
+            if group is None:
+                return
+            keys = [_result_key(base_url) for base_url in group]
+            events.put(('started', shard, keys))
+            try:
+                manager = CrawlerManager(group, strategy, store=store, cache=cache, sink=sink, metrics=metrics,
+                                         **manager_options)
+                events.put(('results', shard, await manager.run()))
+            except Exception as e:
+                events.put(('error', shard, keys, repr(e)))
+
+    try:
+        if metrics is not None:
+            await metrics.start()
+        await asyncio.gather(*(take_work() for _ in range(concurrency)))
+    finally:
+        sink.close()
+        if metrics is not None:
+            await metrics.close()
+        if store is not None:
+            store.close()
+        if cache is not None:
+            cache.close()
+
+def _shard_main(shard: int, strategy: URLDiscoveryStrategy, manager_options: dict, work, events,
+                concurrency: int, store_options: dict, cache_options: dict, metrics_options: dict, log_level):
+    """
+    Entry point of a shard process: its own event loop and aiohttp sessions,
+    crawling host groups from the shared work queue until it is empty.
+    """
+    logging.basicConfig(level=log_level)
+    try:
+        asyncio.run(_run_shard(shard, strategy, manager_options, work, events, concurrency, store_options, cache_options,
+                               metrics_options))
+    finally:
+        events.put(('done', shard))
+
+class ShardedCrawlerManager:
+    """
+    Runs the crawl in several processes to use every core of a node.
+
+    What it does:
+      - Group the base URLs by host and put the groups, largest first, on a shared work queue.
+      - Start `processes` shard processes, each with its own event loop; every shard crawls
+        up to `groups_per_process` groups at a time with a regular CrawlerManager.
+      - Shards take the next group as soon as one finishes, so a shard that runs out of
+        work early keeps taking groups the others have not started.
+      - Collect progress, results and errors from the shards and return the same results
+        as CrawlerManager.run. Shards send product URLs in small batches as they find
+        them rather than a host's whole result list at the end, and the batches go
+        to the result sink right away.
+
+    `manager_options` are CrawlerManager keyword arguments and must be picklable. A crawl
+    store and response cache are opened by every shard from `store_options` and
+    `cache_options`, and so is a CrawlMetrics from `metrics_options`; a result sink
+    stays in this process and receives the results.
+    """
+    def __init__(self, base_urls: list[BaseUrl], strategy: URLDiscoveryStrategy, processes: int = None,
+                 groups_per_process: int = 4, size_estimates: dict = None, manager_options: dict = None,
+                 store_options: dict = None, cache_options: dict = None, sink: ResultSink = None,
+                 metrics_options: dict = None):
+        self.base_urls = base_urls
+        self.strategy = strategy
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.groups_per_process = max(1, groups_per_process)
+        self.size_estimates = size_estimates or {}
+        self.manager_options = manager_options or {}
+        self.store_options = store_options
+        self.cache_options = cache_options
+        self.sink = sink
+        self.metrics_options = metrics_options
+        self.errors = {}
+
+    def _next_event(self, events, shards: list):
+        while True:
+            try:
+                return events.get(timeout=1.0)
+            except queue.Empty:
+                if not any(shard.is_alive() for shard in shards):
+                    # Every shard is gone; drain what they sent before exiting.
+                    try:
+                        return events.get(timeout=1.0)
+                    except queue.Empty:
+                        return None
+
+    async def run(self):
+        groups = group_by_host(self.base_urls, self.size_estimates)
+        processes = min(self.processes, len(groups))
+        if not processes:
+            return {}
+        context = multiprocessing.get_context("spawn")
+        work = context.Queue()
+        events = context.Queue()
+        for group in groups:
+            work.put(group)
+        for _ in range(processes * self.groups_per_process):
+            work.put(None)
+
+        shards = [context.Process(target=_shard_main, name=f"crawler-shard-{shard}",
+                                  args=(shard, self.strategy, self.manager_options, work, events, self.groups_per_process,
+                                        self.store_options, self.cache_options, self.metrics_options,
+                                        logging.getLogger().level))
+                  for shard in range(processes)]
+        for shard in shards:
+            shard.start()
+
+        loop = asyncio.get_running_loop()
+        products = {}
+        finished = {}
+        in_flight = {}
+        running = processes
+        try:
+            while running:
+                event = await loop.run_in_executor(None, self._next_event, events, shards)
+                if event is None:
+                    break
+                kind, shard = event[0], event[1]
+                if kind == 'started':
+                    for key in event[2]:
+                        in_flight[key] = shard
+                elif kind == 'products':
+                    for key, url in event[2]:
+                        if self.sink is not None:
+                            self.sink.write(key, url)
+                        else:
+                            products.setdefault(key, []).append(url)
+                    if self.sink is not None:
+                        await self.sink.maybe_flush()
+                elif kind == 'results':
+                    # The number of product URLs per base URL; the URLs came as 'products' events.
+                    for key, count in event[2].items():
+                        in_flight.pop(key, None)
+                        finished[key] = count
+                    logging.info(f"Shard {shard} finished {', '.join(event[2])}; {len(finished)}/{len(self.base_urls)} base URLs done")
+                elif kind == 'error':
+                    for key in event[2]:
+                        in_flight.pop(key, None)
+                        self.errors[key] = event[3]
+                    logging.error(f"Shard {shard} failed on {', '.join(event[2])}: {event[3]}")
+                elif kind == 'done':
+                    running -= 1
+            for key, shard in in_flight.items():
+                self.errors[key] = f"shard {shard} exited before finishing"
+                logging.error(f"Shard {shard} exited before finishing {key}")
+        except BaseException:
+            for shard in shards:
+                shard.terminate()
+            raise
+        finally:
+            for shard in shards:
+                await loop.run_in_executor(None, shard.join)
+            if self.sink is not None:
+                await self.sink.flush()
+
+        results = {}
+        for base_url in self.base_urls:
+            key = _result_key(base_url)
+            if key in finished:
+                results[key] = finished[key] if self.sink is not None else products.get(key, [])
+        return results
@@ -0,0 +1,119 @@
+import logging
+import zlib
+from urllib.parse import urljoin
+from xml.etree.ElementTree import XMLPullParser, ParseError
+import aiohttp
+from politeness import unlimited_slot
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+class SitemapParser:
+    """
+    Incremental parser for sitemap and sitemap index documents.
+
+    Bytes are fed as they arrive and every finished <url> or <sitemap> entry is
+    returned as (kind, loc, lastmod) and then dropped from the tree, so memory
+    stays flat however large the file is.
+    """
+    def __init__(self):
+        self._parser = XMLPullParser(events=('start', 'end'))
+        self._root = None
+
+    def feed(self, data: bytes) -> list:
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> list:
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> list:
+        entries = []
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if self._root is None:
+                    self._root = elem
+                continue
+            kind = _local_name(elem.tag)
+            if kind not in ('url', 'sitemap'):
+                continue
+            loc = lastmod = None
+            for child in elem:
+                name = _local_name(child.tag)
+                if name == 'loc':
+                    loc = (child.text or '').strip()
+                elif name == 'lastmod':
+                    lastmod = (child.text or '').strip() or None
+            if loc:
+                entries.append((kind, loc, lastmod))
+            elem.clear()
+            if self._root is not None and elem is not self._root:
+                try:
+                    self._root.remove(elem)
+                except ValueError:
+                    pass
+        return entries
+
+async def iter_sitemap(session: aiohttp.ClientSession, url: str, chunk_size: int = 64 * 1024, slot=unlimited_slot):
+    """
+    Stream one sitemap (plain or gzipped) and yield its (kind, loc, lastmod)
+    entries. The request waits for, and holds, `slot(url)` (e.g.
+    `PolitenessScheduler.slot`) like any other.
+    """
+    async with slot(url) as ticket, await session.get(url) as response:
+        ticket.record(response.status, response.headers)
+        if response.status != 200:
+            logging.debug(f"Skipping sitemap {url} with status {response.status}")
+            return
+        parser = SitemapParser()
+        decompressor = None
+        async for chunk in response.content.iter_chunked(chunk_size):
+            if decompressor is None:
+                # Gzipped sitemaps are usually served as plain binary files, so sniff the magic bytes.
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b'\x1f\x8b' else False
+            data = decompressor.decompress(chunk) if decompressor else chunk
+            for entry in parser.feed(data):
+                yield entry
+        if decompressor:
+            # Whatever zlib still buffers at the end of the stream.
+            for entry in parser.feed(decompressor.flush()):
+                yield entry
+        for entry in parser.close():
+            yield entry
+
+class SitemapDiscovery:
+    """
+    Walks a site's sitemaps, starting from the ones listed in robots.txt (or
+    /sitemap.xml when there are none) and following sitemap indexes, and yields
+    (loc, lastmod) for every page entry. At most `max_sitemaps` files are read,
+    each through `slot` (see iter_sitemap).
+    """
+    def __init__(self, session: aiohttp.ClientSession, max_sitemaps: int = 1000, chunk_size: int = 64 * 1024,
+                 slot=unlimited_slot):
+        self.session = session
+        self.max_sitemaps = max_sitemaps
+        self.chunk_size = chunk_size
+        self.slot = slot
+
+    async def discover(self, base_absolute_url: str, robots=None):
+        pending = list(robots.site_maps() or []) if robots is not None else []
+        if not pending:
+            pending = [urljoin(base_absolute_url, '/sitemap.xml')]
+        seen = set(pending)
+        read = 0
+        while pending and read < self.max_sitemaps:
+            sitemap_url = pending.pop(0)
+            read += 1
+            try:
+                async for kind, loc, lastmod in iter_sitemap(self.session, sitemap_url, self.chunk_size, self.slot):
+                    if kind == 'sitemap':
+                        if loc not in seen:
+                            seen.add(loc)
+                            pending.append(loc)
+                    else:
+                        yield loc, lastmod
+            except (ParseError, zlib.error) as e:
+                logging.debug(f"Malformed sitemap {sitemap_url}: {e}")
+            except Exception as e:
+                logging.debug(f"Error reading sitemap {sitemap_url}: {e}")
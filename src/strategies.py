@@ -1,6 +1,10 @@
 from abc import ABC, abstractmethod
 import re
 
+# Backreferences and conditionals by group number, which a combined
+# alternation would renumber (a doubled backslash is a false positive).
+_NUMBERED_GROUP_REF = re.compile(r'\\[1-9]|\(\?\(\d')
+
 class URLDiscoveryStrategy(ABC):
     """
     Abstract base class representing a strategy for identifying product URLs.
@@ -13,16 +17,46 @@ class URLDiscoveryStrategy(ABC):
         """
         pass
 
+    def classify(self, urls: list) -> list:
+        """
+        Classify a batch of URLs, returning one boolean per URL.
+        Strategies can override this with a faster batch implementation.
+        """
+        return [self.is_product_url(url) for url in urls]
+
 class RegexBasedDiscoveryStrategy(URLDiscoveryStrategy):
     """
     A concrete strategy that uses regular expressions to detect product URLs.
     This strategy can be extended by adding more patterns.
+
+    The patterns are compiled once into a single alternation, so each URL is
+    scanned in one pass. Patterns that refer to their groups by number are
+    matched on their own, and if the rest cannot be combined (e.g. ones with
+    inline global flags) every pattern is matched one by one.
     """
     def __init__(self, patterns: list):
         self.patterns = patterns
+        self.matchers = self._compile(patterns)
+
+    @staticmethod
+    def _compile(patterns: list) -> list:
+        combinable = [pattern for pattern in patterns if not _NUMBERED_GROUP_REF.search(pattern)]
+        separate = [re.compile(pattern) for pattern in patterns if _NUMBERED_GROUP_REF.search(pattern)]
+        if not combinable:
+            return separate
+        try:
+            return [re.compile("|".join(f"(?:{pattern})" for pattern in combinable))] + separate
+        except re.error:
+            return [re.compile(pattern) for pattern in combinable] + separate
 
     def is_product_url(self, url: str) -> bool:
-        for pattern in self.patterns:
-            if re.search(pattern, url):
+        for matcher in self.matchers:
+            if matcher.search(url):
                 return True
         return False
+
+    def classify(self, urls: list) -> list:
+        if len(self.matchers) == 1:
+            search = self.matchers[0].search
+            return [search(url) is not None for url in urls]
+        return [self.is_product_url(url) for url in urls]
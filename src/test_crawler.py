@@ -1,11 +1,39 @@
+import asyncio
+import gzip
+import json
+import queue
+import time
+from contextlib import asynccontextmanager
 import pytest
 import aiohttp
+from aiohttp import web
 import playwright_helper
 from domain_crawler import DomainCrawler
 from crawler_manager import CrawlerManager
 from strategies import RegexBasedDiscoveryStrategy, URLDiscoveryStrategy
 from models import BaseUrl
-from test_helper_fakes import FakeResponse, FakeSession, fake_crawl_with_playwright_factory
+from playwright_helper import BrowserPool
+from link_extractors import FastLinkExtractor, FastLinkStream, SoupLinkExtractor, get_link_extractor
+from response_body import BodyReader
+from metrics import CrawlMetrics, Histogram, DomainMetrics
+from retries import RetryPolicy, RetryBudget
+from page_parser import PageScope, parse_page
+from parse_pool import ParsePool
+from canonical import URLCanonicalizer, fingerprint
+from visited import FingerprintSet, ScalableBloomFilter, make_visited_set
+from politeness import PolitenessScheduler, parse_retry_after
+from sitemaps import SitemapParser
+from crawl_store import SQLiteCrawlStore
+from http_cache import SQLiteResponseCache, CachedPage
+from result_sinks import make_result_sink, aggregate_results
+from sharded_manager import ShardedCrawlerManager, group_by_host, _run_shard
+from frontier import SharedFrontier, LocalFrontier, PriorityFrontier
+from scoring import HeuristicScorer
+from budget import CrawlBudget
+from traps import TrapDetector, path_template, simhash
+from frontier_service import FrontierCoordinator, FrontierClient
+from test_helper_fakes import FakeResponse, FakeSession, fake_render_page_factory, FakePage, FakePlaywright, fake_async_playwright_factory, \
+    FakeRequest, FakeNetworkResponse
 # ---------------------------------------------------------------------------
 # Test URLDiscoveryStrategy
 # ---------------------------------------------------------------------------
@@ -40,10 +68,10 @@ async def test_domain_crawler(monkeypatch):
     fake_session = FakeSession(fake_responses)
     strategy = RegexBasedDiscoveryStrategy([r'/product/'])
     
-    fake_crawl = fake_crawl_with_playwright_factory(html_base)
+    fake_crawl = fake_render_page_factory(html_base)
     
     # Replace the real function with our fake version.
-    monkeypatch.setattr(playwright_helper, "crawl_with_playwright", fake_crawl)
+    monkeypatch.setattr(playwright_helper, "render_page", fake_crawl)
 
     crawler = DomainCrawler(BaseUrl('testdomain.com'), strategy, max_depth=2, session=fake_session)
     product_urls = await crawler.start()
@@ -78,10 +106,10 @@ async def test_domain_crawler_normal(monkeypatch):
     session = FakeSession(fake_responses)
     strategy = RegexBasedDiscoveryStrategy([r'/product/'])
     
-    fake_crawl = fake_crawl_with_playwright_factory(html_base)
+    fake_crawl = fake_render_page_factory(html_base)
 
     # Replace the real function with our fake version.
-    monkeypatch.setattr(playwright_helper,"crawl_with_playwright", fake_crawl)
+    monkeypatch.setattr(playwright_helper,"render_page", fake_crawl)
 
     crawler = DomainCrawler(BaseUrl("testdomain.com"), strategy, max_depth=2, session=session)
     product_urls = await crawler.start()
@@ -141,9 +169,9 @@ async def test_domain_crawler_max_depth(monkeypatch):
     session = FakeSession(fake_responses)
     strategy = RegexBasedDiscoveryStrategy([r'/product/'])
     
-    fake_crawl = fake_crawl_with_playwright_factory(html_level0)
+    fake_crawl = fake_render_page_factory(html_level0)
 
-    monkeypatch.setattr(playwright_helper,"crawl_with_playwright", fake_crawl)
+    monkeypatch.setattr(playwright_helper,"render_page", fake_crawl)
 
     
     # With max_depth=1, the chain should stop before reaching /page2.
@@ -218,9 +246,9 @@ async def test_domain_crawler_no_links(monkeypatch):
     session = FakeSession(fake_responses)
     strategy = RegexBasedDiscoveryStrategy([r'/product/'])
     
-    fake_crawl = fake_crawl_with_playwright_factory(html_base)
+    fake_crawl = fake_render_page_factory(html_base)
 
-    monkeypatch.setattr(playwright_helper, "crawl_with_playwright", fake_crawl)
+    monkeypatch.setattr(playwright_helper, "render_page", fake_crawl)
 
     crawler = DomainCrawler(BaseUrl("testdomain.com"), strategy, max_depth=2, session=session)
     product_urls = await crawler.start()
@@ -247,9 +275,9 @@ async def test_domain_crawler_multiple_product_links(monkeypatch):
     session = FakeSession(fake_responses)
     strategy = RegexBasedDiscoveryStrategy([r'/product/'])
     
-    fake_crawl = fake_crawl_with_playwright_factory(html_base)
+    fake_crawl = fake_render_page_factory(html_base)
 
-    monkeypatch.setattr(playwright_helper, "crawl_with_playwright", fake_crawl)
+    monkeypatch.setattr(playwright_helper, "render_page", fake_crawl)
 
     crawler = DomainCrawler(BaseUrl("testdomain.com"), strategy, max_depth=2, session=session)
     product_urls = await crawler.start()
@@ -305,3 +333,1236 @@ def test_url_discovery_strategy_parent_method_called():
     # Since the parent's method body is just "pass", it returns None.
     # We assert that calling our dummy implementation returns None.
     assert dummy.is_product_url("https://example.com") is None
+
+@pytest.mark.asyncio
+async def test_domain_crawler_bounded_workers():
+    # A wide page whose links would all be fetched at once by a naive fan-out.
+    links = "".join(f'<a href="/page/{i}">Page {i}</a>' for i in range(50))
+    html_base = f"<html><body>{links}</body></html>"
+    fake_responses = {"https://testdomain.com": (200, html_base)}
+    for i in range(50):
+        fake_responses[f"https://testdomain.com/page/{i}"] = (200, '<a href="/product/1">P</a>')
+
+    class SlowFakeSession(FakeSession):
+        in_flight = 0
+        peak = 0
+        fetched = []
+        async def get(self, url):
+            SlowFakeSession.in_flight += 1
+            SlowFakeSession.peak = max(SlowFakeSession.peak, SlowFakeSession.in_flight)
+            SlowFakeSession.fetched.append(url)
+            await asyncio.sleep(0.001)
+            SlowFakeSession.in_flight -= 1
+            return await super().get(url)
+
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, max_depth=2, session=SlowFakeSession(fake_responses), workers=4)
+    product_urls = await crawler.start()
+    assert product_urls == {"https://testdomain.com/product/1"}
+    assert SlowFakeSession.peak <= 4
+    # Every URL is fetched exactly once, even though it is linked from many pages.
+    assert len(SlowFakeSession.fetched) == len(set(SlowFakeSession.fetched)) == 52
+
+# -----------------------------------------------------------------------------
+# Tests for BrowserPool
+# -----------------------------------------------------------------------------
+@pytest.mark.asyncio
+async def test_browser_pool_recycles_and_caps_renders(monkeypatch):
+    fake_playwright = FakePlaywright("<html><a href='/product/1'>P</a></html>")
+    monkeypatch.setattr(playwright_helper, "async_playwright", fake_async_playwright_factory(fake_playwright))
+
+    async with BrowserPool(size=1, max_concurrent_renders=2, pages_per_browser=2) as pool:
+        first = await pool.acquire()
+        second = await pool.acquire()
+        # The third render has to wait until a slot is released.
+        third = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        assert not third.done()
+        await pool.release(first)
+        third = await third
+        # The only browser had already served two pages, so a new one was launched,
+        # while the old one stays open until its last page is released.
+        assert len(fake_playwright.launched) == 2
+        assert not fake_playwright.launched[0].closed
+        await pool.release(second)
+        assert fake_playwright.launched[0].closed
+        assert first.context.closed
+        await pool.release(third)
+
+        html = await playwright_helper.crawl_with_playwright("https://testdomain.com", max_scrolls=0, pool=pool)
+        assert "/product/1" in html
+    assert fake_playwright.stopped
+
+# -----------------------------------------------------------------------------
+# Tests for scrolling
+# -----------------------------------------------------------------------------
+@pytest.mark.asyncio
+async def test_adaptive_scroll_stops_when_page_stops_growing():
+    page = FakePage(None, growth=[(1000, 10), (2000, 20), (3000, 30)])
+    scrolls = await playwright_helper.scroll_page(page, max_scrolls=10, scroll_mode="adaptive", stable_rounds=2)
+    # Two scrolls brought new content, then two in a row did not.
+    assert scrolls == 4
+    assert page.scrolls == 4
+
+@pytest.mark.asyncio
+async def test_adaptive_scroll_respects_max_scrolls():
+    page = FakePage(None, growth=[(h, h // 100) for h in range(1000, 20000, 1000)])
+    assert await playwright_helper.scroll_page(page, max_scrolls=3, scroll_mode="adaptive") == 3
+
+@pytest.mark.asyncio
+async def test_unknown_scroll_mode():
+    with pytest.raises(ValueError):
+        await playwright_helper.scroll_page(FakePage(None), max_scrolls=1, scroll_mode="sideways")
+
+# -----------------------------------------------------------------------------
+# Tests for render decisions
+# -----------------------------------------------------------------------------
+def recording_fake_render(html_return_value, calls):
+    async def fake_render_page(url: str, max_scrolls: int = 5, pool=None, network_options=None, **scroll_options):
+        calls.append(url)
+        return playwright_helper.RenderResult(html_return_value)
+    return fake_render_page
+
+@pytest.mark.asyncio
+async def test_render_auto_skips_server_rendered_pages(monkeypatch):
+    links = "".join(f'<a href="/product/{i}">Product {i}</a>' for i in range(12))
+    fake_responses = {"https://testdomain.com": (200, f"<html><body>{links}</body></html>")}
+    calls = []
+    monkeypatch.setattr(playwright_helper, "render_page", recording_fake_render("", calls))
+
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="auto", render_max_depth=1), strategy, max_depth=1,
+                            session=FakeSession(fake_responses))
+    product_urls = await crawler.start()
+    assert len(product_urls) == 12
+    assert calls == []
+
+@pytest.mark.asyncio
+async def test_render_auto_renders_spa_shell(monkeypatch):
+    fake_responses = {
+        "https://testdomain.com": (200, '<html><body><div id="__next"></div></body></html>'),
+        "https://testdomain.com/product/1": (200, '<html><body><div id="__next"></div></body></html>'),
+    }
+    calls = []
+    monkeypatch.setattr(playwright_helper, "render_page", recording_fake_render('<a href="/product/1">P</a>', calls))
+
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="auto"), strategy, max_depth=1, session=FakeSession(fake_responses))
+    product_urls = await crawler.start()
+    assert product_urls == {"https://testdomain.com/product/1"}
+    # Only depth 0 is within render_max_depth.
+    assert calls == ["https://testdomain.com"]
+
+@pytest.mark.asyncio
+async def test_render_always_skips_static_fetch(monkeypatch):
+    class RecordingSession(FakeSession):
+        async def get(self, url):
+            self.requested = getattr(self, "requested", []) + [url]
+            return await super().get(url)
+
+    session = RecordingSession({})
+    calls = []
+    monkeypatch.setattr(playwright_helper, "render_page", recording_fake_render('<a href="/product/1">P</a>', calls))
+    crawler = DomainCrawler(BaseUrl("testdomain.com"), RegexBasedDiscoveryStrategy([r'/product/']), max_depth=0, session=session)
+    assert await crawler.start() == {"https://testdomain.com/product/1"}
+    assert calls == ["https://testdomain.com"]
+    assert not hasattr(session, "requested")
+
+def test_base_url_render_modes():
+    base_url = BaseUrl("testdomain.com", render="auto", render_max_depth=1)
+    assert base_url.render_mode(1) == "auto"
+    assert base_url.render_mode(2) == "never"
+    with pytest.raises(ValueError):
+        BaseUrl("testdomain.com", render="sometimes")
+
+# -----------------------------------------------------------------------------
+# Tests for request routing and JSON harvesting
+# -----------------------------------------------------------------------------
+class SinglePagePool:
+    def __init__(self, fake_page):
+        self.fake_page = fake_page
+
+    @asynccontextmanager
+    async def page(self):
+        yield self.fake_page
+
+@pytest.mark.asyncio
+async def test_render_page_blocks_resources_and_harvests_json():
+    api_body = json.dumps({"items": [{"url": "/product/7", "name": "seven"}, {"image": "https://cdn.other.com/7.jpg"}]})
+    network = [
+        FakeRequest("https://www.testdomain.com/hero.jpg", "image"),
+        FakeRequest("https://www.google-analytics.com/analytics.js", "script"),
+        FakeRequest("https://www.testdomain.com/app.js", "script"),
+        FakeRequest("https://api.testdomain.com/products?page=2", "fetch",
+                    FakeNetworkResponse("https://api.testdomain.com/products?page=2", api_body)),
+        FakeRequest("https://other.com/feed.json", "fetch",
+                    FakeNetworkResponse("https://other.com/feed.json", json.dumps(["https://other.com/product/9"]))),
+    ]
+    page = FakePage(None, html="<html></html>", network=network)
+    network_options = {
+        "blocked_resource_types": ["image"],
+        "blocked_hosts": ["google-analytics.com"],
+        "capture_json": True,
+    }
+    result = await playwright_helper.render_page("https://www.testdomain.com/shop", max_scrolls=0,
+                                                 pool=SinglePagePool(page), network_options=network_options)
+    assert result.discovered_urls == ["https://cdn.other.com/7.jpg", "https://www.testdomain.com/product/7"]
+    assert [request.aborted for request in network] == [True, True, False, False, False]
+    assert result.scrolls == 0
+
+class HangingNetworkResponse(FakeNetworkResponse):
+    async def text(self):
+        await asyncio.Event().wait()
+
+@pytest.mark.asyncio
+async def test_render_page_cancels_json_harvests_when_the_render_fails(monkeypatch):
+    response = HangingNetworkResponse("https://www.testdomain.com/api/products", "[]")
+    page = FakePage(None, network=[FakeRequest(response.url, "fetch", response)])
+    async def broken_content():
+        raise RuntimeError("page crashed")
+    page.content = broken_content
+    harvests = []
+    original_attach = playwright_helper._NetworkFilter.attach
+    async def recording_attach(self, page):
+        harvests.append(self.harvests)
+        await original_attach(self, page)
+    monkeypatch.setattr(playwright_helper._NetworkFilter, "attach", recording_attach)
+    with pytest.raises(RuntimeError):
+        await playwright_helper.render_page("https://www.testdomain.com/shop", max_scrolls=0,
+                                            pool=SinglePagePool(page), network_options={"capture_json": True})
+    assert len(harvests[0]) == 1
+    assert harvests[0][0].cancelled()
+
+@pytest.mark.asyncio
+async def test_network_filter_third_party_blocking():
+    network = playwright_helper._NetworkFilter("https://www.testdomain.com/", block_third_party=True)
+    assert not network.should_block("script", "https://cdn.testdomain.com/app.js")
+    assert network.should_block("script", "https://cdn.other.com/app.js")
+    # The page itself is never blocked.
+    assert not network.should_block("document", "https://other.com/")
+
+@pytest.mark.asyncio
+async def test_domain_crawler_uses_harvested_urls(monkeypatch):
+    fake_render = fake_render_page_factory("<html><body></body></html>",
+                                           ["https://testdomain.com/product/1", "https://elsewhere.com/product/2"])
+    monkeypatch.setattr(playwright_helper, "render_page", fake_render)
+    crawler = DomainCrawler(BaseUrl("testdomain.com"), RegexBasedDiscoveryStrategy([r'/product/']), max_depth=1,
+                            session=FakeSession({}))
+    assert await crawler.start() == {"https://testdomain.com/product/1"}
+
+def test_regex_based_discovery_strategy_classify():
+    strategy = RegexBasedDiscoveryStrategy([r'/product/', r'/item/\d+', r'shop'])
+    urls = ["https://example.com/product/1", "https://example.com/item/x", "https://example.com/item/42", "https://shop.example.com/"]
+    assert strategy.classify(urls) == [True, False, True, True]
+    assert strategy.classify(urls) == [strategy.is_product_url(url) for url in urls]
+    assert RegexBasedDiscoveryStrategy([]).classify(urls) == [False] * 4
+
+def test_regex_based_discovery_strategy_uncombinable_patterns():
+    # A global inline flag is only valid at the start of a pattern, so these cannot be joined.
+    strategy = RegexBasedDiscoveryStrategy([r'/product/', r'(?i)/ITEM/'])
+    assert len(strategy.matchers) == 2
+    assert strategy.classify(["https://example.com/item/1", "https://example.com/about"]) == [True, False]
+
+def test_regex_based_discovery_strategy_backreferences():
+    # In one alternation \1 would refer to the first pattern's group.
+    strategy = RegexBasedDiscoveryStrategy([r'/(shop)/item/', r'/(\w+)/\1/'])
+    urls = ["https://example.com/shoes/shoes/", "https://example.com/shoes/hats/", "https://example.com/shop/item/1"]
+    assert strategy.classify(urls) == [True, False, True]
+    assert strategy.classify(urls) == [strategy.is_product_url(url) for url in urls]
+
+def test_url_discovery_strategy_default_classify():
+    class SuffixDiscovery(URLDiscoveryStrategy):
+        def is_product_url(self, url: str) -> bool:
+            return url.endswith(".html")
+
+    assert SuffixDiscovery().classify(["/a.html", "/b"]) == [True, False]
+
+# -----------------------------------------------------------------------------
+# Tests for LinkExtractor
+# -----------------------------------------------------------------------------
+TRICKY_HTML = """
+<html>
+  <head><base href="/shop/"></head>
+  <body>
+    <!-- <a href="/commented-out">Hidden</a> -->
+    <script>var tpl = '<a href="/in-script">';</script>
+    <a class="card" title="a > b" href="product/1?a=1&amp;b=2">Product 1</a>
+    <a href='/single'>Single</a>
+    <a href=/unquoted>Unquoted</a>
+    <a title=Don't href="/dont">Apostrophe</a>
+    <a data-href="/not-a-link">Data</a>
+    <A HREF="  /upper ">Upper</A>
+    <a name="anchor">No href</a>
+    <base href="/ignored/">
+  </body>
+</html>
+"""
+
+@pytest.mark.parametrize("extractor", [FastLinkExtractor(), SoupLinkExtractor()])
+def test_link_extractors(extractor):
+    assert extractor.extract(TRICKY_HTML, "https://testdomain.com/a/b") == [
+        "https://testdomain.com/shop/product/1?a=1&b=2",
+        "https://testdomain.com/single",
+        "https://testdomain.com/unquoted",
+        "https://testdomain.com/dont",
+        "https://testdomain.com/upper",
+    ]
+
+def test_fast_link_extractor_scans_unclosed_tokens_once():
+    extractor = FastLinkExtractor()
+    for page in ("<script>" * 20000, "<!--" * 20000, '<a title="' * 19999, "<a href=/x " * 20000):
+        start = time.perf_counter()
+        # Like a browser, the first unclosed token runs to the end of the page; rescanning
+        # the rest of the page from every other start would take minutes.
+        assert extractor.extract('<a href="/first">' + page, "https://testdomain.com/") == ["https://testdomain.com/first"]
+        assert time.perf_counter() - start < 1
+
+def test_get_link_extractor():
+    assert isinstance(get_link_extractor("soup"), SoupLinkExtractor)
+    with pytest.raises(ValueError):
+        get_link_extractor("lxml-magic")
+
+# -----------------------------------------------------------------------------
+# Tests for page parsing
+# -----------------------------------------------------------------------------
+def test_parse_page_filters_and_dedupes():
+    html = '''
+    <a href="/product/1">1</a><a href="/product/1">1 again</a><a href="/about">About</a>
+    <a href="https://www.testdomain.com/product/2">2</a><a href="https://other.com/product/3">3</a>
+    '''
+    scope = PageScope("https://testdomain.com", path_validation=True)
+    links, products = parse_page(html, "https://testdomain.com/", scope, RegexBasedDiscoveryStrategy([r'/product/']),
+                                 FastLinkExtractor(), ["https://testdomain.com/product/4"])
+    assert links == ["https://testdomain.com/product/1", "https://testdomain.com/about",
+                     "https://www.testdomain.com/product/2", "https://testdomain.com/product/4"]
+    assert products == ["https://testdomain.com/product/1", "https://www.testdomain.com/product/2",
+                        "https://testdomain.com/product/4"]
+
+def test_page_scope_path_validation():
+    scope = PageScope("https://testdomain.com/collections/coffee", path_validation=True)
+    assert scope.contains("https://testdomain.com/collections/coffee/beans")
+    assert not scope.contains("https://testdomain.com/blog")
+    assert PageScope("https://testdomain.com/collections/coffee", path_validation=False).contains("https://testdomain.com/blog")
+
+def test_page_scope_strips_only_a_www_prefix():
+    scope = PageScope("https://web.com")
+    assert scope.contains("https://web.com/a") and scope.contains("https://www.web.com/a")
+    assert not scope.contains("https://eb.com/a")
+    assert not PageScope("https://www.web.com").contains("https://eb.com/a")
+
+@pytest.mark.asyncio
+async def test_domain_crawler_with_parse_pool():
+    html_base = '<a href="/page1">Page 1</a><a href="/product/1">Product 1</a>'
+    fake_responses = {
+        "https://testdomain.com": (200, html_base),
+        "https://testdomain.com/page1": (200, '<a href="/product/2">Product 2</a>'),
+    }
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    async with ParsePool(strategy, FastLinkExtractor(), workers=2, max_in_flight=2) as parse_pool:
+        crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, max_depth=2,
+                                session=FakeSession(fake_responses), parse_pool=parse_pool)
+        product_urls = await crawler.start()
+    assert product_urls == {"https://testdomain.com/product/1", "https://testdomain.com/product/2"}
+
+# -----------------------------------------------------------------------------
+# Tests for URL canonicalization and visited sets
+# -----------------------------------------------------------------------------
+def test_url_canonicalizer():
+    canonicalizer = URLCanonicalizer()
+    assert canonicalizer.canonicalize("HTTPS://Shop.Example.COM:443/Product/1?b=2&utm_source=x&a=1&UTM_Medium=y#reviews") == \
+        "https://shop.example.com/Product/1?a=1&b=2"
+    assert canonicalizer.canonicalize("http://example.com:80/?gclid=1") == "http://example.com/"
+    assert canonicalizer.canonicalize("https://example.com") == "https://example.com"
+    # Raw encodings are preserved.
+    assert canonicalizer.canonicalize("https://example.com/s?q=a%20b&c=d+e") == "https://example.com/s?c=d+e&q=a%20b"
+    keep_all = URLCanonicalizer(strip_params=[], sort_query=False, drop_fragment=False)
+    assert keep_all.canonicalize("https://example.com/?b=1&utm_source=x#top") == "https://example.com/?b=1&utm_source=x#top"
+
+def test_fingerprint_set():
+    visited = FingerprintSet(capacity=4)
+    urls = [f"https://example.com/product/{i}" for i in range(500)]
+    assert all(visited.add(url) for url in urls)
+    assert not visited.add(urls[0])
+    assert all(url in visited for url in urls)
+    assert "https://example.com/about" not in visited
+    assert len(visited) == 500
+
+def test_scalable_bloom_filter_has_no_false_negatives():
+    visited = ScalableBloomFilter(initial_capacity=16, error_rate=0.001)
+    urls = [f"https://example.com/product/{i}" for i in range(500)]
+    for url in urls:
+        visited.add(url)
+    assert not visited.add(urls[0])
+    assert all(url in visited for url in urls)
+
+def test_scalable_bloom_filter_error_rate():
+    bloom = ScalableBloomFilter(initial_capacity=1000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"https://example.com/product/{i}")
+    false_positives = sum(f"https://example.com/other/{i}" in bloom for i in range(10000))
+    # The bound is error_rate / (1 - tightening) = 0.02.
+    assert false_positives / 10000 < 0.02
+    assert len(bloom.filters) > 1
+
+def test_make_visited_set():
+    assert isinstance(make_visited_set("bloom", error_rate=0.01), ScalableBloomFilter)
+    with pytest.raises(ValueError):
+        make_visited_set("trie")
+
+@pytest.mark.asyncio
+async def test_domain_crawler_canonicalizes_links():
+    html_base = '''
+    <a href="/product/1?utm_source=mail">1</a>
+    <a href="/product/1#reviews">1 again</a>
+    <a href="HTTPS://TESTDOMAIN.COM/product/1">1 once more</a>
+    '''
+    session = FakeSession({"https://testdomain.com": (200, html_base),
+                           "https://testdomain.com/product/1": (200, "")})
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']),
+                            max_depth=2, session=session)
+    assert await crawler.start() == {"https://testdomain.com/product/1"}
+    assert len(crawler.visited) == 2
+
+# -----------------------------------------------------------------------------
+# Tests for the politeness scheduler
+# -----------------------------------------------------------------------------
+@pytest.mark.asyncio
+async def test_politeness_window_grows_and_halves():
+    scheduler = PolitenessScheduler(default={"rate": 0, "initial_window": 4, "max_window": 6, "decrease_interval": 0})
+    state = scheduler.host_state("www.testdomain.com")
+    assert scheduler.host_state("testdomain.com") is state
+    for _ in range(20):
+        async with scheduler.slot("https://testdomain.com/") as ticket:
+            ticket.record(200)
+    assert state.window == 6
+    async with scheduler.slot("https://testdomain.com/") as ticket:
+        ticket.record(429)
+    assert state.window == 3
+    with pytest.raises(asyncio.TimeoutError):
+        async with scheduler.slot("https://testdomain.com/"):
+            raise asyncio.TimeoutError()
+    assert state.window == 1.5
+    assert state.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_politeness_window_caps_concurrency():
+    scheduler = PolitenessScheduler(default={"rate": 0, "initial_window": 2, "max_window": 2})
+    in_flight = peak = 0
+
+    async def request():
+        nonlocal in_flight, peak
+        async with scheduler.slot("https://testdomain.com/") as ticket:
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            ticket.record(200)
+
+    await asyncio.gather(*(request() for _ in range(10)))
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_politeness_rate_and_retry_after():
+    scheduler = PolitenessScheduler(default={"rate": 100, "burst": 1}, hosts={"slow.com": {"rate": 20}})
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for _ in range(3):
+        async with scheduler.slot("https://slow.com/") as ticket:
+            ticket.record(200)
+    # One token up front, then one every 50ms.
+    assert loop.time() - start >= 0.09
+
+    async with scheduler.slot("https://testdomain.com/") as ticket:
+        ticket.record(503, {"Retry-After": "1"})
+    assert scheduler.host_state("testdomain.com").blocked_until >= loop.time() + 0.9
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+@pytest.mark.asyncio
+async def test_domain_crawler_honors_crawl_delay():
+    fake_responses = {
+        "https://testdomain.com/robots.txt": (200, "User-agent: *\nCrawl-delay: 2\n"),
+        "https://testdomain.com": (200, '<a href="/product/1">P</a>'),
+    }
+    scheduler = PolitenessScheduler()
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']), max_depth=0,
+                            session=FakeSession(fake_responses), scheduler=scheduler)
+    assert await crawler.start() == {"https://testdomain.com/product/1"}
+    assert scheduler.host_state("testdomain.com").rate == 0.5
+
+# -----------------------------------------------------------------------------
+# Tests for robots.txt and sitemap discovery
+# -----------------------------------------------------------------------------
+SITEMAP_NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+def sitemap_index(*locs):
+    entries = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex {SITEMAP_NS}>{entries}</sitemapindex>'
+
+def url_set(*entries):
+    body = "".join(f"<url><loc>{loc}</loc><lastmod>{lastmod}</lastmod></url>" for loc, lastmod in entries)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset {SITEMAP_NS}>{body}</urlset>'
+
+def test_sitemap_parser_streams_entries():
+    document = url_set(("https://testdomain.com/product/1", "2024-01-01"), ("https://testdomain.com/about", "2024-01-02")).encode()
+    parser = SitemapParser()
+    entries = []
+    for start in range(0, len(document), 7):
+        entries.extend(parser.feed(document[start:start + 7]))
+    entries.extend(parser.close())
+    assert entries == [("url", "https://testdomain.com/product/1", "2024-01-01"),
+                       ("url", "https://testdomain.com/about", "2024-01-02")]
+    # Processed entries are dropped from the tree.
+    assert len(parser._root) == 0
+
+@pytest.mark.asyncio
+async def test_domain_crawler_sitemaps_and_robots():
+    fake_responses = {
+        "https://testdomain.com/robots.txt": (200, "User-agent: *\nDisallow: /private/\nSitemap: https://testdomain.com/sitemap_index.xml.gz\n"),
+        "https://testdomain.com/sitemap_index.xml.gz": (200, gzip.compress(sitemap_index(
+            "https://testdomain.com/sitemap-1.xml", "https://testdomain.com/sitemap-2.xml").encode())),
+        "https://testdomain.com/sitemap-1.xml": (200, url_set(("https://testdomain.com/product/1?utm_source=x", "2024-05-01"),
+                                                              ("https://testdomain.com/private/product/2", "2024-05-02"))),
+        "https://testdomain.com/sitemap-2.xml": (200, url_set(("https://testdomain.com/product/3", "2024-05-03"),
+                                                              ("https://other.com/product/4", "2024-05-04"))),
+        "https://testdomain.com": (200, '<a href="/product/1">1</a><a href="/product/5">5</a><a href="/private/page">P</a>'),
+    }
+
+    class RecordingSession(FakeSession):
+        requested = []
+        async def get(self, url):
+            self.requested.append(url)
+            return await super().get(url)
+
+    session = RecordingSession(fake_responses)
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']), max_depth=2,
+                            session=session, respect_robots=True, use_sitemaps=True)
+    product_urls = await crawler.start()
+    assert product_urls == {"https://testdomain.com/product/1", "https://testdomain.com/product/3", "https://testdomain.com/product/5"}
+    # Sitemap products are not fetched again, and disallowed pages are never fetched.
+    assert "https://testdomain.com/product/1" not in session.requested
+    assert "https://testdomain.com/product/5" in session.requested
+    assert "https://testdomain.com/private/page" not in session.requested
+
+@pytest.mark.asyncio
+async def test_robots_and_sitemaps_go_through_the_politeness_scheduler():
+    fake_responses = {
+        "https://testdomain.com/robots.txt": (200, "User-agent: *\nSitemap: https://testdomain.com/sitemap.xml.gz\n"),
+        "https://testdomain.com/sitemap.xml.gz": (200, gzip.compress(url_set(("https://testdomain.com/product/1", "2024-05-01")).encode())),
+        "https://testdomain.com": (200, "<p>Home</p>"),
+    }
+
+    class RecordingScheduler(PolitenessScheduler):
+        slots = []
+        def slot(self, url):
+            self.slots.append(url)
+            return super().slot(url)
+
+    scheduler = RecordingScheduler(default={"rate": 100, "burst": 1})
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']),
+                            session=FakeSession(fake_responses), scheduler=scheduler, use_sitemaps=True)
+    assert await crawler.start() == {"https://testdomain.com/product/1"}
+    assert scheduler.slots == ["https://testdomain.com/robots.txt", "https://testdomain.com/sitemap.xml.gz", "https://testdomain.com"]
+
+# -----------------------------------------------------------------------------
+# Tests for the crawl state store and resume
+# -----------------------------------------------------------------------------
+@pytest.mark.asyncio
+async def test_sqlite_crawl_store_round_trip(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    store = SQLiteCrawlStore(path, batch_size=2)
+    big = (1 << 64) - 1
+    store.enqueued("site", 1, "https://testdomain.com", 0)
+    store.enqueued("site", big, "https://testdomain.com/about", 1)
+    store.completed("site", 1)
+    store.product("site", "https://testdomain.com/product/1")
+    store.fetched("site", "https://testdomain.com", 200, 123)
+    await store.maybe_flush()
+    store.close()
+
+    store = SQLiteCrawlStore(path)
+    state = await store.load("site")
+    assert sorted(state.visited) == [1, big]
+    assert state.pending == [("https://testdomain.com/about", 1)]
+    assert state.products == ["https://testdomain.com/product/1"]
+    assert (await store.load("other")).is_empty()
+    await store.reset("site")
+    assert (await store.load("site")).is_empty()
+    store.close()
+
+@pytest.mark.asyncio
+async def test_domain_crawler_resumes_from_store(tmp_path):
+    fake_responses = {
+        "https://testdomain.com": (200, '<a href="/product/1">1</a><a href="/about">About</a>'),
+        "https://testdomain.com/product/1": (200, "<p>Product</p>"),
+        "https://testdomain.com/about": (200, '<a href="/product/2">2</a>'),
+        "https://testdomain.com/product/2": (200, "<p>Product</p>"),
+    }
+
+    class RecordingSession(FakeSession):
+        def __init__(self, responses):
+            super().__init__(responses)
+            self.requested = []
+        async def get(self, url):
+            self.requested.append(url)
+            return await super().get(url)
+
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    store = SQLiteCrawlStore(str(tmp_path / "state.sqlite"))
+    # State left behind by an interrupted crawl: the base page and product 1 were handled, /about was not.
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=FakeSession({}), store=store)
+    crawler.frontier = LocalFrontier()
+    for url, depth in [("https://testdomain.com", 0), ("https://testdomain.com/product/1", 1), ("https://testdomain.com/about", 1)]:
+        crawler.enqueue(url, depth)
+    for url in ("https://testdomain.com", "https://testdomain.com/product/1"):
+        store.completed(crawler.crawl_key, fingerprint(url))
+    crawler.add_products(["https://testdomain.com/product/1"])
+    await store.flush()
+
+    session = RecordingSession(fake_responses)
+    resumed = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=session, store=store, resume=True)
+    product_urls = await resumed.start()
+    assert product_urls == {"https://testdomain.com/product/1", "https://testdomain.com/product/2"}
+    assert session.requested == ["https://testdomain.com/about", "https://testdomain.com/product/2"]
+    assert (await store.load(crawler.crawl_key)).pending == []
+
+    # Without resume the crawl starts over.
+    fresh = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=RecordingSession(fake_responses), store=store)
+    await fresh.start()
+    assert "https://testdomain.com" in fresh.session.requested
+    store.close()
+
+# -----------------------------------------------------------------------------
+# Tests for the response cache (incremental recrawls)
+# -----------------------------------------------------------------------------
+class ConditionalSession(FakeSession):
+    """
+    Answers 304 when the request's If-None-Match matches the response's ETag.
+    """
+    def __init__(self, url_to_response):
+        super().__init__(url_to_response)
+        self.requested = []
+
+    async def get(self, url, headers=None):
+        self.requested.append((url, headers))
+        status, text, response_headers = self.url_to_response[url]
+        if headers and headers.get('If-None-Match') == response_headers.get('ETag'):
+            return FakeResponse(304, "", response_headers)
+        return FakeResponse(status, text, response_headers)
+
+def test_cached_page_conditional_headers():
+    assert CachedPage("u").conditional_headers() == {}
+    page = CachedPage("u", etag='"v1"', last_modified="Wed, 21 Oct 2015 07:28:00 GMT")
+    assert page.conditional_headers() == {'If-None-Match': '"v1"', 'If-Modified-Since': "Wed, 21 Oct 2015 07:28:00 GMT"}
+
+@pytest.mark.asyncio
+async def test_domain_crawler_revalidates_with_response_cache(tmp_path):
+    responses = {
+        "https://testdomain.com": (200, '<a href="/product/1">1</a><a href="/category">C</a>', {'ETag': '"home-v1"'}),
+        "https://testdomain.com/category": (200, '<a href="/product/2">2</a>', {'ETag': '"cat-v1"'}),
+        "https://testdomain.com/product/1": (200, "<p>Product</p>", {}),
+        "https://testdomain.com/product/2": (200, "<p>Product</p>", {}),
+    }
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    path = str(tmp_path / "cache.sqlite")
+    expected = {"https://testdomain.com/product/1", "https://testdomain.com/product/2"}
+
+    cache = SQLiteResponseCache(path)
+    first = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=ConditionalSession(responses), cache=cache)
+    assert await first.start() == expected
+    cache.close()
+
+    # The next run sends the stored validators; unchanged pages answer 304 and their cached links are reused.
+    cache = SQLiteResponseCache(path)
+    session = ConditionalSession(responses)
+    second = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=session, cache=cache)
+    assert await second.start() == expected
+    assert ("https://testdomain.com", {'If-None-Match': '"home-v1"'}) in session.requested
+    assert ("https://testdomain.com/product/1", None) in session.requested
+    cache.close()
+
+    # Within the TTL nothing is requested at all.
+    cache = SQLiteResponseCache(path, ttl=3600)
+    session = ConditionalSession(responses)
+    third = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=session, cache=cache)
+    assert await third.start() == expected
+    assert session.requested == []
+    cache.close()
+
+@pytest.mark.asyncio
+async def test_response_cache_is_kept_per_base_url(tmp_path):
+    responses = {
+        "https://testdomain.com": (200, '<a href="/category">C</a>', {}),
+        "https://testdomain.com/category": (200, '<a href="/product/2">2</a>', {'ETag': '"cat-v1"'}),
+        "https://testdomain.com/product/2": (200, "<p>Product</p>", {}),
+    }
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"), ttl=3600)
+    # /category's links as seen from the /category base URL leave out /product/2, which is outside its path.
+    scoped = DomainCrawler(BaseUrl("testdomain.com", "/category", render="never"), strategy,
+                           session=ConditionalSession(responses), cache=cache)
+    assert await scoped.start() == set()
+    whole_site = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=ConditionalSession(responses), cache=cache)
+    assert await whole_site.start() == {"https://testdomain.com/product/2"}
+    cache.close()
+
+# -----------------------------------------------------------------------------
+# Tests for streaming result sinks
+# -----------------------------------------------------------------------------
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sink_type, file_name", [("ndjson", "out.ndjson"), ("ndjson.gz", "out.ndjson.gz"), ("sqlite", "out.sqlite")])
+async def test_result_sink_dedups_and_reopens(tmp_path, sink_type, file_name):
+    path = str(tmp_path / file_name)
+    sink = make_result_sink(sink_type, path=path, batch_size=2)
+    sink.write("site", "https://testdomain.com/product/1")
+    sink.write("site", "https://testdomain.com/product/1")
+    sink.write("other", "https://testdomain.com/product/1")
+    await sink.maybe_flush()
+    sink.write("site", "https://testdomain.com/product/2")
+    sink.close()
+
+    # Reopened in append mode, earlier results count as written.
+    sink = make_result_sink(sink_type, path=path)
+    sink.write("site", "https://testdomain.com/product/2")
+    sink.write("site", "https://testdomain.com/product/3")
+    sink.close()
+    assert list(sink.read()) == [("site", "https://testdomain.com/product/1"), ("other", "https://testdomain.com/product/1"),
+                                 ("site", "https://testdomain.com/product/2"), ("site", "https://testdomain.com/product/3")]
+
+    make_result_sink(sink_type, path=path, append=False).close()
+    assert list(sink.read()) == []
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sink_type, file_name", [("ndjson", "out.ndjson"), ("ndjson.gz", "out.ndjson.gz")])
+async def test_file_sink_resumes_after_a_write_cut_short(tmp_path, sink_type, file_name):
+    path = str(tmp_path / file_name)
+    sink = make_result_sink(sink_type, path=path)
+    for i in range(50):
+        sink.write("site", f"https://testdomain.com/product/{i}")
+    await sink.flush()
+    with open(path, "rb") as f:
+        written = f.read()
+    sink.close()
+    # The process died in the middle of writing the batch: no newline or gzip trailer.
+    with open(path, "wb") as f:
+        f.write(written[:-12])
+
+    sink = make_result_sink(sink_type, path=path)
+    sink.write("site", "https://testdomain.com/product/new")
+    sink.close()
+    rows = list(sink.read())
+    assert not sink.damaged
+    assert rows[-1] == ("site", "https://testdomain.com/product/new")
+    assert 40 < len(rows) <= 50 and len(set(rows)) == len(rows)
+    assert aggregate_results(sink, str(tmp_path / "out.json"))["site"] == len(rows)
+
+@pytest.mark.asyncio
+async def test_domain_crawler_streams_products_to_sink(tmp_path):
+    fake_responses = {
+        "https://testdomain.com": (200, '<a href="/product/1">1</a><a href="/about">About</a>'),
+        "https://testdomain.com/about": (200, '<a href="/product/1">1</a><a href="/product/2">2</a>'),
+    }
+    sink = make_result_sink("ndjson", path=str(tmp_path / "products.ndjson"))
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']),
+                            session=FakeSession(fake_responses), sink=sink)
+    product_urls = await crawler.start()
+    # Only fingerprints stay in memory; the URLs are in the sink, already flushed.
+    assert len(product_urls) == 2 and "https://testdomain.com/product/2" in product_urls
+    lines = [json.loads(line) for line in open(tmp_path / "products.ndjson")]
+    assert sorted(line["url"] for line in lines) == ["https://testdomain.com/product/1", "https://testdomain.com/product/2"]
+    sink.close()
+
+    counts = aggregate_results(sink, str(tmp_path / "product_urls.json"))
+    assert counts == {"testdomain.com": 2}
+    with open(tmp_path / "product_urls.json") as f:
+        assert sorted(json.load(f)["testdomain.com"]) == ["https://testdomain.com/product/1", "https://testdomain.com/product/2"]
+
+# -----------------------------------------------------------------------------
+# Tests for the sharded (multi-process) CrawlerManager
+# -----------------------------------------------------------------------------
+def test_group_by_host_keeps_hosts_together_largest_first():
+    base_urls = [BaseUrl("www.a.com", "/x"), BaseUrl("b.com"), BaseUrl("a.com", "/y"), BaseUrl("https://c.com")]
+    groups = group_by_host(base_urls)
+    assert [[b.get_absolute_url() for b in group] for group in groups][0] == ["www.a.com/x", "a.com/y"]
+    assert [group[0].get_absolute_url() for group in group_by_host(base_urls, {"c.com": 10})][0] == "https://c.com"
+
+async def serve_test_shop(request):
+    # /shop -> two categories -> three products each.
+    path = request.path
+    if path == "/shop":
+        body = "".join(f'<a href="/shop/cat/{i}">c</a>' for i in (1, 2))
+    elif path.startswith("/shop/cat/"):
+        category = path.rsplit("/", 1)[1]
+        body = "".join(f'<a href="/shop/product/{category}-{i}">p</a>' for i in range(3))
+    else:
+        body = "<p>Product</p>"
+    return web.Response(text=f"<html><body>{body}</body></html>", content_type="text/html")
+
+@pytest.mark.asyncio
+async def test_sharded_manager_matches_single_process():
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", serve_test_shop)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        base_urls = [BaseUrl(f"http://127.0.0.1:{port}", "/shop", render="never"),
+                     BaseUrl(f"http://localhost:{port}", "/shop", render="never")]
+        strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+        single = await CrawlerManager(base_urls, strategy, max_depth=2).run()
+        sharded_manager = ShardedCrawlerManager(base_urls, strategy, processes=2, manager_options={"max_depth": 2})
+        sharded = await sharded_manager.run()
+    finally:
+        await runner.cleanup()
+    assert list(sharded) == list(single)
+    assert {key: sorted(urls) for key, urls in sharded.items()} == {key: sorted(urls) for key, urls in single.items()}
+    assert len(sharded[f"http://127.0.0.1:{port}/shop"]) == 6
+    assert sharded_manager.errors == {}
+
+@pytest.mark.asyncio
+async def test_sharded_manager_resume_returns_products_found_before(tmp_path):
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", serve_test_shop)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    store_options = {"path": str(tmp_path / "state.sqlite")}
+    base_urls = [BaseUrl(f"http://127.0.0.1:{port}", "/shop", render="never")]
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    try:
+        first = await ShardedCrawlerManager(base_urls, strategy, processes=1, manager_options={"max_depth": 2},
+                                            store_options=store_options).run()
+        # Nothing is left to crawl, so every product comes from the checkpoint.
+        resumed = await ShardedCrawlerManager(base_urls, strategy, processes=1, manager_options={"max_depth": 2, "resume": True},
+                                              store_options=store_options).run()
+    finally:
+        await runner.cleanup()
+    key = f"http://127.0.0.1:{port}/shop"
+    assert len(first[key]) == 6
+    assert sorted(resumed[key]) == sorted(first[key])
+
+@pytest.mark.asyncio
+async def test_shard_streams_products_before_its_results():
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", serve_test_shop)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    work, events = queue.Queue(), queue.Queue()
+    work.put([BaseUrl(f"http://127.0.0.1:{port}", "/shop", render="never")])
+    work.put(None)
+    try:
+        await _run_shard(0, RegexBasedDiscoveryStrategy([r'/product/']), {"max_depth": 2}, work, events, 1, None, None, None)
+    finally:
+        await runner.cleanup()
+    received = [events.get_nowait() for _ in range(events.qsize())]
+    kinds = [event[0] for event in received]
+    key = f"http://127.0.0.1:{port}/shop"
+    # Products come in their own events, and the results only carry the count.
+    assert kinds[0] == "started" and kinds[-1] == "results" and "products" in kinds
+    assert received[-1] == ("results", 0, {key: 6})
+    assert sorted(url for event in received if event[0] == "products" for _, url in event[2]) == \
+        sorted(f"http://127.0.0.1:{port}/shop/product/{c}-{i}" for c in (1, 2) for i in range(3))
+
+# -----------------------------------------------------------------------------
+# Tests for the multi-node shared frontier
+# -----------------------------------------------------------------------------
+@pytest.mark.asyncio
+async def test_shared_frontier_completes_an_item_leased_twice():
+    class LeasingClient:
+        def __init__(self):
+            self.leases = [{'lease': 1, 'items': [["https://a.com/1", 0]]}, {'lease': 2, 'items': [["https://a.com/1", 0]]}]
+            self.completed = []
+
+        async def request(self, op, **fields):
+            if op == 'lease':
+                return self.leases.pop(0) if self.leases else {'lease': None, 'items': []}
+            if op == 'complete':
+                self.completed.append(fields['lease'])
+            return {}
+
+    client = LeasingClient()
+    frontier = SharedFrontier(client, "c", poll_interval=0.01)
+    # The node missed its heartbeats, so the coordinator leased the item again.
+    first = await frontier.get()
+    second = await frontier.get()
+    assert first == second == ("https://a.com/1", 0)
+    frontier.task_done(first)
+    frontier.task_done(second)
+    await asyncio.gather(*frontier._tasks)
+    assert client.completed == [1, 2]
+
+def test_frontier_coordinator_host_affinity_and_expired_leases():
+    coordinator = FrontierCoordinator(lease_timeout=60)
+    assert coordinator.dispatch('add', node='a', crawl='c', items=[["https://a.com/1", 0], ["https://b.com/1", 0],
+                                                                   ["https://a.com/2", 1], ["https://a.com/1", 0]]) == {'added': 3}
+    first = coordinator.dispatch('lease', node='a', crawl='c', max=1)
+    assert first['items'] == [("https://a.com/1", 0)]
+    # a.com now belongs to node a, so node b gets b.com and then nothing.
+    assert coordinator.dispatch('lease', node='b', crawl='c', max=5)['items'] == [("https://b.com/1", 0)]
+    assert coordinator.dispatch('lease', node='b', crawl='c', max=5)['items'] == []
+    assert coordinator.dispatch('status', node='b', crawl='c') == {'finished': False}
+
+    # Node a goes quiet: its lease is re-queued and a.com can be taken over.
+    coordinator.lease_timeout = 0
+    coordinator._last_seen['a'] -= 1
+    second = coordinator.dispatch('lease', node='b', crawl='c', max=5)
+    assert second['items'] == [("https://a.com/1", 0), ("https://a.com/2", 1)]
+    coordinator.lease_timeout = 60
+    for lease in coordinator._leases.copy():
+        coordinator.dispatch('complete', node='b', lease=lease)
+    assert coordinator.dispatch('status', node='b', crawl='c') == {'finished': True}
+
+@pytest.mark.asyncio
+async def test_multi_node_crawl_through_coordinator():
+    fake_responses = {}
+    for host in ("a.com", "b.com"):
+        fake_responses[f"https://{host}"] = (200, "".join(f'<a href="/cat/{i}">c</a>' for i in range(3)))
+        for i in range(3):
+            fake_responses[f"https://{host}/cat/{i}"] = (200, "".join(f'<a href="/product/{i}-{j}">p</a>' for j in range(4)))
+
+    class RecordingSession(FakeSession):
+        def __init__(self, responses):
+            super().__init__(responses)
+            self.requested = []
+        async def get(self, url, headers=None):
+            self.requested.append(url)
+            return await super().get(url)
+
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+
+    async def run_node(port, session):
+        async with FrontierClient(port=port, heartbeat_interval=0.1) as client:
+            crawlers = [DomainCrawler(BaseUrl(host, render="never"), strategy, max_depth=2, session=session, workers=3,
+                                      frontier=SharedFrontier(client, host, lease_size=2, poll_interval=0.02))
+                        for host in ("a.com", "b.com")]
+            return await asyncio.gather(*(crawler.start() for crawler in crawlers))
+
+    async with FrontierCoordinator(port=0) as coordinator:
+        sessions = [RecordingSession(fake_responses) for _ in range(2)]
+        node_results = await asyncio.gather(*(run_node(coordinator.port, session) for session in sessions))
+
+    for index, host in enumerate(("a.com", "b.com")):
+        products = set().union(*(results[index] for results in node_results))
+        assert products == {f"https://{host}/product/{i}-{j}" for i in range(3) for j in range(4)}
+        # Each host was crawled by exactly one node.
+        assert sum(any(f"//{host}" in url for url in session.requested) for session in sessions) == 1
+    # Every page was fetched exactly once across the nodes.
+    requested = sessions[0].requested + sessions[1].requested
+    assert len(requested) == len(set(requested)) == 2 * (1 + 3 + 12)
+
+# -----------------------------------------------------------------------------
+# Tests for best-first crawling and crawl budgets
+# -----------------------------------------------------------------------------
+def test_heuristic_scorer_ranks_listings_above_low_value_pages():
+    scorer = HeuristicScorer()
+    listing = scorer.score("https://testdomain.com/category/shoes?page=2", 1, False, 0.5)
+    product = scorer.score("https://testdomain.com/product/1", 1, True, 0.5)
+    about = scorer.score("https://testdomain.com/about", 1, False, 0.5)
+    deep_listing = scorer.score("https://testdomain.com/category/shoes?page=2", 3, False, 0.5)
+    assert listing > deep_listing > about
+    assert listing > product > about
+
+@pytest.mark.asyncio
+async def test_priority_frontier_hands_out_best_first():
+    frontier = PriorityFrontier()
+    frontier.put_nowait(("a", 1), 1.0)
+    frontier.put_nowait(("b", 1), 5.0)
+    frontier.put_nowait(("c", 1), 1.0)
+    assert [await frontier.get() for _ in range(3)] == [("b", 1), ("a", 1), ("c", 1)]
+
+@pytest.mark.asyncio
+async def test_domain_crawler_budget_and_priority():
+    home = "".join(f'<a href="/blog/{i}">b</a>' for i in range(5)) + '<a href="/category/shoes">Shoes</a>'
+    fake_responses = {
+        "https://testdomain.com": (200, home),
+        "https://testdomain.com/category/shoes": (200, "".join(f'<a href="/product/{i}">p</a>' for i in range(10))),
+    }
+
+    class RecordingSession(FakeSession):
+        def __init__(self, responses):
+            super().__init__(responses)
+            self.requested = []
+        async def get(self, url, headers=None):
+            self.requested.append(url)
+            return await super().get(url)
+
+    session = RecordingSession(fake_responses)
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']), max_depth=3,
+                            session=session, workers=1, scorer=HeuristicScorer(), budget=CrawlBudget(max_pages=2))
+    product_urls = await crawler.start()
+    # With two pages to spend, the category page is chosen over the blog posts.
+    assert session.requested == ["https://testdomain.com", "https://testdomain.com/category/shoes"]
+    assert len(product_urls) == 10
+
+def test_crawl_budget_limits():
+    budget = CrawlBudget(max_bytes=100)
+    budget.start()
+    assert budget.exceeded() is None
+    budget.add_bytes(150)
+    assert budget.exceeded() == "150 bytes"
+    budget = CrawlBudget(max_time=0)
+    budget.start()
+    assert budget.exceeded() == "0s wall time"
+
+# -----------------------------------------------------------------------------
+# Tests for crawler-trap detection
+# -----------------------------------------------------------------------------
+def test_path_template_and_simhash():
+    assert path_template("https://Shop.com/c/shoes/page/12?sort=asc&color=red") == "shop.com/c/shoes/page/{n}?color&sort"
+    assert path_template("https://shop.com/s/0123456789abcdef0123") == "shop.com/s/{id}?"
+    links = [f"shop.com/p/{i}" for i in range(40)]
+    assert bin(simhash(links) ^ simhash(links[:39] + ["shop.com/about"])).count('1') <= 3
+    assert bin(simhash(links) ^ simhash([f"shop.com/q/{i}" for i in range(40)])).count('1') > 3
+
+def test_trap_detector_reasons():
+    with pytest.raises(ValueError):
+        TrapDetector(near_duplicate_distance=4)
+    detector = TrapDetector(max_param_values=2, allow_params=["page"], max_path_repeats=2, max_urls_per_template=3)
+    assert detector.check("https://shop.com/a/b/a/b/a/b") == "path_repetition"
+    assert detector.check("https://shop.com/c?sid=1") is None
+    assert detector.check("https://shop.com/d?sid=2") is None
+    assert detector.check("https://shop.com/e?sid=3") == "param_cardinality"
+    assert detector.check("https://shop.com/e?sid=1") is None
+    # Allowed parameters are not limited, but their template still is.
+    assert [detector.check(f"https://shop.com/list?page={i}") for i in range(4)] == [None, None, None, "template_cap"]
+
+@pytest.mark.asyncio
+async def test_domain_crawler_skips_facet_explosion_and_near_duplicates():
+    colors = ["red", "blue", "green", "black", "white"]
+    sizes = ["s", "m", "l", "xl"]
+    products = "".join(f'<a href="/product/{i}">p</a>' for i in range(10))
+    facets = "".join(f'<a href="/shoes?color={c}&size={z}">f</a>' for c in colors for z in sizes)
+
+    class FacetSession(FakeSession):
+        def __init__(self):
+            super().__init__({})
+            self.requested = []
+        async def get(self, url, headers=None):
+            self.requested.append(url)
+            if "/product/" in url:
+                return FakeResponse(200, "<p>Product</p>")
+            # Every facet combination lists the same products and links to every other combination.
+            return FakeResponse(200, products + facets)
+
+    session = FacetSession()
+    detector = TrapDetector(max_urls_per_template=5, near_duplicate_distance=3)
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']),
+                            max_depth=4, session=session, trap_detector=detector)
+    product_urls = await crawler.start()
+    assert len(product_urls) == 10
+    facet_fetches = [url for url in session.requested if "color=" in url]
+    assert len(facet_fetches) <= 5
+    # The home page queues 5 of the 20 combinations; the facet pages repeat its links, so theirs are cut off.
+    assert detector.skipped["template_cap"] == 15
+    assert detector.skipped["near_duplicate_page"] > 0
+
+# -----------------------------------------------------------------------------
+# Tests for bounded, streamed response bodies
+# -----------------------------------------------------------------------------
+def test_fast_link_stream_matches_extract_for_any_chunking():
+    page = ('<base href="/shop/"><!-- <a href="/commented"> --><a href="a">x</a>'
+            '<script>var s = "<a href=\'/scripted\'>";</script><A HREF=b><a class="x>y" href="c">') * 3
+    expected = FastLinkExtractor().extract(page, "https://testdomain.com/")
+    assert expected == SoupLinkExtractor().extract(page, "https://testdomain.com/")
+    for size in (1, 2, 7, 64):
+        for extractor in (FastLinkExtractor(), SoupLinkExtractor()):
+            stream = extractor.stream("https://testdomain.com/")
+            for start in range(0, len(page), size):
+                stream.feed(page[start:start + size])
+            assert stream.close() == expected
+
+def test_fast_link_stream_scans_open_script_once():
+    script = "<script>" + "if (a < b) { s += '<a href=\\'/no\\'>'; }\n" * 5000 + "</script ><a href='/after'>"
+    page = "<a href='/before'>" + script + "<!-- " + "<a href='/hidden'> -" * 2000 + "- -->"
+    scanned = []
+
+    class CountingStream(FastLinkStream):
+        def scan(self, text, final):
+            scanned.append(len(text))
+            return super().scan(text, final)
+
+    stream = CountingStream("https://testdomain.com/")
+    for start in range(0, len(page), 16):
+        stream.feed(page[start:start + 16])
+    assert stream.close() == ["https://testdomain.com/before", "https://testdomain.com/after"]
+    # Rescanning the open script on every chunk would be about len(page) ** 2 / 32.
+    assert sum(scanned) < 3 * len(page)
+
+@pytest.mark.asyncio
+async def test_body_reader_gates_truncates_and_decodes():
+    reader = BodyReader(max_bytes=10, chunk_size=4)
+    assert reader.reject_reason({"Content-Type": "application/pdf"}) == "content type application/pdf"
+    assert reader.reject_reason({"Content-Type": "text/html", "Content-Length": "11"}) == "content length 11 over 10 bytes"
+    assert reader.reject_reason({"Content-Type": "text/html; charset=utf-8", "Content-Length": "10"}) is None
+    assert reader.reject_reason({}) is None
+    text, size = await reader.read(FakeResponse(200, "0123456789abcdef"))
+    assert (text, size) == ("0123456789", 10)
+    latin = FakeResponse(200, "caf\xe9".encode("latin-1"), {"Content-Type": "text/html; charset=ISO-8859-1"})
+    assert await reader.read(latin) == ("caf\xe9", 4)
+
+@pytest.mark.asyncio
+async def test_domain_crawler_skips_non_html_and_streams_links():
+    hidden = '<a href="/product/hidden">x</a>'
+    fake_session = FakeSession({
+        "https://testdomain.com": (200, '<a href="/doc.pdf">d</a><a href="/big">b</a><a href="/product/1">p</a>',
+                                   {"Content-Type": "text/html"}),
+        "https://testdomain.com/doc.pdf": (200, hidden, {"Content-Type": "application/pdf"}),
+        "https://testdomain.com/big": (200, hidden, {"Content-Type": "text/html", "Content-Length": "100000"}),
+        "https://testdomain.com/product/1": (200, '<a href="/product/2">p</a>' + " " * 100 + hidden),
+    })
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']),
+                            max_depth=3, session=fake_session, body_options={"max_bytes": 80, "chunk_size": 8, "stream_links": True})
+    product_urls = await crawler.start()
+    assert product_urls == {"https://testdomain.com/product/1", "https://testdomain.com/product/2"}
+
+# -----------------------------------------------------------------------------
+# Tests for crawl metrics
+# -----------------------------------------------------------------------------
+def test_histogram_quantiles_and_prometheus_text():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+    assert (histogram.quantile(0.5), histogram.quantile(0.75), histogram.quantile(1.0)) == (0.1, 1.0, float('inf'))
+    metrics = CrawlMetrics(buckets=(0.1, 1.0))
+    domain = metrics.domain('shop.com/"x"')
+    domain.inc('pages', 3)
+    domain.observe('parse', 0.5)
+    domain.gauges['frontier'] = lambda: 7
+    text = metrics.prometheus_text()
+    assert 'crawler_pages_total{crawl="shop.com/\\"x\\""} 3' in text
+    assert 'crawler_frontier{crawl="shop.com/\\"x\\""} 7' in text
+    assert 'crawler_parse_seconds_bucket{crawl="shop.com/\\"x\\"",le="1.0"} 1' in text
+    assert 'crawler_parse_seconds_count{crawl="shop.com/\\"x\\""} 1' in text
+
+@pytest.mark.asyncio
+async def test_crawler_manager_records_metrics(tmp_path):
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", serve_test_shop)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    snapshot_path = tmp_path / "metrics.json"
+    try:
+        async with CrawlMetrics(log_interval=0, snapshot_path=str(snapshot_path), prometheus_port=0) as metrics:
+            base_urls = [BaseUrl(f"http://127.0.0.1:{port}", "/shop", render="never")]
+            await CrawlerManager(base_urls, RegexBasedDiscoveryStrategy([r'/product/']), max_depth=2, metrics=metrics).run()
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{metrics.prometheus_port}/metrics") as response:
+                    exposition = await response.text()
+    finally:
+        await runner.cleanup()
+    key = f"http://127.0.0.1:{port}/shop"
+    snapshot = json.loads(snapshot_path.read_text())["domains"][key]
+    assert snapshot["counters"]["pages"] == 9
+    assert snapshot["counters"]["products"] == 6
+    assert snapshot["counters"]["responses_2xx"] == 9
+    assert snapshot["gauges"] == {"frontier": 0, "in_flight": 0}
+    for name in ("ttfb", "connect", "fetch", "body", "parse", "strategy"):
+        assert snapshot["histograms"][name]["count"] > 0
+    assert f'crawler_pages_total{{crawl="{key}"}} 9' in exposition
+
+# -----------------------------------------------------------------------------
+# Tests for retries and hedged requests
+# -----------------------------------------------------------------------------
+def test_crawler_manager_timeouts_keep_aiohttp_defaults():
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    timeout = CrawlerManager([], strategy).timeout
+    assert (timeout.total, timeout.sock_connect, timeout.sock_read) == (300, 30, None)
+    timeout = CrawlerManager([], strategy, timeout_options={"read": 5}).timeout
+    assert (timeout.total, timeout.sock_connect, timeout.sock_read) == (300, 30, 5)
+
+def test_retry_policy_backoff_budget_and_hedge_delay():
+    policy = RetryPolicy(backoff_base=1.0, backoff_max=5.0, hedge=True, hedge_min_samples=3, hedge_min_delay=0.01)
+    assert all(0 <= policy.backoff(attempt) <= min(5.0, 2 ** attempt) for attempt in range(6) for _ in range(20))
+    assert policy.backoff(0, (503, {"Retry-After": "3"}, None)) >= 3
+    assert policy.retryable(None) and policy.retryable((503, {}, None)) and not policy.retryable((404, {}, None))
+    budget = RetryBudget(ratio=0.5, minimum=1, maximum=2)
+    assert budget.withdraw() and not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw() and not budget.withdraw()
+    assert policy.hedge_delay("shop.com") is None
+    for seconds in (0.02, 0.03, 0.2):
+        policy.observe("shop.com", seconds)
+    assert policy.hedge_delay("shop.com") == 0.2
+
+class FlakySession(FakeSession):
+    """
+    Fails the first `failures` requests of every URL with a 503, or delays them by `delay` seconds.
+    """
+    def __init__(self, url_to_response, failures=1, delay=None):
+        super().__init__(url_to_response)
+        self.failures = failures
+        self.delay = delay
+        self.requests = {}
+
+    async def get(self, url, headers=None, **kwargs):
+        attempt = self.requests[url] = self.requests.get(url, 0) + 1
+        if attempt <= self.failures:
+            if self.delay is None:
+                return FakeResponse(503, "")
+            await asyncio.sleep(self.delay)
+        return await super().get(url, headers)
+
+SHOP_PAGES = {
+    "https://testdomain.com": (200, '<a href="/product/1">1</a><a href="/product/2">2</a>'),
+    "https://testdomain.com/product/1": (200, "<p>1</p>"),
+    "https://testdomain.com/product/2": (200, "<p>2</p>"),
+}
+
+@pytest.mark.asyncio
+async def test_domain_crawler_retries_transient_errors_within_budget():
+    strategy = RegexBasedDiscoveryStrategy([r'/product/'])
+    session = FlakySession(SHOP_PAGES)
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=session,
+                            retry_policy=RetryPolicy(backoff_base=0.001))
+    assert len(await crawler.start()) == 2
+    assert set(session.requests.values()) == {2}
+    # Without budget the 503s are final.
+    session = FlakySession(SHOP_PAGES)
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), strategy, session=session,
+                            retry_policy=RetryPolicy(backoff_base=0.001, budget_ratio=0, budget_min=0))
+    assert len(await crawler.start()) == 0
+    assert session.requests == {"https://testdomain.com": 1}
+
+@pytest.mark.asyncio
+async def test_domain_crawler_hedges_slow_requests():
+    policy = RetryPolicy(hedge=True, hedge_min_samples=5, hedge_min_delay=0.01)
+    for _ in range(5):
+        policy.observe("testdomain.com", 0.01)
+    session = FlakySession(SHOP_PAGES, delay=5.0)
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']),
+                            session=session, retry_policy=policy)
+    product_urls = await asyncio.wait_for(crawler.start(), timeout=2.0)
+    assert len(product_urls) == 2
+    assert set(session.requests.values()) == {2}
+
+@pytest.mark.asyncio
+async def test_domain_crawler_does_not_hedge_requests_queued_by_politeness():
+    pages = {"https://testdomain.com": (200, "".join(f'<a href="/product/{i}">p</a>' for i in range(60)))}
+    pages.update({f"https://testdomain.com/product/{i}": (200, "<p>p</p>") for i in range(60)})
+
+    class FastSession(FakeSession):
+        async def get(self, url, headers=None, **kwargs):
+            await asyncio.sleep(0.005)
+            return await super().get(url, headers)
+
+    metrics = DomainMetrics()
+    crawler = DomainCrawler(BaseUrl("testdomain.com", render="never"), RegexBasedDiscoveryStrategy([r'/product/']),
+                            session=FastSession(pages), metrics=metrics,
+                            scheduler=PolitenessScheduler(default={"rate": 50, "burst": 5}),
+                            retry_policy=RetryPolicy(hedge=True, hedge_min_samples=5, hedge_min_delay=0.01))
+    assert len(await crawler.start()) == 60
+    # Waiting for the token bucket is not latency of the host, so nothing is hedged.
+    assert metrics.counters["hedges"] == 0
+
@@ -1,14 +1,25 @@
+from playwright_helper import RenderResult
 
 # -----------------------------------------------------------------------------
 # Fake Response and Session Classes for Testing
 # -----------------------------------------------------------------------------
+class FakeStreamReader:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def iter_chunked(self, n):
+        for start in range(0, len(self._body), n):
+            yield self._body[start:start + n]
+
 class FakeResponse:
-    def __init__(self, status, text):
+    def __init__(self, status, text, headers=None):
         self.status = status
         self._text = text
+        self.headers = headers if headers is not None else {}
+        self.content = FakeStreamReader(text if isinstance(text, bytes) else text.encode())
 
     async def text(self):
-        return self._text
+        return self._text.decode() if isinstance(self._text, bytes) else self._text
 
     async def __aenter__(self):
         return self
@@ -18,25 +29,162 @@ class FakeResponse:
 
 class FakeSession:
     """
-    A fake session that maps URLs to (status, text) responses.
+    A fake session that maps URLs to (status, text) or (status, text, headers) responses.
     Optionally, it can raise an exception for specified URLs.
     """
     def __init__(self, url_to_response, raise_on=None):
         self.url_to_response = url_to_response
         self.raise_on = raise_on if raise_on is not None else set()
 
-    async def get(self, url):
+    async def get(self, url, headers=None, **kwargs):
         if url in self.raise_on:
             raise Exception("Test exception")
         if url in self.url_to_response:
-            status, text = self.url_to_response[url]
-        else:
-            status, text = (404, "")
-        return FakeResponse(status, text)
+            return FakeResponse(*self.url_to_response[url])
+        return FakeResponse(404, "")
 
 
-def fake_crawl_with_playwright_factory(html_return_value):
-    def fake_crawl_with_playwright(url: str, max_scrolls: int = 5) -> str:
+def fake_render_page_factory(html_return_value, discovered_urls=None):
+    async def fake_render_page(url: str, max_scrolls: int = 5, pool=None, network_options=None, **scroll_options):
         # You could even log or assert something here if needed.
-        return html_return_value
-    return fake_crawl_with_playwright
\ No newline at end of file
+        return RenderResult(html_return_value, discovered_urls)
+    return fake_render_page
+
+# -----------------------------------------------------------------------------
+# Fake Playwright Objects for Testing the BrowserPool
+# -----------------------------------------------------------------------------
+class FakePage:
+    """
+    A fake page whose content grows on each scroll according to `growth`,
+    a list of (height, anchors) measurements revealed one per scroll.
+    """
+    def __init__(self, context, html="<html></html>", growth=None, network=None):
+        self.context = context
+        self.html = html
+        self.visited = []
+        self.growth = list(growth) if growth else [(1000, 10)]
+        self.measure = self.growth.pop(0)
+        self.scrolls = 0
+        self.network = network or []
+        self.route_handler = None
+        self.listeners = {}
+
+    async def route(self, pattern, handler):
+        self.route_handler = handler
+
+    def on(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    async def goto(self, url, **kwargs):
+        """
+        Plays the simulated network traffic through the route handler and
+        response listeners.
+        """
+        self.visited.append(url)
+        for request in self.network:
+            route = FakeRoute(request)
+            if self.route_handler is not None:
+                await self.route_handler(route)
+            else:
+                route.continued = True
+            if route.continued and request.response is not None:
+                for callback in self.listeners.get("response", []):
+                    callback(request.response)
+
+    async def evaluate(self, script, *args):
+        if "scrollBy" in script:
+            self.scrolls += 1
+            if self.growth:
+                self.measure = self.growth.pop(0)
+            return None
+        if "scrollHeight" in script:
+            return list(self.measure)
+        return None
+
+    async def wait_for_function(self, script, arg=None, timeout=None):
+        return True
+
+    async def content(self):
+        return self.html
+
+class FakeNetworkResponse:
+    def __init__(self, url, body, content_type="application/json"):
+        self.url = url
+        self.headers = {"content-type": content_type}
+        self._body = body
+
+    async def text(self):
+        return self._body
+
+class FakeRequest:
+    def __init__(self, url, resource_type, response=None):
+        self.url = url
+        self.resource_type = resource_type
+        self.response = response
+        self.aborted = False
+
+class FakeRoute:
+    def __init__(self, request):
+        self.request = request
+        self.continued = False
+        self.aborted = False
+
+    async def abort(self):
+        self.aborted = True
+        self.request.aborted = True
+
+    async def continue_(self):
+        self.continued = True
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    async def new_page(self):
+        return FakePage(self, self.browser.html)
+
+    async def close(self):
+        self.closed = True
+
+class FakeBrowser:
+    def __init__(self, html="<html></html>"):
+        self.html = html
+        self.closed = False
+
+    async def new_context(self, **kwargs):
+        return FakeContext(self)
+
+    async def new_page(self):
+        return await (await self.new_context()).new_page()
+
+    async def close(self):
+        self.closed = True
+
+class FakePlaywright:
+    """
+    Stands in for the object returned by `async_playwright().start()`.
+    Every launched browser is recorded in `launched`.
+    """
+    def __init__(self, html="<html></html>"):
+        self.html = html
+        self.launched = []
+        self.chromium = self
+        self.stopped = False
+
+    async def launch(self, **kwargs):
+        browser = FakeBrowser(self.html)
+        self.launched.append(browser)
+        return browser
+
+    async def start(self):
+        return self
+
+    async def stop(self):
+        self.stopped = True
+
+
+def fake_async_playwright_factory(fake_playwright):
+    def fake_async_playwright():
+        return fake_playwright
+    return fake_async_playwright
@@ -0,0 +1,143 @@
+import hashlib
+import re
+from collections import Counter
+from urllib.parse import urlsplit, parse_qsl
+from canonical import fingerprint
+from visited import VisitedSet
+
+SKIP_PARAM_CARDINALITY = "param_cardinality"
+SKIP_PATH_REPETITION = "path_repetition"
+SKIP_TEMPLATE_CAP = "template_cap"
+SKIP_NEAR_DUPLICATE = "near_duplicate_page"
+
+# 16-bit bands of a 64-bit SimHash; signatures within SIMHASH_BANDS - 1 bits share a band.
+SIMHASH_BANDS = 4
+
+_NUMBER = re.compile(r'\d+')
+_HEX_ID = re.compile(r'^[0-9a-f]{16,}$|^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
+
+def path_template(url: str) -> str:
+    """
+    Reduce a URL to its template: host, path with numbers and long hex ids
+    replaced by placeholders, and the sorted names of its query parameters.
+    """
+    parts = urlsplit(url)
+    segments = []
+    for segment in parts.path.split('/'):
+        segments.append('{id}' if _HEX_ID.match(segment) else _NUMBER.sub('{n}', segment))
+    names = sorted({name for name, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    return f"{(parts.hostname or '').lower()}{'/'.join(segments)}?{'&'.join(names)}"
+
+def simhash(tokens) -> int:
+    """
+    64-bit SimHash of a set of tokens: similar sets differ in few bits.
+    """
+    weights = [0] * 64
+    for token in tokens:
+        value = int.from_bytes(hashlib.blake2b(token.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+class TrapDetector:
+    """
+    Learns, while the crawl runs, which new links lead into crawler traps and
+    faceted-navigation explosions, and filters them out before they are queued.
+
+    Per host it skips links that
+      - give a query parameter a new value after it already had `max_param_values`
+        distinct ones (session ids, free-form filters), unless listed in `allow_params`,
+      - repeat a path segment more than `max_path_repeats` times (/a/b/a/b/a/b),
+      - fall under a path template (see `path_template`) that already had
+        `max_urls_per_template` URLs (facet combinations, endless pagination).
+    With `near_duplicate_distance` (at most SIMHASH_BANDS - 1), a page whose outlink
+    set's SimHash is within that many bits of an earlier page on the host gets none
+    of its links queued.
+    Product links are never skipped. Skipped links are counted per reason in `skipped`.
+    """
+    def __init__(self, max_param_values: int = 200, allow_params: list = (), max_path_repeats: int = 2,
+                 max_urls_per_template: int = 1000, near_duplicate_distance: int = None, max_signatures: int = 100_000):
+        if near_duplicate_distance is not None and near_duplicate_distance > SIMHASH_BANDS - 1:
+            # Pages further apart may share no band, so they would be missed at random.
+            raise ValueError(f"near_duplicate_distance must be at most {SIMHASH_BANDS - 1}, got {near_duplicate_distance}")
+        self.max_param_values = max_param_values
+        self.allow_params = frozenset(param.lower() for param in allow_params or ())
+        self.max_path_repeats = max_path_repeats
+        self.max_urls_per_template = max_urls_per_template
+        self.near_duplicate_distance = near_duplicate_distance
+        self.max_signatures = max_signatures
+        self.skipped = Counter()
+        self._param_values = {}
+        self._templates = Counter()
+        self._signatures = {}
+        self._signature_count = 0
+
+    def check(self, url: str) -> str:
+        """
+        Return why a new URL should be skipped, or None to queue it. A URL that
+        passes is counted towards its host's parameter and template limits.
+        """
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        segments = [segment for segment in parts.path.split('/') if segment]
+        if segments and max(Counter(segments).values()) > self.max_path_repeats:
+            return SKIP_PATH_REPETITION
+        template = path_template(url)
+        if self._templates[template] >= self.max_urls_per_template:
+            return SKIP_TEMPLATE_CAP
+        new_values = []
+        for name, value in parse_qsl(parts.query, keep_blank_values=True):
+            name = name.lower()
+            if name in self.allow_params:
+                continue
+            values = self._param_values.setdefault((host, name), set())
+            value_fp = fingerprint(value)
+            if value_fp not in values:
+                if len(values) >= self.max_param_values:
+                    return SKIP_PARAM_CARDINALITY
+                new_values.append((values, value_fp))
+        for values, value_fp in new_values:
+            values.add(value_fp)
+        self._templates[template] += 1
+        return None
+
+    def is_near_duplicate(self, page_url: str, links: list) -> bool:
+        """
+        Whether the page's outlinks are a near-duplicate of an earlier page's on
+        the same host. The SIMHASH_BANDS 16-bit bands of the SimHash index the
+        earlier pages: two signatures within 3 bits of each other share at least one band.
+        """
+        if self.near_duplicate_distance is None or not links:
+            return False
+        host = (urlsplit(page_url).hostname or '').lower()
+        signature = simhash({link.split('://', 1)[-1] for link in links})
+        index = self._signatures.setdefault(host, {})
+        bands = [(band, signature >> (16 * band) & 0xFFFF) for band in range(SIMHASH_BANDS)]
+        for key in bands:
+            for other in index.get(key, ()):
+                if bin(signature ^ other).count('1') <= self.near_duplicate_distance:
+                    return True
+        if self._signature_count < self.max_signatures:
+            self._signature_count += 1
+            for key in bands:
+                index.setdefault(key, []).append(signature)
+        return False
+
+    def filter(self, page_url: str, links: list, product_links: set, seen: VisitedSet) -> list:
+        """
+        Return the links of a page worth queueing. Links already in `seen` are
+        kept as they are, since the frontier drops them anyway.
+        """
+        if self.is_near_duplicate(page_url, links):
+            skipped = [link for link in links if link not in product_links and link not in seen]
+            self.skipped[SKIP_NEAR_DUPLICATE] += len(skipped)
+            return [link for link in links if link in product_links]
+        kept = []
+        for link in links:
+            if link not in product_links and link not in seen:
+                reason = self.check(link)
+                if reason is not None:
+                    self.skipped[reason] += 1
+                    continue
+            kept.append(link)
+        return kept
@@ -0,0 +1,156 @@
+"""
+Compact sets of visited URLs, keyed by 64-bit fingerprints (see `canonical.fingerprint`).
+
+- FingerprintSet is exact up to fingerprint collisions. It is an open-addressing
+  hash table over an array of unsigned 64-bit ints kept between 37% and 75% full,
+  so it costs about 11-22 bytes per URL instead of the hundreds a set of strings uses.
+- ScalableBloomFilter trades exactness for space: it grows by adding filters of
+  `growth` times the capacity, each with `tightening` times the error rate, so
+  the overall false-positive rate stays below error_rate / (1 - tightening).
+  At error_rate=0.001 each filter costs about 2 bytes per URL it is sized for.
+  A false positive means a
+  new URL is skipped as if it had been visited; there are no false negatives.
+"""
+import math
+from abc import ABC, abstractmethod
+from array import array
+from canonical import fingerprint
+
+class VisitedSet(ABC):
+    """
+    Abstract base class for the set of URLs a crawler has already seen.
+    """
+    def add(self, url: str) -> bool:
+        """
+        Record the URL, returning True if it had not been seen before.
+        """
+        return self.add_fingerprint(fingerprint(url))
+
+    def __contains__(self, url: str) -> bool:
+        return self.contains_fingerprint(fingerprint(url))
+
+    @abstractmethod
+    def add_fingerprint(self, fp: int) -> bool:
+        pass
+
+    @abstractmethod
+    def contains_fingerprint(self, fp: int) -> bool:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+class FingerprintSet(VisitedSet):
+    _MAX_LOAD = 0.75
+
+    def __init__(self, capacity: int = 1024):
+        size = 8
+        while size * self._MAX_LOAD < capacity:
+            size *= 2
+        self._table = array('Q', [0]) * size
+        self._mask = size - 1
+        self._count = 0
+
+    def _slot(self, fp: int) -> int:
+        # 0 marks an empty slot, so it cannot be stored as a fingerprint itself.
+        fp = fp or 1
+        table, mask = self._table, self._mask
+        i = fp & mask
+        while True:
+            current = table[i]
+            if current == 0 or current == fp:
+                return i
+            i = (i + 1) & mask
+
+    def contains_fingerprint(self, fp: int) -> bool:
+        return self._table[self._slot(fp)] != 0
+
+    def add_fingerprint(self, fp: int) -> bool:
+        i = self._slot(fp)
+        if self._table[i] != 0:
+            return False
+        self._table[i] = fp or 1
+        self._count += 1
+        if self._count > len(self._table) * self._MAX_LOAD:
+            self._grow()
+        return True
+
+    def _grow(self):
+        old = self._table
+        self._table = array('Q', [0]) * (len(old) * 2)
+        self._mask = len(self._table) - 1
+        for fp in old:
+            if fp:
+                self._table[self._slot(fp)] = fp
+
+    def __len__(self) -> int:
+        return self._count
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over 64-bit fingerprints, using double hashing
+    of the fingerprint's two 32-bit halves to derive its bit positions.
+    """
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fp: int):
+        h1 = fp & 0xFFFFFFFF
+        h2 = (fp >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, fp: int) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(fp))
+
+    def add(self, fp: int):
+        for p in self._positions(fp):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+class ScalableBloomFilter(VisitedSet):
+    def __init__(self, initial_capacity: int = 100_000, error_rate: float = 0.001, growth: int = 2, tightening: float = 0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - tightening))]
+        self._count = 0
+
+    def contains_fingerprint(self, fp: int) -> bool:
+        return any(fp in bloom for bloom in self.filters)
+
+    def add_fingerprint(self, fp: int) -> bool:
+        if self.contains_fingerprint(fp):
+            return False
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(current.capacity * self.growth, current.error_rate * self.tightening)
+            self.filters.append(current)
+        current.add(fp)
+        self._count += 1
+        return True
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def size_in_bytes(self) -> int:
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+VISITED_SETS = {
+    "fingerprints": FingerprintSet,
+    "bloom": ScalableBloomFilter,
+}
+
+def make_visited_set(type: str = "fingerprints", **options) -> VisitedSet:
+    if type not in VISITED_SETS:
+        raise ValueError(f"Unknown visited set type: {type}")
+    return VISITED_SETS[type](**options)